@@ -0,0 +1,335 @@
+import io
+import os
+import hashlib
+import re
+import time
+import wave
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import IO, List, Optional, Tuple
+
+import numpy as np
+
+import logs
+
+# --- Ses Ön İşleme ---
+# Tarayıcılardan gelen kayıtlar genellikle 48 kHz stereo ve başında/sonunda uzun sessizlik
+# olan WAV dosyalarıdır. Whisper 16 kHz mono ile aynı doğrulukta çalıştığı için WAV
+# kayıtları göndermeden önce: mono'ya indirgenir, baştaki/sondaki sessizlik enerji tabanlı
+# VAD ile kırpılır, 16 kHz'e örneklenir ve 16-bit PCM WAV olarak yeniden kodlanır.
+# WAV dışındaki formatlar (webm, mp3, m4a) veya çözülemeyen dosyalar olduğu gibi gönderilir.
+AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "1") != "0"
+AUDIO_TARGET_SAMPLE_RATE = int(os.getenv("AUDIO_TARGET_SAMPLE_RATE", "16000"))
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+AUDIO_SILENCE_PADDING_MS = int(os.getenv("AUDIO_SILENCE_PADDING_MS", "300"))
+
+# --- Uzun Cevapların Bölünmesi ---
+# AUDIO_SEGMENT_MAX_SECONDS'tan uzun kayıtlar, her parçanın ikinci yarısındaki en sessiz
+# noktadan kesilir ve parçalar eşzamanlı olarak metne çevrilir. Kesim noktası sessiz değilse
+# (kesintisiz konuşma) parçalar AUDIO_SEGMENT_OVERLAP_SECONDS kadar örtüşür ve birleştirirken
+# tekrar eden kelimeler atılır.
+AUDIO_SEGMENT_MAX_SECONDS = float(os.getenv("AUDIO_SEGMENT_MAX_SECONDS", "60"))
+AUDIO_SEGMENT_OVERLAP_SECONDS = float(os.getenv("AUDIO_SEGMENT_OVERLAP_SECONDS", "1.0"))
+STITCH_MAX_OVERLAP_WORDS = 20
+
+VAD_FRAME_MS = 30
+_DECODE_BLOCK_FRAMES = 64 * 1024
+
+log = logs.get_logger("examai.audio")
+
+
+@dataclass
+class PreprocessReport:
+    original_bytes: int
+    processed_bytes: int
+    original_seconds: float
+    processed_seconds: float
+    elapsed_ms: float
+    segments: int = 1
+
+    def __str__(self) -> str:
+        return (
+            f"{self.original_bytes / 1024:.0f} KB -> {self.processed_bytes / 1024:.0f} KB, "
+            f"{self.original_seconds:.1f} sn -> {self.processed_seconds:.1f} sn ses, {self.elapsed_ms:.0f} ms"
+            + (f", {self.segments} parça" if self.segments > 1 else "")
+        )
+
+
+def _pcm_to_float(raw: bytes, sample_width: int) -> np.ndarray:
+    if sample_width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if sample_width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        return values.astype(np.float32) / 8388608.0
+    if sample_width == 4:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise ValueError(f"Desteklenmeyen örnek genişliği: {sample_width} bayt")
+
+
+def decode_wav_mono(audio_file: IO[bytes]) -> Tuple[np.ndarray, int]:
+    """PCM WAV dosyasını parça parça okuyup kanalların ortalamasıyla mono float32 diziye çevirir."""
+    with wave.open(audio_file, "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        total_frames = wav.getnframes()
+        mono = np.empty(total_frames, dtype=np.float32)
+        position = 0
+        while position < total_frames:
+            raw = wav.readframes(_DECODE_BLOCK_FRAMES)
+            if not raw:
+                break
+            block = _pcm_to_float(raw, sample_width).reshape(-1, channels).mean(axis=1)
+            mono[position:position + len(block)] = block
+            position += len(block)
+    return mono[:position], sample_rate
+
+
+def frame_energies_db(samples: np.ndarray, sample_rate: int, frame_ms: int = VAD_FRAME_MS) -> np.ndarray:
+    """Sabit uzunluktaki çerçevelerin RMS enerjisi (dBFS); son eksik çerçeve atılır."""
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    frame_count = len(samples) // frame_length
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def trim_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    threshold_db: float = AUDIO_SILENCE_THRESHOLD_DB,
+    padding_ms: int = AUDIO_SILENCE_PADDING_MS
+) -> np.ndarray:
+    """Baştaki ve sondaki sessiz çerçeveleri kırpar; hiç konuşma yoksa sesi olduğu gibi döndürür."""
+    energies = frame_energies_db(samples, sample_rate)
+    voiced = np.flatnonzero(energies > threshold_db)
+    if len(voiced) == 0:
+        return samples
+    frame_length = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    return samples[start:end]
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int) -> Tuple[np.ndarray, int]:
+    """
+    FFT ile bant sınırlı yeniden örnekleme: hedef Nyquist üstündeki frekanslar atılır,
+    böylece ayrı bir alçak geçiren filtreye gerek kalmaz. Sadece aşağı örnekleme yapılır.
+    """
+    if sample_rate <= target_rate or len(samples) == 0:
+        return samples, sample_rate
+    output_length = int(round(len(samples) * target_rate / sample_rate))
+    # FFT büyük asal çarpanlı uzunluklarda çok yavaşlar; sonuna sıfır eklenerek hızlı bir
+    # uzunluğa tamamlanır ve fazlası atılır. Dolgulu çıkış uzunluğu yuvarlandığı için
+    # kayıt sonunda en fazla yarım örneklik kayma olur.
+    padded_length = _next_fast_length(len(samples))
+    padded_output_length = max(1, int(round(padded_length * target_rate / sample_rate)))
+    spectrum = np.fft.rfft(samples, padded_length)
+    resampled = np.fft.irfft(spectrum[:padded_output_length // 2 + 1], padded_output_length) * (padded_output_length / padded_length)
+    return resampled[:output_length].astype(np.float32), target_rate
+
+
+def _next_fast_length(n: int) -> int:
+    """n'den büyük veya eşit, sadece 2, 3, 5, 7 çarpanlı en küçük sayı."""
+    candidate = max(1, n)
+    while True:
+        remainder = candidate
+        for factor in (2, 3, 5, 7):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return candidate
+        candidate += 1
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def split_at_silences(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_seconds: float = AUDIO_SEGMENT_MAX_SECONDS,
+    overlap_seconds: float = AUDIO_SEGMENT_OVERLAP_SECONDS,
+    threshold_db: float = AUDIO_SILENCE_THRESHOLD_DB
+) -> List[Tuple[int, int, bool]]:
+    """
+    Sesi en fazla max_seconds (+ örtüşme) uzunluğunda parçalara böler.
+    (başlangıç, bitiş, önceki parçayla örtüşüyor mu) üçlülerini döndürür.
+    """
+    max_length = int(max_seconds * sample_rate)
+    if max_length <= 0 or len(samples) <= max_length:
+        return [(0, len(samples), False)]
+
+    energies = frame_energies_db(samples, sample_rate)
+    frame_length = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    overlap = int(overlap_seconds * sample_rate)
+    segments = []
+    start = 0
+    overlaps_previous = False
+    while len(samples) - start > max_length:
+        low = (start + max_length // 2) // frame_length
+        high = (start + max_length) // frame_length
+        window = energies[low:high]
+        if len(window) == 0:
+            cut, silent = start + max_length, False
+        else:
+            quietest = high - 1 - int(np.argmin(window[::-1])) # eşitlikte en geç nokta
+            cut = quietest * frame_length + frame_length // 2
+            silent = bool(energies[quietest] <= threshold_db)
+        if silent:
+            segments.append((start, cut, overlaps_previous))
+            start = cut
+        else:
+            segments.append((start, min(len(samples), cut + overlap), overlaps_previous))
+            start = max(start + frame_length, cut - overlap)
+        overlaps_previous = not silent
+    segments.append((start, len(samples), overlaps_previous))
+    return segments
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def stitch_transcripts(texts: List[str], overlaps_previous: List[bool]) -> str:
+    """
+    Parça metinlerini sırayla birleştirir. Örtüşen parçalarda önceki metnin sonundaki
+    kelimelerle tekrar eden en uzun baş kısım (en az 2 kelime) atılır.
+    """
+    words: List[str] = []
+    for text, overlapping in zip(texts, overlaps_previous):
+        next_words = text.split()
+        if overlapping and words:
+            tail = [_normalize_word(w) for w in words[-STITCH_MAX_OVERLAP_WORDS:]]
+            head = [_normalize_word(w) for w in next_words[:STITCH_MAX_OVERLAP_WORDS]]
+            for size in range(min(len(tail), len(head)), 1, -1):
+                if tail[-size:] == head[:size]:
+                    next_words = next_words[size:]
+                    break
+        words.extend(next_words)
+    return " ".join(words)
+
+
+def content_hash(audio_file: IO[bytes]) -> str:
+    """Yüklenen dosyanın SHA-256 özeti; dosya belleğe alınmadan parça parça okunur."""
+    audio_file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    audio_file.seek(0)
+    return digest.hexdigest()
+
+
+def spooled_copy(audio_file: IO[bytes], max_memory_bytes: int = 1024 * 1024) -> IO[bytes]:
+    """
+    Dosyanın, kaynağı kapatılsa da okunabilen bağımsız kopyası; max_memory_bytes'tan büyükse
+    diske taşar. Kapatmak çağıranın sorumluluğundadır.
+    """
+    audio_file.seek(0)
+    copy = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    shutil.copyfileobj(audio_file, copy, 1024 * 1024)
+    audio_file.seek(0)
+    copy.seek(0)
+    return copy
+
+
+def _is_wav(audio_file: IO[bytes]) -> bool:
+    header = audio_file.read(12)
+    audio_file.seek(0)
+    return len(header) == 12 and header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+def _file_size(audio_file: IO[bytes]) -> int:
+    audio_file.seek(0, io.SEEK_END)
+    size = audio_file.tell()
+    audio_file.seek(0)
+    return size
+
+
+@dataclass
+class AudioSegment:
+    file: IO[bytes]
+    filename: Optional[str]
+    overlaps_previous: bool = False
+
+
+def _prepare_samples(audio_file: IO[bytes]) -> Tuple[np.ndarray, int, float] | None:
+    """WAV'ı çözer, mono'ya indirger, sessizliği kırpar ve hedef örnekleme hızına indirir."""
+    try:
+        samples, sample_rate = decode_wav_mono(audio_file)
+    except (wave.Error, ValueError, EOFError) as e:
+        log.warning("WAV çözülemedi, ses olduğu gibi gönderilecek", error=str(e))
+        audio_file.seek(0)
+        return None
+    original_seconds = len(samples) / sample_rate if sample_rate else 0.0
+    samples = trim_silence(samples, sample_rate)
+    samples, sample_rate = resample(samples, sample_rate, AUDIO_TARGET_SAMPLE_RATE)
+    audio_file.seek(0)
+    return samples, sample_rate, original_seconds
+
+
+def preprocess_audio(audio_file: IO[bytes], filename: Optional[str]) -> Tuple[IO[bytes], Optional[str], Optional[PreprocessReport]]:
+    """
+    WAV kayıtlarını Whisper için küçültür. Dosya WAV değilse, çözülemiyorsa veya sonuç
+    küçülmüyorsa orijinal dosya döner (rapor None). Senkron ve CPU yoğundur; thread
+    havuzunda çağrılmalıdır.
+    """
+    segments, report = preprocess_segments(audio_file, filename, max_seconds=0)
+    return segments[0].file, segments[0].filename, report
+
+
+def preprocess_segments(
+    audio_file: IO[bytes],
+    filename: Optional[str],
+    max_seconds: float = AUDIO_SEGMENT_MAX_SECONDS
+) -> Tuple[List[AudioSegment], Optional[PreprocessReport]]:
+    """
+    preprocess_audio ile aynı işlemleri yapar, uzun kayıtları ayrıca sessizlik noktalarından
+    parçalara böler (max_seconds <= 0 ise bölmez). WAV dışındaki dosyalar tek parça döner.
+    """
+    audio_file.seek(0)
+    original = [AudioSegment(audio_file, filename)]
+    if not AUDIO_PREPROCESS_ENABLED or not _is_wav(audio_file):
+        return original, None
+
+    started = time.perf_counter()
+    original_bytes = _file_size(audio_file)
+    prepared = _prepare_samples(audio_file)
+    if prepared is None:
+        return original, None
+    samples, sample_rate, original_seconds = prepared
+
+    bounds = split_at_silences(samples, sample_rate, max_seconds) if max_seconds > 0 else [(0, len(samples), False)]
+    encoded = [(encode_wav(samples[start:end], sample_rate), overlapping) for start, end, overlapping in bounds]
+    processed_bytes = sum(len(data) for data, _ in encoded)
+    if len(encoded) == 1 and processed_bytes >= original_bytes:
+        return original, None
+
+    report = PreprocessReport(
+        original_bytes=original_bytes,
+        processed_bytes=processed_bytes,
+        original_seconds=original_seconds,
+        processed_seconds=len(samples) / sample_rate if sample_rate else 0.0,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        segments=len(encoded)
+    )
+    stem = os.path.splitext(filename or "audio")[0]
+    segments = [
+        AudioSegment(io.BytesIO(data), f"{stem}.wav" if len(encoded) == 1 else f"{stem}-{i + 1}.wav", overlapping)
+        for i, (data, overlapping) in enumerate(encoded)
+    ]
+    return segments, report
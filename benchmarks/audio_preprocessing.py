@@ -0,0 +1,92 @@
+"""
+Ses ön işlemesinin (mono, 16 kHz, sessizlik kırpma, uzun kayıtlarda parçalama) boyut ve süre etkisi.
+
+Dosya verilmezse başında ve sonunda sessizlik olan 48 kHz stereo sentetik bir kayıt üretilir.
+--transcribe ile orijinal dosya ve işlenmiş parçalar (eşzamanlı) gerçek Whisper'a gönderilir;
+metinler ve gecikmeler yan yana yazdırılır (OPENAI_API_KEY gerekir).
+
+    python benchmarks/audio_preprocessing.py [--file kayit.wav] [--speech-seconds 20] [--transcribe]
+"""
+import io
+import os
+import sys
+import time
+import wave
+import argparse
+import asyncio
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio
+
+
+def synthetic_recording(sample_rate: int = 48000, lead_s: float = 4.0, speech_s: float = 20.0, tail_s: float = 6.0) -> bytes:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(speech_s * sample_rate)) / sample_rate
+    # Hece benzeri genlik modülasyonlu harmonikler
+    speech = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate([180, 360, 540, 900, 1400]))
+    speech *= 0.25 * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)) ** 2
+    silence = lambda seconds: rng.normal(0, 0.0005, int(seconds * sample_rate))
+    mono = np.concatenate([silence(lead_s), speech, silence(tail_s)])
+    stereo = np.stack([mono, mono * 0.9], axis=1)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(stereo, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+async def transcribe(files):
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI()
+    started = time.perf_counter()
+    texts = await asyncio.gather(*(
+        client.audio.transcriptions.create(model="whisper-1", file=(name, io.BytesIO(data)), response_format="text")
+        for name, data in files
+    ))
+    return [t.strip() for t in texts], (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file")
+    parser.add_argument("--speech-seconds", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--transcribe", action="store_true")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            original = f.read()
+        filename = os.path.basename(args.file)
+    else:
+        original, filename = synthetic_recording(speech_s=args.speech_seconds), "synthetic.wav"
+
+    timings = []
+    for _ in range(args.repeat):
+        segments, report = audio.preprocess_segments(io.BytesIO(original), filename)
+        if report is None:
+            print("Dosya işlenmedi (WAV değil veya küçültülemedi).")
+            return
+        timings.append(report.elapsed_ms)
+    processed = [(s.filename, s.file.getvalue()) for s in segments]
+    processed_bytes = sum(len(data) for _, data in processed)
+
+    print(f"Boyut : {len(original) / 1024:.0f} KB -> {processed_bytes / 1024:.0f} KB ({100 * processed_bytes / len(original):.1f}%)")
+    print(f"Süre  : {report.original_seconds:.1f} sn -> {report.processed_seconds:.1f} sn ses, {len(processed)} parça")
+    print(f"İşlem : medyan {sorted(timings)[len(timings) // 2]:.0f} ms ({args.repeat} tekrar)")
+
+    if args.transcribe:
+        texts, elapsed = asyncio.run(transcribe([(filename, original)]))
+        print(f"[orijinal] {elapsed:.0f} ms: {texts[0]}")
+        texts, elapsed = asyncio.run(transcribe(processed))
+        stitched = audio.stitch_transcripts(texts, [s.overlaps_previous for s in segments])
+        print(f"[işlenmiş] {elapsed:.0f} ms: {stitched}")
+
+
+if __name__ == "__main__":
+    main()
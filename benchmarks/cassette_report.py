@@ -0,0 +1,52 @@
+"""
+CASSETTE_MODE=record ile kaydedilen kasetlerin özeti: servis ve yol başına çağrı sayısı,
+p50/p95/en uzun süre ve ortalama gövde boyutları, ardından en yavaş etkileşimler
+(kayıt başlangıcına göre zamanları ve istek özetiyle). Hangi isteğin tekrar oynatılıp
+profilleneceğini seçmek için kullanılır (bkz. cassettes.py).
+
+    python benchmarks/cassette_report.py [--dir ./cassettes] [--slowest 10]
+"""
+import os
+import sys
+import argparse
+import statistics
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassettes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default=cassettes.CASSETTE_DIR)
+    parser.add_argument("--slowest", type=int, default=10)
+    args = parser.parse_args()
+
+    entries = []
+    for service in ("openai", "supabase"):
+        for entry in cassettes.load(cassettes.service_paths(service, args.dir)):
+            entries.append({**entry, "service": service})
+    if not entries:
+        raise SystemExit(f"{args.dir} altında kaset bulunamadı.")
+
+    routes = defaultdict(list)
+    for entry in entries:
+        routes[(entry["service"], entry["method"], entry["path"])].append(entry)
+
+    print(f"{'servis':<9} {'yol':<45} {'adet':>6} {'p50 ms':>8} {'p95 ms':>8} {'maks ms':>8} {'istek B':>9} {'yanıt B':>9}")
+    for (service, method, path), items in sorted(routes.items(), key=lambda item: -sum(e["elapsed"] for e in item[1])):
+        elapsed = sorted(e["elapsed"] * 1000 for e in items)
+        p95 = elapsed[min(len(elapsed) - 1, int(round(0.95 * (len(elapsed) - 1))))]
+        print(
+            f"{service:<9} {f'{method} {path}':<45} {len(items):>6} {statistics.median(elapsed):>8.1f} {p95:>8.1f} {elapsed[-1]:>8.1f} "
+            f"{statistics.mean(e['request_bytes'] for e in items):>9.0f} {statistics.mean(e['response_bytes'] for e in items):>9.0f}"
+        )
+
+    print(f"\nEn yavaş {args.slowest} etkileşim:")
+    for entry in sorted(entries, key=lambda e: -e["elapsed"])[:args.slowest]:
+        print(f"  {entry['elapsed'] * 1000:>8.1f} ms  t={entry['t']:.3f}s  {entry['service']} {entry['method']} {entry['path']}  status={entry['status']}  sha256={entry['request_sha256'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
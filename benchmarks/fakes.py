@@ -0,0 +1,378 @@
+"""
+OpenAI ve Supabase için ağa çıkmayan sahte servisler (httpx transport'ları).
+
+Uygulamanın kendi istemcileri değiştirilmeden kullanılır: AsyncOpenAI'ye bu transport'lu bir
+httpx.AsyncClient verilir, SupabaseStorage transport parametresiyle oluşturulur (bkz. install).
+Böylece SDK'nın istek/yanıt ayrıştırması ve PostgREST JSON trafiği gerçekteki gibi çalışır;
+yalnızca karşı taraf süreç içindedir.
+
+Her iki sahte servis de şunları destekler:
+- latency: saniye; tek sayı ya da rota başına sözlük ({"chat/completions": 0.8, "*": 0.05})
+- jitter: gecikmeye eklenen 0..jitter saniyelik rastgele pay
+- error_rate / error_status: isteklerin bu oranı verilen HTTP durumuyla döner
+  (OpenAI SDK'sı 429/5xx yanıtlarını kendi geri çekilmesiyle yeniden dener)
+- istek, hata ve gönderilen/alınan bayt sayaçları (stats)
+- blocking: gecikme event loop'ta değil, run_in_threadpool içinde time.sleep ile beklenir.
+  Senkron bir istemcinin thread pool'dan çağrılmasını (her çağrı ağ gecikmesi boyunca
+  Starlette'in varsayılan 40 thread'inden birini tutar) karşılaştırma için taklit eder.
+
+FakeOpenAI chat yanıtlarını uygulamanın istemlerinin beklediği JSON biçiminde üretir;
+canned(eşleşme, içerik) ile mesajlarda geçen bir metne göre sabit yanıt verilebilir.
+FakeSupabase PostgREST isteklerini bellekteki bir SQLiteStorage'a yönlendirir;
+match_chunks için sabit metin parçaları döndürür.
+"""
+import re
+import json
+import time
+import base64
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+import storage
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+
+class FakeService(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        latency: float | Dict[str, float] = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: int = 0,
+        blocking: bool = False
+    ):
+        self.latency = latency if isinstance(latency, dict) else {"*": latency}
+        self.blocking = blocking
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "bytes_sent": 0, "bytes_received": 0}
+
+    def route(self, request: httpx.Request) -> str:
+        raise NotImplementedError
+
+    async def respond(self, request: httpx.Request, route: str) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        route = self.route(request)
+        self.stats["requests"] += 1
+        self.stats["bytes_sent"] += len(request.content)
+
+        delay = self.latency.get(route, self.latency.get("*", 0.0)) + self._random.uniform(0, self.jitter)
+        if delay > 0 and self.blocking:
+            await run_in_threadpool(time.sleep, delay)
+        elif delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            status_code, body = self.error_status, {"error": {"message": f"injected error ({route})", "type": "fake_error"}}
+        else:
+            status_code, body = await self.respond(request, route)
+
+        content = b"" if body is None else json.dumps(body, ensure_ascii=False, default=str).encode()
+        self.stats["bytes_received"] += len(content)
+        return httpx.Response(status_code, headers=JSON_HEADERS if content else None, content=content, request=request)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+# --- OpenAI ---
+
+def _usage(prompt_text: str, completion_text: str) -> Dict[str, Any]:
+    # Yaklaşık token sayısı: 4 karakter ~ 1 token
+    prompt_tokens, completion_tokens = len(prompt_text) // 4, len(completion_text) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0}
+    }
+
+
+class FakeOpenAI(FakeService):
+    def __init__(self, *args, embedding_dimensions: int = 1536, transcript: str = "benchmark transcript", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.embedding_dimensions = embedding_dimensions
+        self.transcript = transcript
+        self._canned: List[Tuple[str, Any]] = []
+        # Tüm dosya adları birbirine eşit benzer olsun diye birim uzunlukta sabit vektör
+        vector = np.full(embedding_dimensions, 1 / np.sqrt(embedding_dimensions), dtype=np.float32)
+        self._embedding_float = vector.tolist()
+        self._embedding_base64 = base64.b64encode(vector.tobytes()).decode()
+
+    def canned(self, match: str, content: Any):
+        """Mesajlarda `match` geçen chat isteklerine `content` (dict ise JSON metni) döndürülür."""
+        self._canned.append((match, content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)))
+
+    def route(self, request: httpx.Request) -> str:
+        return request.url.path.removeprefix("/v1/")
+
+    async def respond(self, request: httpx.Request, route: str) -> Tuple[int, Any]:
+        if route == "chat/completions":
+            return 200, self._chat(json.loads(request.content))
+        if route == "embeddings":
+            return 200, self._embeddings(json.loads(request.content))
+        if route == "audio/transcriptions":
+            # 16 kHz, 16 bit mono WAV varsayımıyla süre
+            return 200, {"task": "transcribe", "language": "english", "duration": len(request.content) / 32000, "text": self.transcript}
+        return 404, {"error": {"message": f"FakeOpenAI bu rotayı desteklemiyor: {route}", "type": "not_found"}}
+
+    def _embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        embedding = self._embedding_base64 if body.get("encoding_format") == "base64" else self._embedding_float
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": embedding} for i in range(len(inputs))],
+            "usage": {"prompt_tokens": sum(len(str(text)) // 4 for text in inputs), "total_tokens": sum(len(str(text)) // 4 for text in inputs)}
+        }
+
+    def _chat(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        system = next((m["content"] for m in body["messages"] if m["role"] == "system"), "")
+        user = next((m["content"] for m in body["messages"] if m["role"] == "user"), "")
+        content = self._chat_content(system, user, body.get("response_format"))
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(system + user, content)
+        }
+
+    def _chat_content(self, system: str, user: str, response_format: Optional[Dict[str, Any]]) -> str:
+        for match, content in self._canned:
+            if match in system or match in user:
+                return content
+        if response_format is None:
+            # Sözel geri bildirim (düz metin)
+            return "The answer covers the main steps of the procedure but omits the safety checks. " * 3
+
+        # Uygulamanın istemlerinin beklediği biçimler (bkz. examai.py)
+        if '"results"' in system:
+            answers = json.loads(user)["student_answers"]
+            return json.dumps({
+                "results": ["correct" if i % 3 else "wrong" for i in range(len(answers))],
+                "reasonings": [f"Doğru: Cevap {i + 1}, temel kabul kriterini karşılamaktadır." for i in range(len(answers))]
+            }, ensure_ascii=False)
+        mcq = re.search(r"toplamda (\d+) adet çoktan seçmeli soru ve her biri için (\d+) şık", user)
+        if mcq:
+            questions, choices = int(mcq.group(1)), int(mcq.group(2))
+            return json.dumps({
+                "questions": [f"Which component is checked in step {i + 1} of the inspection?" for i in range(questions)],
+                "options": [[f"Option {j + 1} for question {i + 1}" for j in range(choices)] for i in range(questions)]
+            })
+        open_ended = re.search(r"toplamda (\d+) adet soru", user)
+        if open_ended:
+            questions = int(open_ended.group(1))
+            return json.dumps({
+                "questions": [{"topic": f"Topic {i + 1}", "question": f"Explain the purpose of inspection step {i + 1}."} for i in range(questions)],
+                "evaluation_rubrics": [{
+                    "anahtar_kavram": "Inspection steps verify the integrity of the launching appliance.",
+                    "kabul_kriterleri": ["brake test", "limit switch check", "wire rope inspection"],
+                    "ret_kriterleri": ["skipping the load test"]
+                } for _ in range(questions)]
+            }, ensure_ascii=False)
+        if "correct_answers" in system:
+            return json.dumps({
+                "questions": ["Walk me through the steps of a davit annual inspection."],
+                "correct_answers": ["- Structural check\n- Brake test\n- Limit switch test\n- Documentation"]
+            })
+        return "{}"
+
+
+# --- Supabase (PostgREST) ---
+
+def _eq(params: Dict[str, str], column: str) -> Optional[str]:
+    value = params.get(column)
+    return value.removeprefix("eq.") if value is not None else None
+
+
+def _columns(params: Dict[str, str]) -> Optional[List[str]]:
+    select = params.get("select", "*")
+    return None if select == "*" else select.split(",")
+
+
+def _without(body: Dict[str, Any], *columns: str) -> Dict[str, Any]:
+    return {key: value for key, value in body.items() if key not in columns}
+
+
+# PostgREST RPC adı -> ExamStorage metodu; argümanlardaki p_ öneki atılır
+RPC_METHODS = {
+    "exam_record_set_element": "set_array_element",
+    "exam_record_set_elements": "set_array_elements",
+    "exam_record_delete_question": "delete_question",
+    "exam_record_apply_answer_edits": "apply_answer_edits",
+    "transcription_cache_get": "get_transcription",
+    "transcription_cache_evict": "evict_transcriptions",
+    "usage_ledger_add": "add_usage"
+}
+RPC_ARGUMENTS = {"create": "create_if_missing"}
+
+
+class FakeSupabase(FakeService):
+    """
+    SupabaseStorage'ın gönderdiği PostgREST isteklerini bellekteki bir SQLiteStorage'a
+    (store) yönlendirir. Kayıt verisi kurulum için doğrudan store üzerinden de yazılabilir.
+    """
+
+    def __init__(self, *args, chunks: int = 50, chunk_chars: int = 800, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = storage.SQLiteStorage(":memory:")
+        words = "davit winch brake hook release lifeboat inspection limit switch wire rope load test hydraulic".split()
+        rng = random.Random(0)
+        self.chunks = [
+            {
+                "id": i,
+                "content": " ".join(rng.choice(words) for _ in range(chunk_chars // 7))[:chunk_chars],
+                "file_name": "Winches Final.pdf",
+                "module_id": "M1",
+                "similarity": 0.9 - i * 0.001
+            }
+            for i in range(chunks)
+        ]
+
+    def route(self, request: httpx.Request) -> str:
+        path = request.url.path.removeprefix("/rest/v1")
+        return path.removeprefix("/") if path.startswith("/rpc/") else f"{request.method} {path.removeprefix('/')}"
+
+    async def respond(self, request: httpx.Request, route: str) -> Tuple[int, Any]:
+        body = json.loads(request.content) if request.content else None
+        if route.startswith("rpc/"):
+            name = route.removeprefix("rpc/")
+            if name == "match_chunks":
+                return 200, self.chunks
+            method = RPC_METHODS.get(name)
+            if method is None:
+                return 404, {"message": f"FakeSupabase bu fonksiyonu desteklemiyor: {name}"}
+            arguments = {RPC_ARGUMENTS.get(key.removeprefix("p_"), key.removeprefix("p_")): value for key, value in body.items()}
+            return 200, await getattr(self.store, method)(**arguments)
+
+        method, table = route.split(" ", 1)
+        handler = getattr(self, f"_{method.lower()}_{table}", None)
+        if handler is None:
+            return 404, {"message": f"FakeSupabase bu isteği desteklemiyor: {route}"}
+        params = dict(request.url.params)
+        prefer = request.headers.get("prefer", "")
+        result = await handler(params, body, prefer)
+        status_code = 201 if method == "POST" else 200
+        if "return=minimal" in prefer:
+            return status_code, None
+        return status_code, result
+
+    # exam_records
+    async def _get_exam_records(self, params, body, prefer):
+        select = params.get("select", "*")
+        keys = (_eq(params, "exam_name"), _eq(params, "student_name"), _eq(params, "question_type"))
+        if select.startswith("value:"):
+            column, *indices = select.removeprefix("value:").split("->")
+            value = await self.store.get_array_element(*keys, column, [int(i) for i in indices])
+            return [{"value": value}] if value is not None else []
+        if keys[0] is None:
+            return []  # ping
+        if keys[1] is not None:
+            record = await self.store.get_record(*keys, _columns(params))
+            return [record] if record else []
+        after = params.get("student_name", "").removeprefix("gt.") or None
+        return await self.store.list_records(keys[0], keys[2], _columns(params), int(params.get("limit", 1000)), after)
+
+    async def _post_exam_records(self, params, body, prefer):
+        record = await self.store.upsert_record(body, return_record="return=representation" in prefer)
+        return [record] if record else []
+
+    async def _delete_exam_records(self, params, body, prefer):
+        keys = (_eq(params, "exam_name"), _eq(params, "student_name"), _eq(params, "question_type"))
+        return [dict(zip(storage.EXAM_RECORD_KEY_COLUMNS, keys))] if await self.store.delete_record(*keys) else []
+
+    async def _get_exam_stats(self, params, body, prefer):
+        stats = await self.store.get_exam_stats(_eq(params, "exam_name"), _eq(params, "question_type"))
+        return [stats] if stats else []
+
+    # önbellekler
+    async def _post_transcription_cache(self, params, body, prefer):
+        await self.store.put_transcription(body["audio_hash"], body["transcript"])
+
+    async def _post_transcription_jobs(self, params, body, prefer):
+        await self.store.insert_transcription_job(_without(body, "created_at", "updated_at"))
+
+    async def _patch_transcription_jobs(self, params, body, prefer):
+        await self.store.update_transcription_job(_eq(params, "job_id"), _without(body, "updated_at"))
+
+    async def _get_transcription_jobs(self, params, body, prefer):
+        job = await self.store.get_transcription_job(_eq(params, "job_id"))
+        return [job] if job else []
+
+    async def _delete_transcription_jobs(self, params, body, prefer):
+        return [{}] * await self.store.evict_transcription_jobs(params["updated_at"].removeprefix("lt."))
+
+    async def _get_idempotency_keys(self, params, body, prefer):
+        entry = await self.store.get_idempotent_response(_eq(params, "key"))
+        return [entry] if entry else []
+
+    async def _post_idempotency_keys(self, params, body, prefer):
+        await self.store.put_idempotent_response(_without(body, "created_at"))
+
+    async def _delete_idempotency_keys(self, params, body, prefer):
+        return [{}] * await self.store.evict_idempotent_responses()
+
+    # evaluation_jobs ve job_queue
+    async def _post_evaluation_jobs(self, params, body, prefer):
+        return [await self.store.insert_job(body["exam_name"])]
+
+    async def _patch_evaluation_jobs(self, params, body, prefer):
+        await self.store.update_job(_eq(params, "id"), _without(body, "updated_at"))
+
+    async def _get_evaluation_jobs(self, params, body, prefer):
+        if "id" in params:
+            job = await self.store.get_job(_eq(params, "id"))
+            return [job] if job else []
+        return await self.store.list_jobs(_eq(params, "status"), _eq(params, "exam_name"))
+
+    async def _post_job_queue(self, params, body, prefer):
+        return [await self.store.insert_queued_job(_without(body, "created_at", "updated_at"))]
+
+    async def _patch_job_queue(self, params, body, prefer):
+        statuses = params["status"].removeprefix("in.(").removesuffix(")").split(",") if "status" in params else None
+        updated = await self.store.update_queued_job(_eq(params, "id"), _without(body, "updated_at"), statuses)
+        return [{"id": _eq(params, "id")}] if updated else []
+
+    async def _get_job_queue(self, params, body, prefer):
+        if "id" in params:
+            job = await self.store.get_queued_job(_eq(params, "id"))
+            return [job] if job else []
+        return await self.store.list_queued_jobs(params["status"].removeprefix("in.(").removesuffix(")").split(","))
+
+    # usage_ledger ve exam_budgets
+    async def _get_usage_ledger(self, params, body, prefer):
+        return await self.store.list_usage(*(_eq(params, column) for column in storage.USAGE_KEY_COLUMNS))
+
+    async def _get_exam_budgets(self, params, body, prefer):
+        budget = await self.store.get_exam_budget(_eq(params, "exam_name"))
+        return [budget] if budget else []
+
+    async def _post_exam_budgets(self, params, body, prefer):
+        await self.store.put_exam_budget(_without(body, "updated_at"))
+
+    async def _delete_exam_budgets(self, params, body, prefer):
+        return [{"exam_name": _eq(params, "exam_name")}] if await self.store.delete_exam_budget(_eq(params, "exam_name")) else []
+
+
+def install(openai: FakeOpenAI, supabase: FakeSupabase):
+    """examai'nin OpenAI istemcisini ve depolama arka ucunu sahte servislere bağlar (lifespan'den önce)."""
+    import examai
+    from openai import AsyncOpenAI
+
+    examai.client._instance = AsyncOpenAI(api_key="benchmark", http_client=httpx.AsyncClient(transport=openai))
+    storage.set_storage(storage.SupabaseStorage("http://supabase.fake", "benchmark", transport=supabase))
@@ -0,0 +1,381 @@
+"""
+Ağsız uçtan uca benchmark paketi: gerçek FastAPI uygulaması süreç içinde (httpx ASGITransport)
+çalıştırılır; OpenAI ve Supabase yerine benchmarks/fakes.py'deki sahte servisler kullanılır
+(gecikme, hata enjeksiyonu, hazır JSON yanıtlar). Her senaryo için throughput, p50/p95/p99
+gecikme, istek başına OpenAI/Supabase çağrısı ve bayt, istemciye dönen bayt ve tracemalloc
+ile ayrı bir turda ölçülen bellek tepe/kalıcı artışı yazdırılır.
+
+Senaryolar:
+  crud-write, crud-read, score, question, answer   50 soruluk kayıt üzerinde CRUD
+  answer-save                                       /update/answer (kaydetme başına bayt)
+  generate-open-ended, generate-mcq, generate-verbal
+  evaluate, feedback-verbal, voice
+  load                                              okuma/yazma karışımı, --load-concurrency (200)
+
+    python benchmarks/offline_suite.py [--scenarios crud-read,evaluate] [--requests 200]
+        [--concurrency 20] [--openai-latency 0.05] [--supabase-latency 0.002] [--jitter 0]
+        [--openai-error-rate 0] [--supabase-error-rate 0] [--canned canned.json]
+        [--questions 50] [--db-client async|threadpool] [--json report.json]
+
+--canned: {"mesajda geçen metin": <yanıt JSON'u veya metni>, ...}; eşleşen chat isteklerine
+bu yanıt döner. ANSWER_BUFFER_ENABLED gibi ortam değişkenleri olduğu gibi geçer (varsayılan
+olarak cevap tamponu kapalıdır, böylece answer-save her kaydetmenin baytını ölçer).
+--db-client threadpool: her Supabase çağrısının gecikmesi thread pool'da bloklanarak beklenir;
+senkron supabase istemcisini run_in_threadpool ile çağıran eski yolla karşılaştırma içindir
+(örn. --scenarios load ile iki çalıştırma).
+"""
+import os
+import io
+import gc
+import sys
+import json
+import time
+import wave
+import random
+import argparse
+import asyncio
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+for name, value in {
+    "OPENAI_API_KEY": "benchmark", "CASTRUMAI_API_KEY": "benchmark", "ANSWER_BUFFER_ENABLED": "0",
+    "LOG_LEVEL": "WARNING", "LEDGER_FLUSH_INTERVAL": "1"
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+
+from fakes import FakeOpenAI, FakeSupabase, install
+
+HEADERS = {"castrumai-apikey": os.environ["CASTRUMAI_API_KEY"]}
+EXAM = "benchmark"
+TOPIC = "M1"
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, openai: FakeOpenAI, supabase: FakeSupabase, questions: int, students: int):
+        self.client = client
+        self.openai = openai
+        self.supabase = supabase
+        self.questions = questions
+        self.students = students  # write senaryolarında önceden oluşturulan öğrenci sayısı
+
+
+Request = Callable[[Context, int], Awaitable[httpx.Response]]
+Setup = Callable[[Context], Awaitable[None]]
+SCENARIOS: Dict[str, Dict[str, Any]] = {}
+
+
+def scenario(name: str, setup: Optional[Setup] = None, concurrency: Optional[str] = None):
+    def decorator(func: Request) -> Request:
+        SCENARIOS[name] = {"request": func, "setup": setup, "concurrency": concurrency}
+        return func
+    return decorator
+
+
+# --- Veri ---
+
+def sentence(rng: random.Random, words: int) -> str:
+    vocabulary = "davit winch brake hook release lifeboat inspection limit switch wire rope load test hydraulic crew".split()
+    return " ".join(rng.choice(vocabulary) for _ in range(words)) + "."
+
+
+def open_ended_record(student: str, questions: int) -> Dict[str, Any]:
+    rng = random.Random(student)
+    return {
+        "exam_name": EXAM, "student_name": student, "question_type": "Open Ended",
+        "questions": [f"Q{i + 1}: {sentence(rng, 25)}" for i in range(questions)],
+        "question_topics": [f"Topic {i % 7}" for i in range(questions)],
+        "evaluation_rubrics": [{
+            "anahtar_kavram": sentence(rng, 12),
+            "kabul_kriterleri": [sentence(rng, 4) for _ in range(3)],
+            "ret_kriterleri": [sentence(rng, 4)]
+        } for _ in range(questions)],
+        "answers": [sentence(rng, 80) for _ in range(questions)],
+        "results": ["correct" if i % 3 else "wrong" for i in range(questions)],
+        "reasonings": [sentence(rng, 20) for _ in range(questions)]
+    }
+
+
+def multiple_choice_body(student: str, questions: int) -> Dict[str, Any]:
+    rng = random.Random(student)
+    return {
+        "exam_name": EXAM, "student_name": student, "question_type": "Multiple Choice",
+        "questions": [f"Q{i + 1}: {sentence(rng, 20)}" for i in range(questions)],
+        "choices": [[f"{letter}) {sentence(rng, 6)}" for letter in "ABCD"] for _ in range(questions)],
+        "correct_answers": [rng.choice("ABCD") for _ in range(questions)],
+        "answers": [rng.choice("ABCD") for _ in range(questions)]
+    }
+
+
+def verbal_record(student: str, questions: int) -> Dict[str, Any]:
+    rng = random.Random(student)
+    return {
+        "exam_name": EXAM, "student_name": student, "question_type": "Verbal Question",
+        "questions": [f"Explain {sentence(rng, 10)}" for _ in range(questions)],
+        "correct_answers": ["\n".join(f"- {sentence(rng, 5)}" for _ in range(4)) for _ in range(questions)],
+        "answers": [sentence(rng, 60) for _ in range(questions)]
+    }
+
+
+def wav_bytes(seed: int, seconds: float = 1.0, rate: int = 16000) -> bytes:
+    # Önbellekten dönmesin diye her yükleme farklı gürültü içerir
+    samples = (np.random.default_rng(seed).standard_normal(int(seconds * rate)) * 3000).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def key(student: str, question_type: str) -> Dict[str, str]:
+    return {"exam_name": EXAM, "student_name": student, "question_type": question_type}
+
+
+# --- Senaryolar ---
+
+async def seed_reader(ctx: Context):
+    await ctx.supabase.store.upsert_record(open_ended_record("reader", ctx.questions), return_record=False)
+
+
+async def seed_evaluations(ctx: Context):
+    for i in range(ctx.students):
+        await ctx.supabase.store.upsert_record(open_ended_record(f"eval-{i}", ctx.questions), return_record=False)
+
+
+async def seed_verbal(ctx: Context):
+    for i in range(ctx.students):
+        await ctx.supabase.store.upsert_record(verbal_record(f"verbal-{i}", 5), return_record=False)
+
+
+@scenario("crud-write")
+async def crud_write(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.post("/exam-record", json=multiple_choice_body(f"writer-{i}", ctx.questions))
+
+
+@scenario("crud-read", setup=seed_reader)
+async def crud_read(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get("/record", params=key("reader", "Open Ended"))
+
+
+@scenario("score", setup=seed_reader)
+async def score(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get("/score", params=key("reader", "Open Ended"))
+
+
+@scenario("question", setup=seed_reader)
+async def question(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get("/question", params={**key("reader", "Open Ended"), "index": i % ctx.questions})
+
+
+@scenario("answer", setup=seed_reader)
+async def answer(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.get("/answer", params={**key("reader", "Open Ended"), "index": i % ctx.questions})
+
+
+@scenario("answer-save", setup=seed_reader)
+async def answer_save(ctx: Context, i: int) -> httpx.Response:
+    body = {**key("reader", "Open Ended"), "index": i % ctx.questions, "answer": sentence(random.Random(i), 80)}
+    return await ctx.client.put("/update/answer", json=body)
+
+
+@scenario("generate-open-ended")
+async def generate_open_ended(ctx: Context, i: int) -> httpx.Response:
+    body = {"exam_name": EXAM, "student_name": f"open-{i}", "number_of_questions": 5, "question_topic": TOPIC}
+    return await ctx.client.post("/generate/open-ended", json=body)
+
+
+@scenario("generate-mcq")
+async def generate_mcq(ctx: Context, i: int) -> httpx.Response:
+    body = {"exam_name": EXAM, "student_name": f"mcq-{i}", "number_of_questions": 5, "number_of_choices": 4, "question_topic": TOPIC}
+    return await ctx.client.post("/generate/mcq", json=body)
+
+
+@scenario("generate-verbal")
+async def generate_verbal(ctx: Context, i: int) -> httpx.Response:
+    body = {"exam_name": EXAM, "student_name": f"verbal-gen-{i}", "number_of_questions": 2, "question_topic": TOPIC}
+    return await ctx.client.post("/generate/verbal", json=body)
+
+
+@scenario("evaluate", setup=seed_evaluations)
+async def evaluate(ctx: Context, i: int) -> httpx.Response:
+    body = {"exam_name": EXAM, "student_name": f"eval-{i % ctx.students}", "question_topic": TOPIC}
+    return await ctx.client.post("/evaluate", json=body)
+
+
+@scenario("feedback-verbal", setup=seed_verbal)
+async def feedback_verbal(ctx: Context, i: int) -> httpx.Response:
+    return await ctx.client.post("/feedback/verbal", json={"exam_name": EXAM, "student_name": f"verbal-{i % ctx.students}"})
+
+
+@scenario("voice", setup=seed_verbal)
+async def voice(ctx: Context, i: int) -> httpx.Response:
+    params = {"exam_name": EXAM, "student_name": f"verbal-{i % ctx.students}", "index": i % 5}
+    return await ctx.client.post("/answers/voice", params=params, files={"file": (f"answer-{i}.wav", wav_bytes(i), "audio/wav")})
+
+
+LOAD_MIX = (crud_read, score, question, answer, answer_save)
+
+
+@scenario("load", setup=seed_reader, concurrency="load_concurrency")
+async def load(ctx: Context, i: int) -> httpx.Response:
+    return await LOAD_MIX[i % len(LOAD_MIX)](ctx, i)
+
+
+# --- Ölçüm ---
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
+async def run_requests(ctx: Context, request: Request, indices: range, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: List[int] = []
+    downloaded = 0
+    pending = iter(indices)
+
+    async def worker():
+        nonlocal downloaded
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                response = await request(ctx, i)
+                statuses.append(response.status_code)
+                downloaded += response.num_bytes_downloaded
+            except Exception:
+                statuses.append(0)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(indices)))))
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies, "statuses": statuses, "downloaded": downloaded}
+
+
+async def measure(ctx: Context, name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    spec = SCENARIOS[name]
+    concurrency = getattr(args, spec["concurrency"]) if spec["concurrency"] else args.concurrency
+    if spec["setup"] is not None:
+        await spec["setup"](ctx)
+
+    warmup = min(args.requests, 5)
+    await run_requests(ctx, spec["request"], range(0, warmup), concurrency)
+
+    openai_before, supabase_before = ctx.openai.snapshot(), ctx.supabase.snapshot()
+    timed = await run_requests(ctx, spec["request"], range(warmup, warmup + args.requests), concurrency)
+    openai_after, supabase_after = ctx.openai.snapshot(), ctx.supabase.snapshot()
+
+    allocation = {}
+    if args.alloc_requests:
+        start = warmup + args.requests
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await run_requests(ctx, spec["request"], range(start, start + args.alloc_requests), concurrency)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocation = {"peak_mib": (peak - baseline) / 2**20, "retained_kib_per_request": (current - baseline) / 1024 / args.alloc_requests}
+
+    count = len(timed["latencies"])
+    latencies = sorted(timed["latencies"])
+    per_request = lambda before, after, field: (after[field] - before[field]) / count
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": count,
+        "errors": sum(1 for code in timed["statuses"] if code == 0 or code >= 400),
+        "throughput_rps": count / timed["elapsed"],
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "openai_calls_per_request": per_request(openai_before, openai_after, "requests"),
+        "db_calls_per_request": per_request(supabase_before, supabase_after, "requests"),
+        "db_bytes_sent_per_request": per_request(supabase_before, supabase_after, "bytes_sent"),
+        "db_bytes_received_per_request": per_request(supabase_before, supabase_after, "bytes_received"),
+        "response_bytes_per_request": timed["downloaded"] / count,
+        **allocation
+    }
+
+
+def print_report(results: List[Dict[str, Any]]):
+    header = f"{'senaryo':<20} {'eşz.':>5} {'hata':>5} {'istek/sn':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'openai/i':>8} {'db/i':>5} {'db B↑/i':>9} {'db B↓/i':>9} {'yanıt B/i':>9} {'tepe MiB':>8} {'kalıcı KiB/i':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<20} {r['concurrency']:>5} {r['errors']:>5} {r['throughput_rps']:>9.1f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['openai_calls_per_request']:>8.1f} "
+            f"{r['db_calls_per_request']:>5.1f} {r['db_bytes_sent_per_request']:>9.0f} {r['db_bytes_received_per_request']:>9.0f} "
+            f"{r['response_bytes_per_request']:>9.0f} {r.get('peak_mib', 0):>8.2f} {r.get('retained_kib_per_request', 0):>12.1f}"
+        )
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import main
+    import examai
+
+    latency = {"*": args.openai_latency}
+    openai = FakeOpenAI(latency, jitter=args.jitter, error_rate=args.openai_error_rate, seed=1)
+    supabase = FakeSupabase(
+        args.supabase_latency, jitter=args.jitter, error_rate=args.supabase_error_rate, seed=2,
+        blocking=args.db_client == "threadpool"
+    )
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as f:
+            for match, content in json.load(f).items():
+                openai.canned(match, content)
+    install(openai, supabase)
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Bilinmeyen senaryo: {', '.join(unknown)}. Geçerli senaryolar: {', '.join(SCENARIOS)}")
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers=HEADERS, timeout=None) as client:
+            while not examai.file_name_embeddings_ready():
+                await asyncio.sleep(0.01)
+            ctx = Context(client, openai, supabase, args.questions, students=5 + args.requests + args.alloc_requests)
+            for name in names:
+                results.append(await measure(ctx, name, args))
+                if args.progress:
+                    print_report(results[-1:])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="all", help=f"virgülle ayrılmış: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--load-concurrency", type=int, default=200)
+    parser.add_argument("--alloc-requests", type=int, default=50, help="tracemalloc turundaki istek sayısı (0 ile atlanır)")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--supabase-latency", type=float, default=0.002)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-client", choices=("async", "threadpool"), default="async", help="threadpool: senkron istemcili eski yolun taklidi")
+    parser.add_argument("--canned", help="chat yanıtları için {eşleşme: yanıt} JSON dosyası")
+    parser.add_argument("--json", help="sonuçların yazılacağı dosya (regresyon karşılaştırması için)")
+    parser.add_argument("--progress", action="store_true", help="her senaryo bitince satırını yazdır")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
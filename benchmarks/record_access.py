@@ -0,0 +1,123 @@
+"""
+50 soruluk bir açık uçlu kayıtta tek alanlık okuma/yazmaların veritabanı trafiği: tüm kaydı
+okuyup (select=*) yazan eski erişim biçimi ile yalnızca gereken sütunu okuyan / diziyi sunucuda
+düzenleyen güncel examai fonksiyonları karşılaştırılır.
+
+İstekler üretimdeki SupabaseStorage'dan benchmarks/fakes.py'deki sahte PostgREST'e gider;
+işlem başına çağrı sayısı, gönderilen/alınan bayt ve p50/p95 süre yazdırılır.
+
+    python benchmarks/record_access.py [--questions 50] [--repeat 200] [--supabase-latency 0]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from offline_suite import EXAM, open_ended_record, percentile, sentence
+from fakes import FakeOpenAI, FakeSupabase, install
+
+import examai
+import storage
+
+STUDENT = "reader"
+KEY = (EXAM, STUDENT, "Open Ended")
+
+
+# --- Eski erişim biçimi: her işlem tüm kaydı okur, yazmalar tüm kaydı geri gönderir ---
+
+async def full_record_answer_save(i: int):
+    record = await storage.get_storage().get_record(*KEY)
+    answers = record['answers']
+    while len(answers) <= i:
+        answers.append(None)
+    answers[i] = sentence(random.Random(i), 80)
+    return await storage.get_storage().upsert_record(record)
+
+
+async def full_record_score(i: int):
+    return (await storage.get_storage().get_record(*KEY)).get('total_score')
+
+
+async def full_record_question(i: int):
+    return (await storage.get_storage().get_record(*KEY))['questions'][i]
+
+
+async def full_record_answer(i: int):
+    return (await storage.get_storage().get_record(*KEY))['answers'][i]
+
+
+# --- Güncel examai fonksiyonları ---
+
+async def answer_save(i: int):
+    return await examai.update_answer(*KEY, i, sentence(random.Random(i), 80))
+
+
+async def score(i: int):
+    return await examai.get_total_score(*KEY)
+
+
+async def question(i: int):
+    return await examai.get_question(*KEY, i)
+
+
+async def answer(i: int):
+    return await examai.get_answer(*KEY, i)
+
+
+OPERATIONS: Dict[str, Dict[str, Callable[[int], Awaitable]]] = {
+    "answer-save": {"tüm kayıt": full_record_answer_save, "güncel": answer_save},
+    "score": {"tüm kayıt": full_record_score, "güncel": score},
+    "question": {"tüm kayıt": full_record_question, "güncel": question},
+    "answer": {"tüm kayıt": full_record_answer, "güncel": answer},
+}
+
+
+async def measure(supabase: FakeSupabase, operation: Callable[[int], Awaitable], questions: int, repeat: int) -> Dict[str, float]:
+    await operation(0)
+    before = supabase.snapshot()
+    latencies: List[float] = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        await operation(i % questions)
+        latencies.append(time.perf_counter() - started)
+    after = supabase.snapshot()
+    latencies.sort()
+    return {
+        "calls": (after["requests"] - before["requests"]) / repeat,
+        "sent": (after["bytes_sent"] - before["bytes_sent"]) / repeat,
+        "received": (after["bytes_received"] - before["bytes_received"]) / repeat,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000
+    }
+
+
+async def run(args: argparse.Namespace):
+    supabase = FakeSupabase(args.supabase_latency)
+    install(FakeOpenAI(), supabase)
+    await supabase.store.upsert_record(open_ended_record(STUDENT, args.questions), return_record=False)
+
+    header = f"{'işlem':<12} {'erişim':<10} {'db/i':>5} {'db B↑/i':>9} {'db B↓/i':>9} {'p50 ms':>8} {'p95 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, variants in OPERATIONS.items():
+        for variant, operation in variants.items():
+            r = await measure(supabase, operation, args.questions, args.repeat)
+            print(f"{name:<12} {variant:<10} {r['calls']:>5.1f} {r['sent']:>9.0f} {r['received']:>9.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+    await storage.get_storage().close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--supabase-latency", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
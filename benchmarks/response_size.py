@@ -0,0 +1,113 @@
+"""
+100 soruluk bir açık uçlu kaydın /record yanıtı için serileştirme CPU süresi ve gönderilen bayt.
+
+Serileştirme: FastAPI'nin varsayılan yolu (jsonable_encoder + json.dumps) ile FastJSONResponse
+(orjson) karşılaştırılır. Bayt: kayıt SQLite arka ucuna yazılıp uygulama süreç içinde
+(httpx ASGITransport) çağrılır; sıkıştırmasız, gzip ve (brotli kuruluysa) br yanıt boyutları
+ve istek başına sunucu CPU süresi yazdırılır. OpenAI veya Supabase'e bağlanılmaz.
+
+    python benchmarks/response_size.py [--questions 100] [--repeat 200]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import asyncio
+
+os.environ.update(
+    STORAGE_BACKEND="sqlite", SQLITE_PATH=":memory:", OPENAI_API_KEY="benchmark",
+    CASTRUMAI_API_KEY="benchmark", ANSWER_BUFFER_ENABLED="0"
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import responses
+from responses import FastJSONResponse
+
+HEADERS = {"castrumai-apikey": "benchmark"}
+
+
+WORDS = (
+    "öğrenci kavram açıklama örnek sistem veri model süreç yöntem sonuç analiz tasarım bellek ağ "
+    "algoritma karmaşıklık performans güvenlik protokol katman istemci sunucu sorgu tablo indeks "
+    "değerlendirme kriter eksik doğru yanlış kısmen gerekçe karşılaştırma avantaj dezavantaj"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def open_ended_record(questions: int) -> dict:
+    # Sıkıştırma oranı gerçekçi olsun diye metinler tekrar etmeyen rastgele kelimelerden üretilir
+    rng = random.Random(0)
+    return {
+        "exam_name": "benchmark",
+        "student_name": "student",
+        "question_type": "Open Ended",
+        "questions": [f"Soru {i + 1}: {text(rng, 30)}" for i in range(questions)],
+        "question_topics": [f"Konu {i % 7}" for i in range(questions)],
+        "evaluation_rubrics": [
+            {"criteria": [
+                {"name": f"Kriter {j + 1}", "description": text(rng, 15), "points": 5}
+                for j in range(4)
+            ]}
+            for _ in range(questions)
+        ],
+        "answers": [text(rng, 120) for _ in range(questions)],
+        "results": [str(i % 21) for i in range(questions)],
+        "reasonings": [text(rng, 50) for _ in range(questions)]
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat * 1000
+
+
+async def wire_sizes(record: dict, repeat: int):
+    import httpx
+    import examai
+    import main
+
+    async def skip_embeddings():
+        pass
+
+    examai.initialize_file_name_embeddings = skip_embeddings
+    params = {"exam_name": record["exam_name"], "student_name": record["student_name"], "question_type": record["question_type"]}
+    encodings = ["identity", "gzip"] + (["br"] if responses.brotli is not None else [])
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers=HEADERS) as client:
+            await client.post("/exam-record", json=record)
+            for encoding in encodings:
+                started = time.process_time()
+                for _ in range(repeat):
+                    async with client.stream("GET", "/record", params=params, headers={"Accept-Encoding": encoding}) as response:
+                        body = b"".join([chunk async for chunk in response.aiter_raw()])
+                elapsed = (time.process_time() - started) / repeat * 1000
+                print(f"{encoding:>8}: {len(body) / 1024:7.1f} KB, istek başına {elapsed:5.2f} ms CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    record = open_ended_record(args.questions)
+    content = {"exam_name": "benchmark", "student_name": "student", "question_type": "Open Ended", "record": record}
+
+    default_ms = timed(lambda: JSONResponse(jsonable_encoder(content)), args.repeat)
+    fast_ms = timed(lambda: FastJSONResponse(content), args.repeat)
+    print(f"Serileştirme ({args.questions} soru): varsayılan {default_ms:.2f} ms, orjson {fast_ms:.2f} ms ({default_ms / fast_ms:.0f}x)")
+    asyncio.run(wire_sizes(record, max(1, args.repeat // 10)))
+
+
+if __name__ == "__main__":
+    main()
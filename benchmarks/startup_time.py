@@ -0,0 +1,124 @@
+"""
+Açılış süresi benchmark'ı: `import main` süresi, sürecin ilk isteğe cevap verme süresi,
+/health/ready'nin 200 dönme süresi ve ilk kayıt isteklerinin gecikmesi.
+
+Sunucu ayrı bir süreçte SQLite arka ucuyla çalıştırılır. OpenAI yerine bu script içinde
+çalışan ve --embedding-latency kadar bekleyip sahte embedding döndüren bir HTTP sunucusu
+kullanılır (OPENAI_BASE_URL); gerçek OpenAI veya Supabase'e bağlanılmaz.
+
+    python benchmarks/startup_time.py [--repeat 5] [--embedding-latency 1.0]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {"castrumai-apikey": "benchmark"}
+
+
+def fake_openai_server(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            inputs = body.get("input") or []
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            time.sleep(latency)
+            payload = json.dumps({
+                "object": "list",
+                "model": body.get("model", "text-embedding-3-small"),
+                "data": [{"object": "embedding", "index": i, "embedding": [0.1] * 8} for i in range(len(inputs))],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_env(openai_url: str, sqlite_path: str) -> dict:
+    return {
+        **os.environ,
+        "STORAGE_BACKEND": "sqlite", "SQLITE_PATH": sqlite_path, "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": openai_url, "CASTRUMAI_API_KEY": "benchmark", "ANSWER_BUFFER_ENABLED": "0"
+    }
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1]) * 1000
+
+
+def measure_server(env: dict, port: int) -> dict:
+    import httpx
+
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    timings = {}
+    try:
+        with httpx.Client(base_url=base, headers=HEADERS, timeout=30) as client:
+            while "live" not in timings:
+                try:
+                    if client.get("/health/live").status_code == 200:
+                        timings["live"] = (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    time.sleep(0.01)
+
+            request_started = time.perf_counter()
+            client.post("/exam-record", json={"exam_name": "benchmark", "student_name": "s", "question_type": "Open Ended", "questions": ["q"]})
+            timings["first_write"] = (time.perf_counter() - request_started) * 1000
+            request_started = time.perf_counter()
+            client.get("/record", params={"exam_name": "benchmark", "student_name": "s", "question_type": "Open Ended"})
+            timings["first_read"] = (time.perf_counter() - request_started) * 1000
+
+            while client.get("/health/ready").status_code != 200:
+                time.sleep(0.01)
+            timings["ready"] = (time.perf_counter() - started) * 1000
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--embedding-latency", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8797)
+    args = parser.parse_args()
+
+    openai = fake_openai_server(args.embedding_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(f"http://127.0.0.1:{openai.server_address[1]}/v1", os.path.join(tmp, "startup.db"))
+        imports = [measure_import(env) for _ in range(args.repeat)]
+        runs = [measure_server(env, args.port) for _ in range(args.repeat)]
+    openai.shutdown()
+
+    median = lambda key: statistics.median(run[key] for run in runs)
+    print(f"import main          : medyan {statistics.median(imports):.0f} ms")
+    print(f"ilk cevap (liveness) : medyan {median('live'):.0f} ms (süreç başlangıcından)")
+    print(f"ilk yazma / okuma    : medyan {median('first_write'):.1f} / {median('first_read'):.1f} ms")
+    print(f"hazır (readiness)    : medyan {median('ready'):.0f} ms (embedding gecikmesi {args.embedding_latency * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
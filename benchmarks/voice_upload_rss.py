@@ -0,0 +1,109 @@
+"""
+/answers/voice için bellek benchmark'ı: 50 eşzamanlı ses yüklemesinde sunucunun tepe RSS değeri.
+
+Sunucu ayrı bir süreçte SQLite arka ucu ve sahte (dosyayı parça parça okuyan) bir Whisper
+çağrısıyla çalıştırılır; OpenAI veya Supabase'e bağlanılmaz.
+
+    python benchmarks/voice_upload_rss.py [--uploads 50] [--size-mb 20]
+"""
+import os
+import sys
+import time
+import argparse
+import asyncio
+import resource
+import types
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {"castrumai-apikey": "benchmark"}
+
+
+def serve(port: int):
+    os.environ.update(
+        STORAGE_BACKEND="sqlite", SQLITE_PATH=":memory:", OPENAI_API_KEY="benchmark",
+        CASTRUMAI_API_KEY="benchmark", ANSWER_BUFFER_ENABLED="0"
+    )
+    sys.path.insert(0, ROOT)
+    import uvicorn
+    import examai
+    import main
+
+    async def fake_transcription(model, file, response_format):
+        audio_file = file[1] if isinstance(file, tuple) else file
+        audio_file.seek(0)
+        while audio_file.read(64 * 1024):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.5)
+        return types.SimpleNamespace(text="benchmark", duration=1.0)
+
+    async def skip_embeddings():
+        pass
+
+    examai.client.audio.transcriptions.create = fake_transcription
+    examai.initialize_file_name_embeddings = skip_embeddings
+
+    @main.app.get("/_rss")
+    async def rss():
+        return {"maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    uvicorn.run(main.app, port=port, log_level="warning")
+
+
+async def run(port: int, uploads: int, size_mb: int):
+    import httpx
+
+    base = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base, headers=HEADERS, timeout=300) as client:
+        for _ in range(100):
+            try:
+                await client.get("/_rss")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        for i in range(uploads):
+            await client.post("/exam-record", json={
+                "exam_name": "benchmark", "student_name": f"s{i}", "question_type": "Verbal Question", "questions": ["q"]
+            })
+        baseline = (await client.get("/_rss")).json()["maxrss_kb"]
+
+        payload = b"\0" * (size_mb * 1024 * 1024)
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post(
+                "/answers/voice",
+                params={"exam_name": "benchmark", "student_name": f"s{i}", "index": 0},
+                files={"file": ("answer.wav", payload, "audio/wav")}
+            )
+            for i in range(uploads)
+        ])
+        elapsed = time.perf_counter() - started
+        peak = (await client.get("/_rss")).json()["maxrss_kb"]
+
+    statuses = sorted({r.status_code for r in responses})
+    print(f"{uploads} x {size_mb} MB yükleme, durum kodları {statuses}, süre {elapsed:.1f} sn")
+    print(f"RSS başlangıç {baseline / 1024:.0f} MB, tepe {peak / 1024:.0f} MB (+{(peak - baseline) / 1024:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], cwd=ROOT)
+    try:
+        asyncio.run(run(args.port, args.uploads, args.size_mb))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
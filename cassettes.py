@@ -0,0 +1,232 @@
+import os
+import glob
+import gzip
+import time
+import base64
+import asyncio
+import hashlib
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Tuple
+
+import httpx
+import orjson
+from dotenv import load_dotenv
+
+import logs
+
+load_dotenv()
+
+# --- Kayıt / Tekrar Oynatma (Kaset) Katmanı ---
+# OpenAI ve Supabase trafiği httpx transport seviyesinde kaydedilir veya kayıttan oynatılır;
+# uygulama kodu değişmez (bkz. examai._LazyOpenAIClient ve storage.get_storage).
+#   CASSETTE_MODE=record: her istek/yanıt çifti süresiyle birlikte CASSETTE_DIR altına
+#     servis ve süreç başına bir gzip'li JSON Lines dosyasına yazılır
+#     ({servis}-{pid}.jsonl.gz). JSON gövdeler (prompt'lar, kayıtlar) olduğu gibi saklanır;
+#     ses gibi JSON olmayan istek gövdelerinin yalnızca SHA-256 özeti ve boyutu tutulur.
+#     Yetkilendirme başlıkları yazılmaz, ancak kasetler öğrenci verisi ve prompt'ları içerir.
+#   CASSETTE_MODE=replay: ağa çıkılmaz; istekler önce birebir (yöntem, yol, sorgu, gövde
+#     özeti), bulunamazsa aynı yöntem ve yoldaki sıradaki kullanılmamış kayıtla eşleştirilir.
+#     Yanıt, kaydedilen süre x CASSETTE_LATENCY_SCALE kadar beklendikten sonra döner
+#     (1 = orijinal gecikmeler, 0 = beklemeden). CASSETTE_STRICT=1 ile yalnızca birebir
+#     eşleşme kabul edilir; eşleşmeyen istekler CassetteMissError ile başarısız olur.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "./cassettes")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1"))
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT", "0") != "0"
+
+CASSETTE_MODES = ("off", "record", "replay")
+if CASSETTE_MODE not in CASSETTE_MODES:
+    raise ValueError(f"Geçersiz CASSETTE_MODE: '{CASSETTE_MODE}'. {', '.join(CASSETTE_MODES)} olmalıdır.")
+
+log = logs.get_logger("examai.cassettes")
+
+
+class CassetteMissError(httpx.TransportError):
+    """Replay modunda isteğe karşılık gelen kayıt bulunamadı."""
+
+
+def _is_json(content_type: str) -> bool:
+    return "json" in content_type
+
+
+def _encode_body(content: bytes, content_type: str) -> Any:
+    if not content:
+        return None
+    if _is_json(content_type):
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return {"base64": base64.b64encode(content).decode()}
+
+
+def _decode_body(body: Any) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, dict) and set(body) == {"base64"}:
+        return base64.b64decode(body["base64"])
+    return orjson.dumps(body)
+
+
+def _request_key(request: httpx.Request) -> Tuple[str, str, str, str]:
+    return (request.method, request.url.path, request.url.query.decode(), hashlib.sha256(request.content).hexdigest())
+
+
+class Cassette:
+    """Bir servisin kayıt dosyası; her satır bir etkileşimdir (ilk satır başlık)."""
+
+    def __init__(self, service: str, directory: str = CASSETTE_DIR):
+        self.service = service
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{service}-{os.getpid()}.jsonl.gz")
+        self._file = gzip.open(self.path, "ab")
+        self._started = time.monotonic()
+        self._write({"cassette": 1, "service": service, "started_at": datetime.now(timezone.utc).isoformat()})
+
+    def _write(self, entry: Dict[str, Any]):
+        self._file.write(orjson.dumps(entry) + b"\n")
+        # Süreç kapanışı beklenmeden de okunabilsin diye her satırdan sonra sıkıştırıcı boşaltılır
+        self._file.flush()
+
+    def record(self, request: httpx.Request, response: httpx.Response, started: float, elapsed: float):
+        request_type = request.headers.get("content-type", "")
+        response_type = response.headers.get("content-type", "")
+        key = _request_key(request)
+        self._write({
+            "t": round(started - self._started, 6),
+            "elapsed": round(elapsed, 6),
+            "method": key[0],
+            "path": key[1],
+            "query": key[2],
+            "request_sha256": key[3],
+            "request_bytes": len(request.content),
+            "request": _encode_body(request.content, request_type) if _is_json(request_type) else None,
+            "status": response.status_code,
+            "content_type": response_type,
+            "response_bytes": len(response.content),
+            "response": _encode_body(response.content, response_type)
+        })
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def load(paths: List[str]) -> List[Dict[str, Any]]:
+    """Kaset dosyalarındaki etkileşimleri dosya sırasıyla okur; yarım kalmış son satırlar atlanır."""
+    entries = []
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            try:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if "method" in entry:
+                        entries.append(entry)
+            except EOFError:
+                pass  # kapatılmadan kesilmiş kayıt; boşaltılan satırlar okunmuştur
+    return entries
+
+
+def service_paths(service: str, directory: str = CASSETTE_DIR) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, f"{service}-*.jsonl.gz")))
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Gerçek transport'a giden istekleri ve yanıtlarını kasete yazar."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        await response.aread()
+        elapsed = time.monotonic() - started
+        try:
+            self.cassette.record(request, response, started, elapsed)
+        except Exception as e:
+            log.warning("Etkileşim kasete yazılamadı", service=self.cassette.service, path=request.url.path, error=str(e))
+        # Gövde okunup açıldığı için yanıt, çağırana sıkıştırmasız yeni bir yanıt olarak verilir
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+        self.cassette.close()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Kasetteki yanıtları, kaydedilen sürelerin latency_scale katı gecikmeyle döndürür."""
+
+    def __init__(self, entries: List[Dict[str, Any]], latency_scale: float = CASSETTE_LATENCY_SCALE, strict: bool = CASSETTE_STRICT):
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._by_key: Dict[Tuple[str, str, str, str], Deque[Dict[str, Any]]] = {}
+        self._by_route: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+        for entry in entries:
+            entry["used"] = False
+            self._by_key.setdefault((entry["method"], entry["path"], entry["query"], entry["request_sha256"]), deque()).append(entry)
+            self._by_route.setdefault((entry["method"], entry["path"]), deque()).append(entry)
+
+    @staticmethod
+    def _next_unused(queue: Deque[Dict[str, Any]] | None) -> Dict[str, Any] | None:
+        while queue:
+            entry = queue.popleft()
+            if not entry["used"]:
+                return entry
+        return None
+
+    def _match(self, request: httpx.Request) -> Dict[str, Any] | None:
+        entry = self._next_unused(self._by_key.get(_request_key(request)))
+        if entry is None and not self.strict:
+            # Prompt'taki rastgele seçimler veya multipart sınırları gövdeyi değiştirir
+            entry = self._next_unused(self._by_route.get((request.method, request.url.path)))
+            if entry is not None:
+                log.debug("Kaset birebir eşleşmedi, aynı yoldaki sıradaki kayıt kullanıldı", method=request.method, path=request.url.path)
+        return entry
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        entry = self._match(request)
+        if entry is None:
+            raise CassetteMissError(f"Kasette karşılığı yok: {request.method} {request.url.path}", request=request)
+        entry["used"] = True
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["elapsed"] * self.latency_scale)
+        headers = {"content-type": entry["content_type"]} if entry["content_type"] else None
+        return httpx.Response(entry["status"], headers=headers, content=_decode_body(entry["response"]), request=request)
+
+
+_cassettes: List[Cassette] = []
+
+
+def transport(service: str, **transport_options: Any) -> httpx.AsyncBaseTransport | None:
+    """
+    CASSETTE_MODE'a göre servisin transport'u: kapalıyken None (istemci kendi transport'unu
+    kurar), record'da transport_options ile kurulan gerçek transport'u saran kaydedici,
+    replay'de CASSETTE_DIR'deki '{service}-*.jsonl.gz' dosyalarından yanıt veren transport.
+    """
+    if CASSETTE_MODE == "record":
+        cassette = Cassette(service)
+        _cassettes.append(cassette)
+        log.info("Trafik kasete kaydediliyor", service=service, path=cassette.path)
+        return RecordingTransport(httpx.AsyncHTTPTransport(**transport_options), cassette)
+    if CASSETTE_MODE == "replay":
+        paths = service_paths(service)
+        entries = load(paths)
+        log.info("Trafik kasetten oynatılıyor", service=service, files=len(paths), interactions=len(entries), latency_scale=CASSETTE_LATENCY_SCALE)
+        return ReplayTransport(entries)
+    return None
+
+
+def close():
+    """Açık kaset dosyalarını kapatır (uygulama kapanışında)."""
+    for cassette in _cassettes:
+        cassette.close()
+    _cassettes.clear()
@@ -0,0 +1,164 @@
+import os
+import asyncio
+from typing import List, Optional, Dict, Any
+
+from fastapi import HTTPException
+
+import examai
+import ledger
+import logs
+import storage
+
+# --- Toplu (Cohort) Değerlendirme İşleri ---
+# Bir sınavın tüm 'Open Ended' kayıtlarını, sınırlı eşzamanlılıkla ve öğrenci bazında
+# ilerleme kaydederek değerlendirir. İş durumu depolama arka ucundaki 'evaluation_jobs'
+# tablosunda tutulur (bkz. sql/evaluation_jobs.sql); yeniden başlatmada kaldığı yerden devam eder.
+EVALUATION_JOB_CONCURRENCY = int(os.getenv("EVALUATION_JOB_CONCURRENCY", "4"))
+EVALUATION_JOB_PAGE_SIZE = int(os.getenv("EVALUATION_JOB_PAGE_SIZE", "100"))
+
+QUESTION_TYPE = "Open Ended"
+
+log = logs.get_logger("examai.evaluation_jobs")
+
+_running_tasks: Dict[str, asyncio.Task] = {}
+# Aynı sınav için eşzamanlı başlatma isteklerinin iki iş oluşturmaması için (süreçler arası
+# koruma evaluation_jobs_one_running_idx benzersiz indeksidir)
+_start_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _update_job(job_id: str, columns: Dict[str, Any]):
+    await storage.get_storage().update_job(job_id, columns)
+
+
+async def get_job(job_id: str) -> Dict[str, Any] | None:
+    return await storage.get_storage().get_job(job_id)
+
+
+async def _find_running_job(exam_name: str) -> Dict[str, Any] | None:
+    jobs = await storage.get_storage().list_jobs(status="running", exam_name=exam_name)
+    return jobs[0] if jobs else None
+
+
+def job_progress(job: Dict[str, Any]) -> Dict[str, Any]:
+    completed = len(job.get('completed_students') or [])
+    failed = len(job.get('failed_students') or {})
+    total = job.get('total') or 0
+    return {
+        "job_id": job['id'],
+        "exam_name": job['exam_name'],
+        "status": job['status'],
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "skipped": len(job.get('skipped_students') or []),
+        "percent": round(100.0 * (completed + failed) / total, 1) if total else 100.0
+    }
+
+
+async def _collect_students(exam_name: str, done: set) -> tuple[List[str], List[str]]:
+    """Cevabı olan ve henüz değerlendirilmemiş öğrencileri ve cevabı olmayanları ayırır."""
+    pending_students = []
+    skipped_students = []
+    async for record in examai.iter_exam_records(exam_name, QUESTION_TYPE, ["answers"], EVALUATION_JOB_PAGE_SIZE):
+        student_name = record['student_name']
+        answers = record.get('answers')
+        if not isinstance(answers, list) or not any(a for a in answers if isinstance(a, str) and a.strip()):
+            skipped_students.append(student_name)
+        elif student_name not in done:
+            pending_students.append(student_name)
+    return pending_students, skipped_students
+
+
+async def _run_job(job: Dict[str, Any]):
+    job_id = job['id']
+    exam_name = job['exam_name']
+    completed: List[str] = list(job.get('completed_students') or [])
+    failed: Dict[str, str] = dict(job.get('failed_students') or {})
+    checkpoint_lock = asyncio.Lock()
+
+    try:
+        pending_students, skipped_students = await _collect_students(exam_name, set(completed))
+        total = len(completed) + len(pending_students)
+        await _update_job(job_id, {"total": total, "skipped_students": skipped_students})
+        log.info("Toplu değerlendirme başladı", job_id=job_id, pending=len(pending_students), completed=len(completed), skipped=len(skipped_students))
+
+        semaphore = asyncio.Semaphore(EVALUATION_JOB_CONCURRENCY)
+
+        async def evaluate_student(student_name: str):
+            async with semaphore:
+                try:
+                    async with ledger.attributed(exam_name, student_name, "evaluate/cohort"):
+                        await examai.evaluate_open_ended_record(exam_name, student_name)
+                    error = None
+                except HTTPException as e:
+                    error = str(e.detail)
+                except Exception as e:
+                    error = str(e)
+
+            # Her öğrenciden sonra ilerleme kaydedilir (checkpoint)
+            async with checkpoint_lock:
+                if error is None:
+                    completed.append(student_name)
+                    failed.pop(student_name, None)
+                else:
+                    log.warning("Toplu değerlendirmede öğrenci başarısız", job_id=job_id, student=student_name, error=error)
+                    failed[student_name] = error
+                await _update_job(job_id, {"completed_students": completed, "failed_students": failed})
+
+        await asyncio.gather(*(evaluate_student(s) for s in pending_students))
+        await _update_job(job_id, {"status": "completed"})
+        log.info("Toplu değerlendirme tamamlandı", job_id=job_id, completed=len(completed), failed=len(failed))
+
+    except asyncio.CancelledError:
+        # Kapanışta iptal edilen iş 'running' olarak kalır ve bir sonraki açılışta devam eder
+        raise
+    except Exception as e:
+        log.error("Toplu değerlendirme sırasında hata oluştu", job_id=job_id, error=str(e))
+        await _update_job(job_id, {"status": "failed", "error": str(e)})
+    finally:
+        _running_tasks.pop(job_id, None)
+
+
+def in_flight() -> Dict[str, int]:
+    """Bu süreçte çalışan toplu değerlendirme işi sayısı (bkz. /metrics)."""
+    return {"running": len(_running_tasks)}
+
+
+def _spawn(job: Dict[str, Any]):
+    if job['id'] not in _running_tasks:
+        _running_tasks[job['id']] = asyncio.create_task(_run_job(job))
+
+
+async def start_cohort_evaluation(exam_name: str) -> Dict[str, Any]:
+    """Sınav için yeni bir iş başlatır; zaten çalışan bir iş varsa onu döndürür."""
+    async with _start_locks.setdefault(exam_name, asyncio.Lock()):
+        job = await _find_running_job(exam_name)
+        if job is None:
+            job = await storage.get_storage().insert_job(exam_name)
+        if job is None:
+            # Başka bir süreç işi aynı anda oluşturmuş
+            job = await _find_running_job(exam_name)
+            if job is None:
+                raise RuntimeError(f"'{exam_name}' için değerlendirme işi oluşturulamadı.")
+        _spawn(job)
+    return job
+
+
+async def resume_evaluation_jobs():
+    """Uygulama açılışında yarım kalmış ('running') işleri kaldıkları yerden sürdürür."""
+    try:
+        jobs = await storage.get_storage().list_jobs(status="running")
+    except Exception as e:
+        log.error("Yarım kalan değerlendirme işleri okunamadı", error=str(e))
+        return
+    for job in jobs or []:
+        log.info("Toplu değerlendirme devam ettiriliyor", job_id=job['id'], exam=job['exam_name'])
+        _spawn(job)
+
+
+async def shutdown():
+    """Çalışan işleri iptal eder; ilerlemeleri zaten kaydedildiği için veri kaybolmaz."""
+    tasks = list(_running_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
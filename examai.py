@@ -1,34 +1,65 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from typing import List, Optional, Dict, Any
-from openai import AsyncOpenAI
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, IO
+from collections import OrderedDict
 import asyncio
+import time
 import json
+import storage
+import scoring
+import audio
+import metrics
+import logs
+import ledger
+import cassettes
+from storage import EXAM_RECORD_COLUMNS
 from fastapi.concurrency import run_in_threadpool
 from fastapi import FastAPI, HTTPException, Header, status, Depends, UploadFile, File
 import math
 
-import pypdf 
-import tiktoken 
 import random # Random import'u da buraya taşındı
 
 load_dotenv()
+
+log_embeddings = logs.get_logger("examai.embeddings")
+log_openai = logs.get_logger("examai.openai")
+log_retrieval = logs.get_logger("examai.retrieval")
+log_generation = logs.get_logger("examai.generation")
+log_evaluation = logs.get_logger("examai.evaluation")
+log_records = logs.get_logger("examai.records")
+log_voice = logs.get_logger("examai.voice")
+
 OPENAI_ASSISTANT_ID_ANSWER_CHECKER = os.getenv("OPENAI_ASSISTANT_ID_ANSWER_CHECKER")
 
 # --- Ortam Değişkenleri ve Konfigürasyon ---
-SUPABASE_URL: str = os.getenv("SUPABASE_URL")
-SUPABASE_KEY: str = os.getenv("SUPABASE_ANON_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # --- Kontroller ---
-if not SUPABASE_URL: raise ValueError("SUPABASE_URL ortam değişkeni ayarlanmamış.")
-if not SUPABASE_KEY: raise ValueError("SUPABASE_KEY (SUPABASE_ANON_KEY) ortam değişkeni ayarlanmamış.")
+# Supabase ayarları sadece STORAGE_BACKEND=supabase iken storage.get_storage() içinde kontrol edilir.
 if not OPENAI_API_KEY: raise ValueError("OPENAI_API_KEY ortam değişkeni ayarlanmamış.")
 
 # --- İstemci Başlatma ---
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+class _LazyOpenAIClient:
+    """
+    AsyncOpenAI istemcisini ilk kullanımda oluşturur. openai paketinin import süresi
+    (~0.4 sn) böylece uygulama açılışından çıkar; isteklerden önce arka plan ısınmasında ödenir.
+    """
+    _instance = None
+
+    def get(self):
+        if self._instance is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            from openai._constants import DEFAULT_CONNECTION_LIMITS
+            # CASSETTE_MODE açıksa trafik kaydedilir veya kasetten oynatılır (bkz. cassettes.py)
+            transport = cassettes.transport("openai", limits=DEFAULT_CONNECTION_LIMITS)
+            http_client = DefaultAsyncHttpxClient(transport=transport) if transport is not None else None
+            self._instance = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+client = _LazyOpenAIClient()
 
 # --- Modül Dosyaları ve Kök Dizin ---
 PDF_BASE_PATH = os.getenv("PDF_BASE_PATH", "./pdfs") 
@@ -156,26 +187,69 @@ async def initialize_file_name_embeddings():
     """
     Uygulama başlangıcında tüm dosya adlarının embedding'lerini oluşturur ve önbelleğe alır.
     """
-    print("--- Embedding önbelleği oluşturuluyor... ---")
+    log_embeddings.info("Dosya adı embedding önbelleği oluşturuluyor", files=len(FILE_LOOKUP_MAP))
     file_names_to_embed = list(FILE_LOOKUP_MAP.keys())
     
     try:
         # Toplu halde embedding isteği gönder
-        response = await client.embeddings.create(
-            input=file_names_to_embed,
-            model="text-embedding-3-small"
-        )
+        with metrics.stage("embedding", "text-embedding-3-small"):
+            response = await client.embeddings.create(
+                input=file_names_to_embed,
+                model="text-embedding-3-small"
+            )
+        _record_usage("text-embedding-3-small", response)
         
         for i, fname_upper in enumerate(file_names_to_embed):
             FILE_NAME_EMBEDDINGS_CACHE[fname_upper] = response.data[i].embedding
             
-        print(f"--- {len(FILE_NAME_EMBEDDINGS_CACHE)} adet dosya adı için embedding önbelleği başarıyla oluşturuldu. ---")
+        log_embeddings.info("Dosya adı embedding önbelleği oluşturuldu", files=len(FILE_NAME_EMBEDDINGS_CACHE))
     
     except Exception as e:
-        print(f"HATA: Embedding önbelleği oluşturulurken kritik bir hata oluştu: {e}")
+        log_embeddings.error("Embedding önbelleği oluşturulamadı", error=str(e))
         # Bu kritik bir hata olduğu için uygulamayı durdurabilir veya hatayı loglayabilirsiniz.
         raise e
 
+# Önbellek açılışı bekletmeden arka planda doldurulur (bkz. warm_up); o sırada gelen
+# istekler aynı ısınma görevini bekler.
+_file_name_embeddings_ready = False
+_file_name_embeddings_task: asyncio.Task | None = None
+
+def file_name_embeddings_ready() -> bool:
+    return _file_name_embeddings_ready
+
+async def _build_file_name_embeddings():
+    global _file_name_embeddings_ready
+    # openai paketi event loop'u bloklamamak için ayrı thread'de import edilir
+    await asyncio.to_thread(client.get)
+    await initialize_file_name_embeddings()
+    _file_name_embeddings_ready = True
+
+async def ensure_file_name_embeddings():
+    """Embedding önbelleği hazır değilse (devam eden veya yeni) ısınma görevini bekler."""
+    global _file_name_embeddings_task
+    if _file_name_embeddings_ready:
+        return
+    if _file_name_embeddings_task is None or _file_name_embeddings_task.done():
+        _file_name_embeddings_task = asyncio.create_task(_build_file_name_embeddings())
+    await asyncio.shield(_file_name_embeddings_task)
+
+async def warm_up(max_delay: float = 60.0):
+    """Açılışta arka planda çalışır; başarısız olursa artan aralıklarla yeniden dener."""
+    delay = 1.0
+    while True:
+        try:
+            await ensure_file_name_embeddings()
+            return
+        except Exception as e:
+            log_embeddings.warning("Embedding ısınması başarısız, tekrar denenecek", retry_in_seconds=delay, error=str(e))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+def _record_usage(model: str, response: Any):
+    """Yanıtın usage alanını hem /metrics sayaçlarına hem maliyet defterine yazar."""
+    metrics.record_usage(model, response)
+    ledger.record_usage(model, response)
+
 async def _run_openai_assistant(assistant_id: str, user_message_content: str) -> str:
     try:
         # Her çağrı için yeni bir thread oluşturulur
@@ -186,10 +260,12 @@ async def _run_openai_assistant(assistant_id: str, user_message_content: str) ->
             content=user_message_content,
         )
 
-        run = await client.beta.threads.runs.create_and_poll(
-            thread_id=thread.id,
-            assistant_id=assistant_id,
-        )
+        with metrics.stage("assistant", "assistant"):
+            run = await client.beta.threads.runs.create_and_poll(
+                thread_id=thread.id,
+                assistant_id=assistant_id,
+            )
+        _record_usage(getattr(run, "model", None) or "assistant", run)
 
         if run.status == 'completed':
             messages = await client.beta.threads.messages.list(thread_id=thread.id)
@@ -203,25 +279,28 @@ async def _run_openai_assistant(assistant_id: str, user_message_content: str) ->
         else:
             raise ValueError(f"Asistan görevi tamamlanamadı. Durum: {run.status}")
     except Exception as e:
-        print(f"OpenAI Asistan çalıştırılırken hata: {e}")
+        log_openai.error("OpenAI Asistan çalıştırılırken hata", assistant_id=assistant_id, error=str(e))
         raise HTTPException(status_code=500, detail=f"OpenAI Asistan yanıt veremedi veya bir hata oluştu: {e}")
 
 async def _call_openai_chat_model(system_message_content: str, user_message_content: str) -> str:
-    print("chat model called")
+    model = ledger.chat_model("gpt-4.1-mini")  # bütçesi dolan sınavlarda daha ucuz model
+    log_openai.debug("Chat modeli çağrılıyor", model=model, prompt=logs.Payload(user_message_content))
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4.1-mini", 
-            messages=[
-                {"role": "system", "content": system_message_content},
-                {"role": "user", "content": user_message_content}
-            ],
-            temperature=0.7, 
-            top_p=1.0,       
-            response_format={"type": "json_object"}
-        )
+        with metrics.stage("chat", model):
+            response = await client.chat.completions.create(
+                model=model, 
+                messages=[
+                    {"role": "system", "content": system_message_content},
+                    {"role": "user", "content": user_message_content}
+                ],
+                temperature=0.7, 
+                top_p=1.0,       
+                response_format={"type": "json_object"}
+            )
+        _record_usage(model, response)
         return response.choices[0].message.content.strip()
     except Exception as e:
-        print(f"OpenAI Chat modeli çalıştırılırken hata: {e}")
+        log_openai.error("OpenAI Chat modeli çalıştırılırken hata", model=model, error=str(e))
         raise HTTPException(status_code=500, detail=f"OpenAI Chat modeli yanıt veremedi veya bir hata oluştu: {e}")
 
 
@@ -230,18 +309,20 @@ async def _call_openai_nano_model_json(system_message_content: str, user_message
     gpt-4o-mini modelini JSON çıktısı bekleyerek çağıran fonksiyon.
     """
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content": system_message_content},
-                {"role": "user", "content": user_message_content}
-            ],
-            temperature=0.5, # Yaratıcılık ve tutarlılık arasında bir denge
-            response_format={"type": "json_object"}
-        )
+        with metrics.stage("chat", "gpt-4.1-nano"):
+            response = await client.chat.completions.create(
+                model="gpt-4.1-nano",
+                messages=[
+                    {"role": "system", "content": system_message_content},
+                    {"role": "user", "content": user_message_content}
+                ],
+                temperature=0.5, # Yaratıcılık ve tutarlılık arasında bir denge
+                response_format={"type": "json_object"}
+            )
+        _record_usage("gpt-4.1-nano", response)
         return response.choices[0].message.content.strip()
     except Exception as e:
-        print(f"OpenAI Nano modeli (JSON) çalıştırılırken hata: {e}")
+        log_openai.error("OpenAI Nano modeli (JSON) çalıştırılırken hata", model="gpt-4.1-nano", error=str(e))
         raise HTTPException(status_code=500, detail=f"OpenAI Nano (JSON) modeli yanıt veremedi: {e}")
 
 
@@ -250,28 +331,32 @@ async def _call_openai_nano_model_text(system_message_content: str, user_message
     gpt-4o-mini modelini düz metin çıktısı bekleyerek çağıran fonksiyon.
     """
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content": system_message_content},
-                {"role": "user", "content": user_message_content}
-            ],
-            temperature=0.7, # Feedback için daha doğal bir dil
-        )
+        with metrics.stage("chat", "gpt-4.1-nano"):
+            response = await client.chat.completions.create(
+                model="gpt-4.1-nano",
+                messages=[
+                    {"role": "system", "content": system_message_content},
+                    {"role": "user", "content": user_message_content}
+                ],
+                temperature=0.7, # Feedback için daha doğal bir dil
+            )
+        _record_usage("gpt-4.1-nano", response)
         return response.choices[0].message.content.strip()
     except Exception as e:
-        print(f"OpenAI Nano modeli (Text) çalıştırılırken hata: {e}")
+        log_openai.error("OpenAI Nano modeli (Text) çalıştırılırken hata", model="gpt-4.1-nano", error=str(e))
         raise HTTPException(status_code=500, detail=f"OpenAI Nano (Text) modeli yanıt veremedi: {e}")
 
 async def _get_embedding(text: str) -> List[float]:
     try:
-        response = await client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
+        with metrics.stage("embedding", "text-embedding-3-small"):
+            response = await client.embeddings.create(
+                input=text,
+                model="text-embedding-3-small"
+            )
+        _record_usage("text-embedding-3-small", response)
         return response.data[0].embedding
     except Exception as e:
-        print(f"Embedding oluşturulurken hata: {e}")
+        log_openai.error("Embedding oluşturulurken hata", model="text-embedding-3-small", error=str(e))
         raise HTTPException(status_code=500, detail=f"Metin embedding'i oluşturulamadı: {e}")
 
 # YENİ: Anahtar kelimeyle alakalı dosyaları bulan semantik arama fonksiyonu
@@ -282,6 +367,12 @@ async def _find_relevant_files_by_keyword(keyword_query: str, top_n_files: int =
     """
     if not keyword_query:
         return []
+
+    # Açılıştaki ısınma henüz bitmediyse dosya adı embedding'leri beklenir
+    try:
+        await ensure_file_name_embeddings()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Dosya adı embedding'leri henüz hazır değil: {e}")
     
     # Sadece kullanıcının sorgusu için embedding oluştur
     query_embedding = await _get_embedding(keyword_query)
@@ -311,19 +402,13 @@ async def _retrieve_relevant_chunks(query_text: str, module_ids: Optional[List[s
     SQL'den tüm eşleşen parçaları çeker (LIMIT kaldırıldı).
     """
     try:
-        print(f"\n--- _retrieve_relevant_chunks başladı, query_text: '{query_text}', module_ids: '{module_ids}', file_names: '{file_names}' ---")
-
         query_embedding = await _get_embedding(query_text)
-        print(f"--- Embedding alındı, boyutu: {len(query_embedding)} ---")
 
         # Dinamik match_threshold belirleniyor
         current_match_threshold = 0.7 # Varsayılan olarak yüksek (genel arama için)
         if (module_ids and len(module_ids) > 0) or (file_names and len(file_names) > 0):
             # Eğer modül veya dosya filtresi varsa, eşiği düşür (daha fazla parça çekmek için)
             current_match_threshold = 0.2 # Bu değer daha önce 0.1 idi, testler için 0.2 iyi olabilir
-            print(f"--- Dinamik Eşik: {current_match_threshold} (Modül/Dosya Filtresi Aktif) ---")
-        else:
-            print(f"--- Dinamik Eşik: {current_match_threshold} (Genel Arama) ---")
 
 
         rpc_args = { 
@@ -334,41 +419,46 @@ async def _retrieve_relevant_chunks(query_text: str, module_ids: Optional[List[s
         
         if module_ids and len(module_ids) > 0: 
             rpc_args['match_module_ids'] = [m.upper() for m in module_ids]
-            print(f"--- RPC'ye Gönderilen match_module_ids: {rpc_args['match_module_ids']} ---")
         else:
             rpc_args['match_module_ids'] = None 
-            print("--- module_ids filtresi uygulanmadı ---")
         
         if file_names and len(file_names) > 0:
             rpc_args['match_file_names'] = [f.upper() for f in file_names] 
-            print(f"--- RPC'ye Gönderilen match_file_names: {rpc_args['match_file_names']} ---")
         else:
             rpc_args['match_file_names'] = None 
-            print("--- file_names filtresi uygulanmadı ---")
-
 
-        print("--- Supabase RPC çağrısı yapılıyor... ---")
+        with metrics.stage("match_chunks"):
+            chunks = await storage.get_storage().match_chunks(**rpc_args)
 
-        response = await run_in_threadpool(
-            lambda: supabase.rpc('match_chunks', rpc_args).execute() 
+        log_retrieval.info(
+            "match_chunks tamamlandı",
+            query=query_text,
+            module_ids=rpc_args['match_module_ids'],
+            file_names=rpc_args['match_file_names'],
+            threshold=current_match_threshold,
+            chunks=len(chunks or [])
         )
+        log_retrieval.debug("match_chunks yanıtı", chunks=logs.Payload(chunks))
         
-        print(f"\n--- Supabase'den Gelen Ham Yanıt Verisi (response.data) ---")
-        print(response.data)
-        print("-----------------------------------------------------------\n")
-        
-        if not response.data:
+        if not chunks:
             return [] # Boş liste döndür
         
-        return response.data # Doğrudan Dict listesi döndürüyoruz
+        return chunks # Doğrudan Dict listesi döndürüyoruz
 
     except Exception as e:
-        print(f"\n--- _retrieve_relevant_chunks fonksiyonu içinde yakalanan hata ---")
-        print(f"Hata detayı: {e}")
-        print("--------------------------------------------------------\n")
+        log_retrieval.error("Metin parçaları çekilemedi", query=query_text, error=str(e))
         raise HTTPException(status_code=500, detail=f"Bilgi çekme sırasında hata oluştu: {e}. Supabase RPC veya embedding servisini kontrol edin.")
 
 
+def _build_retrieval_content(chunks: List[Dict[str, Any]]) -> str:
+    """Çekilen metin parçalarını kaynak başlıklarıyla prompt'a eklenecek tek metinde birleştirir."""
+    with metrics.stage("context"):
+        return "".join(
+            f"--- Kaynak: {chunk_data.get('file_name', 'Bilinmiyor')} ---\n{chunk_data['content']}\n\n"
+            for chunk_data in chunks
+        )
+
+
 # --- Soru Üretme Fonksiyonlarının Güncellenmesi (Her soru için ayrı çağrı ve dinamik konu/dosya seçimi) ---
 
 
@@ -485,9 +575,7 @@ async def generate_open_ended_questions_with_rubrics_in_batch(
     if not all_retrieved_chunks_data:
         raise HTTPException(status_code=404, detail="Bilgi kaynağında ilgili metin bulunamadı.")
         
-    retrieval_content = ""
-    for chunk_data in all_retrieved_chunks_data:
-        retrieval_content += f"--- Kaynak: {chunk_data.get('file_name', 'Bilinmiyor')} ---\n{chunk_data['content']}\n\n"
+    retrieval_content = _build_retrieval_content(all_retrieved_chunks_data)
     
     existing_questions_prompt_part = ""
     if existing_questions:
@@ -585,7 +673,7 @@ Konu Listesi (`topics_to_cover`):
 
                 # Gelen verilerin temel doğruluğunu kontrol et
                 if not batch_questions or not batch_rubrics_raw or len(batch_questions) != len(topic_batches[i]) or len(batch_questions) != len(batch_rubrics_raw):
-                    print(f"Batch {i+1} atlandı: Soru/Rubric sayısı eşleşmiyor veya veri eksik.")
+                    log_generation.warning("Açık uçlu soru parçası atlandı: soru/rubric sayısı eşleşmiyor veya veri eksik", batch=i + 1, response=logs.Payload(response_text))
                     continue
 
                 # Her bir ham rubriği al ve sorusuyla birlikte işlemden geçir
@@ -599,7 +687,7 @@ Konu Listesi (`topics_to_cover`):
                 final_evaluation_rubrics.extend(processed_rubrics_for_batch)
 
             except json.JSONDecodeError:
-                print(f"Batch {i+1} atlandı: JSON ayrıştırma hatası.")
+                log_generation.warning("Açık uçlu soru parçası atlandı: JSON ayrıştırma hatası", batch=i + 1, response=logs.Payload(response_text))
                 continue
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Toplu soru ve rubric üretimi sırasında bir hata oluştu: {str(e)}")
@@ -675,9 +763,7 @@ async def generate_multiple_choice_questions_in_batch(
 
     # --- 2. Adım: Tek ve Toplu API Çağrısı ---
 
-    retrieval_content = ""
-    for chunk_data in all_retrieved_chunks_data: 
-        retrieval_content += f"--- Kaynak: {chunk_data.get('file_name', 'Bilinmiyor')} ---\n{chunk_data['content']}\n\n"
+    retrieval_content = _build_retrieval_content(all_retrieved_chunks_data)
 
     existing_questions_prompt_part = ""
     if existing_questions:
@@ -724,7 +810,7 @@ Konu Listesi (`topics_to_cover`):
         generated_choices = parsed_response["options"]
 
         if len(generated_questions) != number_of_questions:
-            print(f"UYARI: Model beklenen sayıda soru üretmedi. Beklenen: {number_of_questions}, Üretilen: {len(generated_questions)}")
+            log_generation.warning("Model beklenen sayıda çoktan seçmeli soru üretmedi", expected=number_of_questions, generated=len(generated_questions))
             # Handle mismatch if necessary
 
         # --- 3. Adım: Şıkları Karıştırma ve Doğru Cevap Harfini Belirleme ---
@@ -752,7 +838,7 @@ Konu Listesi (`topics_to_cover`):
         }
 
     except Exception as e:
-        print(f"Toplu çoktan seçmeli soru üretiminde hata oluştu: {e}")
+        log_generation.error("Toplu çoktan seçmeli soru üretiminde hata oluştu", error=str(e))
         raise HTTPException(status_code=500, detail=f"Toplu çoktan seçmeli soru üretimi sırasında bir hata oluştu: {e}")
 
 
@@ -785,7 +871,7 @@ async def generate_verbal_questions(
             target_module_ids.append(part)
         retrieval_query_text = f"Information for verbal exam questions from modules {question_topic}."
     else:
-        print(f"DEBUG: '{question_topic}' anahtar kelime olarak yorumlanıyor...")
+        log_generation.debug("Konu anahtar kelime olarak yorumlanıyor", question_topic=question_topic)
         found_files_by_keyword = await _find_relevant_files_by_keyword(question_topic, top_n_files=5)
         
         if found_files_by_keyword:
@@ -849,9 +935,7 @@ async def generate_verbal_questions(
             num_chunks_for_question = min(random.randint(5, 10), len(all_retrieved_chunks_data)) 
             random_chunks_for_this_question = random.sample(all_retrieved_chunks_data, num_chunks_for_question)
             
-            retrieval_content_for_this_question = ""
-            for chunk_data in random_chunks_for_this_question: 
-                retrieval_content_for_this_question += f"--- Kaynak: {chunk_data.get('file_name', 'Bilinmiyor')} ---\n{chunk_data['content']}\n\n"
+            retrieval_content_for_this_question = _build_retrieval_content(random_chunks_for_this_question)
 
             verbal_question_prompt = f"""
 GÖREV:
@@ -882,12 +966,12 @@ Bilgi Kaynağı Metni:
                     generated_feedback_guides.extend(parsed_response["correct_answers"])
                     question_generated_successfully = True
                 else:
-                    print(f"UYARI: Nano model sözel soru üretiminde boş liste döndü. Soru indeksi: {i}, Deneme: {attempt}")
+                    log_generation.warning("Sözel soru üretiminde boş liste döndü", index=i, attempt=attempt)
             except Exception as e:
-                print(f"UYARI: Nano model ile sözel soru üretiminde hata oluştu. Soru indeksi: {i}, Deneme: {attempt}, Hata: {e}")
+                log_generation.warning("Sözel soru üretiminde hata oluştu", index=i, attempt=attempt, error=str(e))
         
         if not question_generated_successfully:
-            print(f"HATA: Sözel Soru {i+1} için {max_attempts_per_question} denemede başarılı soru üretilemedi.")
+            log_generation.error("Sözel soru denemelerin hepsinde üretilemedi", index=i, attempts=max_attempts_per_question)
             
     if len(generated_questions) != number_of_questions:
         raise HTTPException(status_code=500, detail=f"Beklenen sözel soru sayısı ({number_of_questions}) üretilemedi. Üretilen: {len(generated_questions)}.")
@@ -965,333 +1049,725 @@ FORMAT ŞÖYLE OLMALIDIR:
         # Tüm geri bildirim görevlerini eş zamanlı olarak çalıştır
         final_feedbacks = await asyncio.gather(*tasks)
     except Exception as e:
-        print(f"Geri bildirim üretilirken kritik bir asyncio hatası oluştu: {e}")
+        log_generation.error("Sözel geri bildirim üretilemedi", error=str(e))
         raise HTTPException(status_code=500, detail=f"Geri bildirim üretilirken bir hata oluştu: {e}")
 
     return final_feedbacks
 
 
 
+# --- Cevaplar İçin Yazma Tamponu (Write-Behind) ---
+# Canlı sınav sırasında /update/answer her düzenlemede çağrılır. Düzenlemeler
+# (exam_name, student_name, question_type) anahtarıyla bellekte birleştirilir ve
+# kısa aralıklarla veya tampon dolduğunda tek bir toplu RPC ile yazılır.
+# Tampon süreç içidir; birden fazla worker ile çalışırken kapatılmalıdır.
+ANSWER_BUFFER_ENABLED = os.getenv("ANSWER_BUFFER_ENABLED", "1") != "0"
+ANSWER_BUFFER_FLUSH_INTERVAL = float(os.getenv("ANSWER_BUFFER_FLUSH_INTERVAL", "2"))
+ANSWER_BUFFER_MAX_PENDING = int(os.getenv("ANSWER_BUFFER_MAX_PENDING", "200"))
+ANSWER_BUFFER_MAX_KNOWN = int(os.getenv("ANSWER_BUFFER_MAX_KNOWN", "10000"))
+ANSWER_BUFFER_MAX_ATTEMPTS = int(os.getenv("ANSWER_BUFFER_MAX_ATTEMPTS", "10"))
+# Cevap indeksleri 0..ANSWER_MAX_INDEX aralığında olmalıdır. Negatif indeksler kabul edilmez:
+# SQLite ve Postgres (jsonb_set) bunları farklı yorumlar, tamponda ise yazma ancak sonradan
+# başarısız olur. Üst sınır, tek bir yazmanın diziyi devasa boyutlara doldurmasını önler.
+ANSWER_MAX_INDEX = int(os.getenv("ANSWER_MAX_INDEX", "999"))
+
+RecordKey = Tuple[str, str, str]
+
+class AnswerWriteBuffer:
+    def __init__(self, flush_interval: float, max_pending: int, max_known: int, max_attempts: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_known = max_known
+        self.max_attempts = max_attempts
+        # Henüz yazılmamış düzenlemeler: anahtar -> {indeks: cevap}
+        self._pending: Dict[RecordKey, Dict[int, str]] = {}
+        # Şu anda veritabanına yazılmakta olan düzenlemeler (okumalar bunları da görür)
+        self._inflight: Dict[RecordKey, Dict[int, str]] = {}
+        # Veritabanındaki son bilinen answers dizileri (yanıt üretmek için okuma yapmamak adına)
+        self._known: "OrderedDict[RecordKey, List[Any]]" = OrderedDict()
+        # Kayda özgü hatalarla başarısız olan yazma denemeleri (bkz. _write)
+        self._attempts: Dict[RecordKey, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Arka plan döngüsünü durdurur ve bekleyen tüm düzenlemeleri yazar. Döngü iptal
+        edilmez; sürmekte olan yazma bitene kadar beklenir, böylece yoldaki parti kaybolmaz.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return  # son yazma stop() içinde yapılır
+            self._wake.clear()
+            await self.flush()
+
+    def record(self, key: RecordKey, index: int, answer: str):
+        self._pending.setdefault(key, {})[index] = answer
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+
+    def has_pending(self, key: RecordKey) -> bool:
+        return key in self._pending or key in self._inflight
+
+    def pending_answer(self, key: RecordKey, index: int) -> Tuple[bool, Any]:
+        for edits in (self._pending.get(key), self._inflight.get(key)):
+            if edits and index in edits:
+                return True, edits[index]
+        return False, None
+
+    def overlay(self, key: RecordKey, answers: Any) -> Any:
+        """Veritabanından gelen answers dizisinin üzerine bekleyen düzenlemeleri uygular."""
+        edits = {**self._inflight.get(key, {}), **self._pending.get(key, {})}
+        if not edits:
+            return answers
+        merged = list(answers) if isinstance(answers, list) else []
+        for index, value in edits.items():
+            if index < 0:
+                if -index <= len(merged):
+                    merged[index] = value
+                continue
+            while len(merged) <= index:
+                merged.append(None)
+            merged[index] = value
+        return merged
+
+    def known(self, key: RecordKey) -> List[Any] | None:
+        answers = self._known.get(key)
+        if answers is not None:
+            self._known.move_to_end(key)
+        return answers
+
+    def remember(self, key: RecordKey, answers: Any):
+        if not isinstance(answers, list):
+            self._known.pop(key, None)
+            return
+        self._known[key] = answers
+        self._known.move_to_end(key)
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+
+    async def flush_and_discard(self, key: RecordKey):
+        """
+        Anahtarın bekleyen düzenlemelerini yazar ve bilinen cevaplarını unutur; ikisi aynı
+        kilit altında yapılır, böylece arada tampona giren düzenleme sessizce atılmaz.
+        """
+        async with self._flush_lock:
+            await self._flush_locked([key])
+            self._pending.pop(key, None)
+            self._known.pop(key, None)
+
+    async def discard(self, key: RecordKey):
+        """
+        Tüm sütunu yeniden yazan işlemlerden önce bekleyen düzenlemeleri geçersiz kılar.
+        Devam eden bir yazma varsa, yeni yazımın üzerine binmemesi için bitmesi beklenir.
+        """
+        async with self._flush_lock:
+            self._pending.pop(key, None)
+            self._known.pop(key, None)
+
+    async def flush(self, keys: Optional[List[RecordKey]] = None):
+        async with self._flush_lock:
+            await self._flush_locked(keys)
+
+    async def _flush_locked(self, keys: Optional[List[RecordKey]]):
+        if keys is None:
+            batch, self._pending = self._pending, {}
+        else:
+            batch = {key: self._pending.pop(key) for key in keys if key in self._pending}
+        if not batch:
+            return
+
+        self._inflight = batch
+        try:
+            rows = await self._write(batch)
+        finally:
+            self._inflight = {}
+
+        for row in rows:
+            self.remember((row['exam_name'], row['student_name'], row['question_type']), row.get('answers'))
+
+    def _requeue(self, batch: Dict[RecordKey, Dict[int, str]]):
+        # Yazma sürerken gelen daha yeni düzenlemeler önceliklidir
+        for key, answers in batch.items():
+            self._pending[key] = {**answers, **self._pending.get(key, {})}
+
+    async def _write(self, batch: Dict[RecordKey, Dict[int, str]]) -> List[Dict[str, Any]]:
+        """
+        Partiyi tek RPC ile yazar; başarısız olursa kayıtları tek tek dener ki hatalı bir
+        kayıt diğerlerini bekletmesin. Yazılamayan düzenlemeler bekleyenlere geri döner.
+        Kayda özgü hatalar (diğer kayıtlar yazılabiliyor veya veritabanı yanıt veriyorsa)
+        deneme sayılır; max_attempts denemeden sonra düzenlemeler hata günlüğüne yazılıp
+        bırakılır. Veritabanı kesintisinde deneme sayılmaz, düzenlemeler beklemeye devam eder.
+        """
+        remaining = dict(batch)
+        rows: List[Dict[str, Any]] = []
+        errors: Dict[RecordKey, str] = {}
+        try:
+            try:
+                rows = await storage.get_storage().apply_answer_edits(_answer_edits(remaining)) or []
+                remaining.clear()
+            except Exception as e:
+                if len(remaining) == 1:
+                    errors = {key: str(e) for key in remaining}
+                else:
+                    log_records.warning("Cevap tamponu toplu yazılamadı, kayıtlar tek tek deneniyor", records=len(remaining), error=str(e))
+                    for key in list(remaining):
+                        try:
+                            rows += await storage.get_storage().apply_answer_edits(_answer_edits({key: remaining[key]})) or []
+                            del remaining[key]
+                        except Exception as e:
+                            errors[key] = str(e)
+
+            if errors:
+                counted = len(errors) < len(batch) or await self._reachable()
+                for key, error in errors.items():
+                    attempts = self._attempts.get(key, 0) + (1 if counted else 0)
+                    if attempts >= self.max_attempts:
+                        log_records.error(
+                            "Cevap tamponu kaydı yazılamadı, düzenlemeler bırakıldı",
+                            exam=key[0], student=key[1], question_type=key[2], attempts=attempts,
+                            answers={str(index): value for index, value in remaining.pop(key).items()}, error=error
+                        )
+                        self._attempts.pop(key, None)
+                    else:
+                        log_records.warning(
+                            "Cevap tamponu kaydı yazılamadı, düzenlemeler tekrar denenecek",
+                            exam=key[0], student=key[1], question_type=key[2], attempts=attempts, error=error
+                        )
+                        if attempts:
+                            self._attempts[key] = attempts
+                        self._requeue({key: remaining.pop(key)})
+        except BaseException:
+            # İptal (ör. kapanış sırasında) yoldaki düzenlemeleri kaybettirmesin
+            self._requeue(remaining)
+            raise
+
+        for key in batch:
+            if key not in errors:
+                self._attempts.pop(key, None)
+        return rows
+
+    @staticmethod
+    async def _reachable() -> bool:
+        try:
+            await storage.get_storage().ping()
+            return True
+        except Exception:
+            return False
+
+
+def _answer_edits(batch: Dict[RecordKey, Dict[int, str]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "exam_name": key[0],
+            "student_name": key[1],
+            "question_type": key[2],
+            "answers": {str(index): value for index, value in answers.items()}
+        }
+        for key, answers in batch.items()
+    ]
+
+answer_buffer = AnswerWriteBuffer(ANSWER_BUFFER_FLUSH_INTERVAL, ANSWER_BUFFER_MAX_PENDING, ANSWER_BUFFER_MAX_KNOWN, ANSWER_BUFFER_MAX_ATTEMPTS)
+
+
 # --- Veritabanı İşlemleri (exam_name EKLENEREK GÜNCELLENDİ) ---
 
-async def get_student_exam_record(exam_name: str, student_name: str, question_type: str) -> dict | None:
-    """Belirtilen sınav adı, öğrenci ve soru tipi için tek bir sınav kaydını getirir."""
+async def get_student_exam_record(exam_name: str, student_name: str, question_type: str, columns: str = "*") -> dict | None:
+    """
+    Belirtilen sınav adı, öğrenci ve soru tipi için tek bir sınav kaydını getirir.
+    `columns` virgülle ayrılmış sütun listesidir; sadece gereken sütunları çekmek için kullanılır.
+    """
     try:
-        response = await run_in_threadpool(
-            lambda: supabase.table('exam_records')
-            .select("*")
-            .eq("exam_name", exam_name)
-            .eq("student_name", student_name)
-            .eq("question_type", question_type)
-            .single()
-            .execute()
-        )
-        return response.data
+        column_list = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        record = await storage.get_storage().get_record(exam_name, student_name, question_type, column_list)
+        if record and 'answers' in record:
+            key = (exam_name, student_name, question_type)
+            if not answer_buffer.has_pending(key):
+                answer_buffer.remember(key, record['answers'])
+            record['answers'] = answer_buffer.overlay(key, record['answers'])
+        return record
     except Exception as e:
-        if "PGRST" in str(e) and "0 rows" in str(e):
-            return None
-        print(f"Sınav kaydı alınırken hata oluştu: {e}")
+        log_records.error("Sınav kaydı alınırken hata oluştu", error=str(e))
         return None
 
+def _cohort_select(columns: Optional[List[str]]) -> List[str] | None:
+    """İstenen sütunları doğrular; sayfalama anahtarı olan student_name her zaman seçilir."""
+    if not columns:
+        return None
+    unknown = [c for c in columns if c not in EXAM_RECORD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Geçersiz sütun(lar): {', '.join(unknown)}.")
+    return list(dict.fromkeys(["student_name"] + columns))
+
+async def list_exam_records(
+    exam_name: str,
+    question_type: str,
+    columns: Optional[List[str]] = None,
+    limit: int = 100,
+    after: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Bir sınavdaki tüm öğrencilerin kayıtlarını student_name sırasıyla, anahtar
+    tabanlı (keyset) sayfalama ile döndürür. `after`, önceki sayfanın son öğrencisidir.
+    """
+    rows = await storage.get_storage().list_records(exam_name, question_type, _cohort_select(columns), limit, after)
+    for row in rows:
+        if 'answers' in row:
+            row['answers'] = answer_buffer.overlay((exam_name, row['student_name'], question_type), row['answers'])
+    return rows
+
+async def iter_exam_records(
+    exam_name: str,
+    question_type: str,
+    columns: Optional[List[str]] = None,
+    page_size: int = 100
+) -> AsyncIterator[Dict[str, Any]]:
+    """Kayıtları sayfa sayfa çekip tek tek verir; bellekte aynı anda en fazla bir sayfa tutulur."""
+    after = None
+    while True:
+        page = await list_exam_records(exam_name, question_type, columns, page_size, after)
+        for row in page:
+            yield row
+        if len(page) < page_size:
+            return
+        after = page[-1]['student_name']
+
 async def upsert_exam_record(record_data: Dict[str, Any]) -> Dict[str, Any] | None:
     """Bir sınav kaydını ekler veya günceller. Çakışma durumu (exam_name, student_name, question_type) ile kontrol edilir."""
     try:
         if not all(k in record_data for k in ['exam_name', 'student_name', 'question_type']):
             raise ValueError("upsert_exam_record için exam_name, student_name ve question_type zorunludur.")
+
+        if 'answers' in record_data:
+            await answer_buffer.discard((record_data['exam_name'], record_data['student_name'], record_data['question_type']))
             
-        response = await run_in_threadpool(
-            lambda: supabase.table('exam_records')
-            .upsert(record_data, on_conflict='exam_name,student_name,question_type')
-            .execute()
+        with metrics.stage("upsert_record"):
+            return await storage.get_storage().upsert_record(record_data)
+    except Exception as e:
+        log_records.error("Sınav kaydı eklenirken/güncellenirken hata oluştu", error=str(e))
+        return None
+
+async def delete_exam_record(exam_name: str, student_name: str, question_type: str) -> bool:
+    """Sınav kaydını siler; silinecek kayıt yoksa False döndürür."""
+    await answer_buffer.discard((exam_name, student_name, question_type))
+    return await storage.get_storage().delete_record(exam_name, student_name, question_type)
+
+async def upsert_exam_record_columns(exam_name: str, student_name: str, question_type: str, columns: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Sadece verilen sütunları yazar. Kayıt önceden okunmaz ve yanıt olarak tüm satır
+    geri istenmez; dönen değer, gönderilen sütunlardan oluşan kısmi kayıttır.
+    """
+    record_data = {
+        "exam_name": exam_name,
+        "student_name": student_name,
+        "question_type": question_type,
+        **columns
+    }
+    if 'answers' in columns:
+        await answer_buffer.discard((exam_name, student_name, question_type))
+    try:
+        with metrics.stage("upsert_record"):
+            await storage.get_storage().upsert_record(record_data, return_record=False)
+        return record_data
+    except Exception as e:
+        log_records.error("Sınav kaydı sütunları güncellenirken hata oluştu", columns=list(columns), error=str(e))
+        return None
+
+async def _set_record_array_element(
+    exam_name: str,
+    student_name: str,
+    question_type: str,
+    column: str,
+    index: int,
+    value: Any,
+    sub_index: Optional[int] = None,
+    pad_value: Any = None,
+    require_array: bool = False,
+    create_if_missing: bool = False
+) -> List[Any] | None:
+    """
+    Bir dizi sütunundaki tek bir elemanı atomik olarak günceller (Supabase'de
+    `exam_record_set_element` RPC'si, bkz. sql/exam_record_functions.sql).
+    Güncellenmiş diziyi, kayıt bulunamazsa veya indeks geçersizse None döndürür.
+    """
+    try:
+        return await storage.get_storage().set_array_element(
+            exam_name, student_name, question_type, column, index, value,
+            sub_index=sub_index, pad_value=pad_value, require_array=require_array, create_if_missing=create_if_missing
         )
-        return response.data[0]
     except Exception as e:
-        print(f"Sınav kaydı eklenirken/güncellenirken hata oluştu: {e}")
+        log_records.error("Sütundaki eleman güncellenirken hata oluştu", column=column, error=str(e))
         return None
 
+def _partial_record(exam_name: str, student_name: str, question_type: str, **columns: Any) -> Dict[str, Any]:
+    return {"exam_name": exam_name, "student_name": student_name, "question_type": question_type, **columns}
+
 async def update_all_questions_in_record(exam_name: str, student_name: str, question_type: str, new_questions: List[str], new_correct_answers: Optional[List[str]] = None) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
-        record = {"exam_name": exam_name, "student_name": student_name, "question_type": question_type}
+    columns: Dict[str, Any] = {"questions": new_questions}
 
-    record['questions'] = new_questions
-    
     if new_correct_answers is not None:
         if len(new_questions) != len(new_correct_answers):
             raise ValueError("Soru sayısı ile doğru cevap sayısı eşleşmelidir.")
-        record['correct_answers'] = new_correct_answers
-    
-    return await upsert_exam_record(record)
+        columns['correct_answers'] = new_correct_answers
+
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, columns)
 
 async def update_all_choices_in_record(exam_name: str, student_name: str, question_type: str, all_new_choices: List[List[str]]) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
-        record = {"exam_name": exam_name, "student_name": student_name, "question_type": question_type}
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, {"choices": all_new_choices})
 
-    record['choices'] = all_new_choices
-    
-    return await upsert_exam_record(record)
+def check_answer_index(index: int):
+    """Geçersiz cevap indeksinde (bkz. ANSWER_MAX_INDEX) ValueError fırlatır."""
+    if not 0 <= index <= ANSWER_MAX_INDEX:
+        raise ValueError(f"Geçersiz cevap indeksi: {index}. 0 ile {ANSWER_MAX_INDEX} arasında olmalıdır.")
 
 async def update_answer(exam_name: str, student_name: str, question_type: str, index: int, answer: str) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    
-    if not record:
-        record = {"exam_name": exam_name, "student_name": student_name, "question_type": question_type, "answers": []}
-
-    answers = record.get('answers')
-    if not isinstance(answers, list):
-        answers = []
-        record['answers'] = answers
-
-    while len(answers) <= index:
-        answers.append(None)
+    # Tampona alınan düzenleme istemciye onaylanır; yazma sırasında reddedilemez
+    check_answer_index(index)
+    if ANSWER_BUFFER_ENABLED:
+        # Düzenleme tampona yazılır; veritabanına toplu olarak arka planda aktarılır.
+        key = (exam_name, student_name, question_type)
+        answer_buffer.start()
+        answer_buffer.record(key, index, answer)
+        known_answers = answer_buffer.known(key)
+        metrics.cache_result("answer_buffer", known_answers is not None)
+        if known_answers is None:
+            record = await get_student_exam_record(exam_name, student_name, question_type, "answers")
+            answers = record.get('answers') if record else answer_buffer.overlay(key, [])
+        else:
+            answers = answer_buffer.overlay(key, known_answers)
+        return _partial_record(exam_name, student_name, question_type, answers=answers)
 
-    answers[index] = answer
-    
-    record['answers'] = answers
-    
-    return await upsert_exam_record(record)
+    answers = await _set_record_array_element(
+        exam_name, student_name, question_type, 'answers', index, answer, create_if_missing=True
+    )
+    if answers is None:
+        return None
+    return _partial_record(exam_name, student_name, question_type, answers=answers)
 
 async def update_answers_bulk(exam_name: str, student_name: str, question_type: str, new_answers: List[str]) -> dict | None:
-    return await upsert_exam_record({
-        "exam_name": exam_name,
-        "student_name": student_name,
-        "question_type": question_type,
-        "answers": new_answers
-    })
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, {"answers": new_answers})
 
 async def update_results_bulk(exam_name: str, student_name: str, question_type: str, new_results: List[str]) -> dict | None:
-    return await upsert_exam_record({
-        "exam_name": exam_name,
-        "student_name": student_name,
-        "question_type": question_type,
-        "results": new_results
-    })
+    # total_score depolama katmanında results'tan yeniden hesaplanır (bkz. scoring.py)
+    record = await upsert_exam_record_columns(exam_name, student_name, question_type, {"results": new_results})
+    if record is not None:
+        record['total_score'] = scoring.total_score(new_results)
+    return record
 
 async def update_plagiarism_violations_in_record(exam_name: str, student_name: str, question_type: str, violation_text: str) -> dict | None:
-    return await upsert_exam_record({
-        "exam_name": exam_name,
-        "student_name": student_name,
-        "question_type": question_type,
-        "plagiarism_violations": violation_text
-    })
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, {"plagiarism_violations": violation_text})
+
+async def _get_array_element(exam_name: str, student_name: str, question_type: str, column: str, *indices: int) -> Any | None:
+    """
+    Bir dizi sütunundan tek bir elemanı okur; Supabase'de PostgREST JSON yolu
+    (örn. `questions->3`) kullanıldığı için dizinin tamamı ağ üzerinden taşınmaz.
+    """
+    if column == 'answers' and len(indices) == 1:
+        found, value = answer_buffer.pending_answer((exam_name, student_name, question_type), indices[0])
+        if found:
+            return value
+
+    if any(i < 0 for i in indices):
+        # Negatif indeksler Python semantiğiyle sütunun tamamı üzerinden çözülür
+        record = await get_student_exam_record(exam_name, student_name, question_type, column)
+        value = record.get(column) if record else None
+        for i in indices:
+            if not isinstance(value, list) or i >= len(value):
+                return None
+            value = value[i]
+        return value
+
+    try:
+        return await storage.get_storage().get_array_element(exam_name, student_name, question_type, column, list(indices))
+    except Exception as e:
+        log_records.error("Sütundan eleman okunurken hata oluştu", column=column, error=str(e))
+        return None
 
 async def get_questions_all(exam_name: str, student_name: str, question_type: str) -> List[str] | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "questions")
     return record.get('questions') if record and isinstance(record.get('questions'), list) else None
 
 async def get_answers_all(exam_name: str, student_name: str, question_type: str) -> List[str] | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "answers")
     return record.get('answers') if record and isinstance(record.get('answers'), list) else None
 
 async def get_results_all(exam_name: str, student_name: str, question_type: str) -> List[str] | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "results")
     return record.get('results') if record and isinstance(record.get('results'), list) else None
 
 async def get_total_score(exam_name: str, student_name: str, question_type: str) -> float | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "total_score")
     return record.get('total_score') if record and 'total_score' in record else None
 
+async def get_exam_stats(exam_name: str, question_type: str) -> Dict[str, Any]:
+    """Sınavın kayıt sayısı, ortalama puanı, puan histogramı ve soru bazlı geçme oranları (tek satır okuma)."""
+    stats = await storage.get_storage().get_exam_stats(exam_name, question_type)
+    return scoring.format_stats(stats, exam_name, question_type)
+
 async def get_plagiarism_violations(exam_name: str, student_name: str, question_type: str) -> str | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "plagiarism_violations")
     return record.get('plagiarism_violations') if record and 'plagiarism_violations' in record else None
 
+async def get_answer(exam_name: str, student_name: str, question_type: str, index: int) -> str | None:
+    return await _get_array_element(exam_name, student_name, question_type, 'answers', index)
+
+async def get_result(exam_name: str, student_name: str, question_type: str, index: int) -> str | None:
+    return await _get_array_element(exam_name, student_name, question_type, 'results', index)
+
+async def get_correct_answer(exam_name: str, student_name: str, question_type: str, index: int) -> str | None:
+    return await _get_array_element(exam_name, student_name, question_type, 'correct_answers', index)
+
 
 async def update_all_correct_answers_in_record(exam_name: str, student_name: str, question_type: str, new_correct_answers: List[str]) -> dict | None:
     """Bir sınavdaki tüm doğru cevapları toplu olarak günceller."""
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
-        record = {"exam_name": exam_name, "student_name": student_name, "question_type": question_type}
-    
-    record['correct_answers'] = new_correct_answers
-    return await upsert_exam_record(record)
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, {"correct_answers": new_correct_answers})
 
 async def get_correct_answers_all(exam_name: str, student_name: str, question_type: str) -> List[str] | None:
     """Bir sınavdaki tüm doğru cevapları döndürür."""
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "correct_answers")
     return record.get('correct_answers') if record and isinstance(record.get('correct_answers'), list) else None
 
 async def delete_single_question(exam_name: str, student_name: str, question_type: str, index: int) -> dict | None:
     """Belirtilen indeksteki bir soruyu ve ilgili tüm verilerini siler."""
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
+    # İndeksler kayacağı için bekleyen cevap düzenlemeleri önce yazılır
+    key = (exam_name, student_name, question_type)
+    await answer_buffer.flush_and_discard(key)
+    outcome = await storage.get_storage().delete_question(exam_name, student_name, question_type, index)
+    if not outcome:
         return None
 
-    questions = record.get('questions')
-    
-    if not questions:
+    if outcome.get('error') == 'empty':
         raise ValueError("Silinecek soru bulunmuyor (soru listesi boş).")
-        
-    if not (0 <= index < len(questions)):
-        raise ValueError(f"Geçersiz indeks: {index}. Soru sayısı: {len(questions)}.")
-
-    for key in ['questions', 'correct_answers', 'answers', 'results', 'choices']:
-        if key in record and isinstance(record.get(key), list) and index < len(record[key]):
-            record[key].pop(index)
+    if outcome.get('error') == 'index':
+        raise ValueError(f"Geçersiz indeks: {index}. Soru sayısı: {outcome.get('count')}.")
 
-    return await upsert_exam_record(record)
+    return _partial_record(exam_name, student_name, question_type, questions=outcome.get('questions'))
 
 
 async def delete_all_questions(exam_name: str, student_name: str, question_type: str) -> dict | None:
     """Belirtilen sınav türündeki tüm soruları ve ilgili verileri null olarak ayarlar."""
-    record = await get_student_exam_record(exam_name, student_name, question_type)
+    record = await get_student_exam_record(exam_name, student_name, question_type, "questions")
     if not record:
         return None
 
     if not record.get('questions'):
         raise ValueError("Silinecek soru bulunmuyor (soru listesi zaten boş).")
 
-    record['questions'] = None
-    record['correct_answers'] = None
-    record['answers'] = None
-    record['results'] = None
-    record['choices'] = None
-    record['total_score'] = None
-
-    return await upsert_exam_record(record)
+    return await upsert_exam_record_columns(exam_name, student_name, question_type, {
+        "questions": None,
+        "correct_answers": None,
+        "answers": None,
+        "results": None,
+        "choices": None,
+        "total_score": None
+    })
 
 # main.py'deki çağırma uyumluluğunu sağlamak için eklenen/güncellenen fonksiyonlar
 async def get_question(exam_name: str, student_name: str, question_type: str, index: int) -> str | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if record and isinstance(record.get('questions'), list) and index < len(record['questions']):
-        return record['questions'][index]
-    return None
+    return await _get_array_element(exam_name, student_name, question_type, 'questions', index)
 
 async def get_choice(exam_name: str, student_name: str, question_type: str, question_index: int, choice_index: int) -> str | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if record and isinstance(record.get('choices'), list) and question_index < len(record['choices']):
-        if isinstance(record['choices'][question_index], list) and choice_index < len(record['choices'][question_index]):
-            return record['choices'][question_index][choice_index]
-    return None
+    return await _get_array_element(exam_name, student_name, question_type, 'choices', question_index, choice_index)
 
 async def update_question_in_record(exam_name: str, student_name: str, question_type: str, question_index: int, value: str, correct_answer: Optional[str] = None) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
-        return None
-
-    questions = record.get('questions', [])
-    if not isinstance(questions, list):
-        questions = []
-    while len(questions) <= question_index:
-        questions.append(None)
-    questions[question_index] = value
-    record['questions'] = questions
-
+    """Soruyu ve verilmişse doğru cevabını tek işlemde günceller (iki dizi birbirinden kopmaz)."""
+    values: Dict[str, Any] = {'questions': value}
     if correct_answer is not None:
-        correct_answers = record.get('correct_answers', [])
-        if not isinstance(correct_answers, list):
-            correct_answers = []
-        while len(correct_answers) <= question_index:
-            correct_answers.append(None)
-        correct_answers[question_index] = correct_answer
-        record['correct_answers'] = correct_answers
-
-    return await upsert_exam_record(record)
-
-async def update_choice_in_record(exam_name: str, student_name: str, question_type: str, question_index: int, choice_index: int, value: str) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record or not isinstance(record.get('choices'), list):
+        values['correct_answers'] = correct_answer
+    try:
+        arrays = await storage.get_storage().set_array_elements(exam_name, student_name, question_type, question_index, values)
+    except Exception as e:
+        log_records.error("Soru güncellenirken hata oluştu", columns=list(values), error=str(e))
         return None
-
-    choices = record['choices']
-    if not (isinstance(choices, list) and question_index < len(choices) and isinstance(choices[question_index], list) and choice_index < len(choices[question_index])):
+    if arrays is None:
         return None
-    
-    choices[question_index][choice_index] = value
-    record['choices'] = choices
+    return _partial_record(exam_name, student_name, question_type, **arrays)
 
-    return await upsert_exam_record(record)
+async def update_choice_in_record(exam_name: str, student_name: str, question_type: str, question_index: int, choice_index: int, value: str) -> dict | None:
+    choices = await _set_record_array_element(
+        exam_name, student_name, question_type, 'choices', question_index, value,
+        sub_index=choice_index, require_array=True
+    )
+    if choices is None:
+        return None
+    return _partial_record(exam_name, student_name, question_type, choices=choices)
 
 async def update_choices_for_single_question_in_record(exam_name: str, student_name: str, question_type: str, question_index: int, new_choices: List[str]) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record or not isinstance(record.get('choices'), list):
+    choices = await _set_record_array_element(
+        exam_name, student_name, question_type, 'choices', question_index, new_choices,
+        pad_value=[], require_array=True
+    )
+    if choices is None:
         return None
-
-    choices = record.get('choices', [])
-    while len(choices) <= question_index:
-        choices.append([])
-    choices[question_index] = new_choices
-    record['choices'] = choices
-    
-    return await upsert_exam_record(record)
+    return _partial_record(exam_name, student_name, question_type, choices=choices)
 
 async def update_correct_answer_in_record(exam_name: str, student_name: str, question_type: str, index: int, correct_answer: str) -> dict | None:
     """Belirli bir sorunun doğru cevabını günceller."""
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record:
+    correct_answers = await _set_record_array_element(
+        exam_name, student_name, question_type, 'correct_answers', index, correct_answer
+    )
+    if correct_answers is None:
         return None
-
-    correct_answers = record.get('correct_answers', [])
-    if not isinstance(correct_answers, list):
-        correct_answers = []
-    
-    while len(correct_answers) <= index:
-        correct_answers.append(None)
-        
-    correct_answers[index] = correct_answer
-    record['correct_answers'] = correct_answers
-    
-    return await upsert_exam_record(record)
+    return _partial_record(exam_name, student_name, question_type, correct_answers=correct_answers)
 
 async def update_result(exam_name: str, student_name: str, question_type: str, index: int, result: str) -> dict | None:
-    record = await get_student_exam_record(exam_name, student_name, question_type)
-    if not record or not isinstance(record.get('results'), list):
-        if not record:
-            record = {"exam_name": exam_name, "student_name": student_name, "question_type": question_type, "results": []}
-        else:
-            record['results'] = []
-    
-    results = record['results']
-    while len(results) <= index:
-        results.append(None)
-
-    results[index] = result
-    record['results'] = results
-    return await upsert_exam_record(record)
+    results = await _set_record_array_element(
+        exam_name, student_name, question_type, 'results', index, result, create_if_missing=True
+    )
+    if results is None:
+        return None
+    return _partial_record(exam_name, student_name, question_type, results=results, total_score=scoring.total_score(results))
 
 
-from openai import AsyncOpenAI # Make sure AsyncOpenAI is imported
 # new import for file handling
 import io 
 
-# existing client setup
-# supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = AsyncOpenAI(api_key=OPENAI_API_KEY) # Make sure this line exists and is correct
-
 # --- NEW: Function to handle voice answers ---
 
+# Tüm istekler arasında paylaşılan Whisper eşzamanlılık sınırı; parçalı çeviriler de buna tabidir
+WHISPER_MAX_CONCURRENCY = int(os.getenv("WHISPER_MAX_CONCURRENCY", "8"))
+_whisper_semaphore = asyncio.Semaphore(WHISPER_MAX_CONCURRENCY)
+
+async def _transcribe_audio(audio_file: IO[bytes], filename: Optional[str]) -> str:
+    async with _whisper_semaphore:
+        with metrics.stage("whisper", "whisper-1"):
+            # verbose_json, faturalanan ses süresini (duration) de döndürür
+            transcription = await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, audio_file) if filename else audio_file,
+                response_format="verbose_json"
+            )
+    ledger.record("whisper-1", audio_seconds=float(getattr(transcription, "duration", 0) or 0))
+    return transcription.text.strip()
+
+async def _transcribe_upload(audio_file: IO[bytes], filename: Optional[str]) -> str:
+    """
+    WAV kayıtlarını küçültür (mono, 16 kHz, sessizlik kırpma), uzun kayıtları sessizlik
+    noktalarından bölüp parçaları eşzamanlı çevirir ve metinleri birleştirir.
+    """
+    segments, report = await run_in_threadpool(audio.preprocess_segments, audio_file, filename)
+    if report:
+        log_voice.info("Ses ön işlendi", report=report)
+
+    try:
+        started = time.perf_counter()
+        texts = await asyncio.gather(*(_transcribe_audio(s.file, s.filename) for s in segments))
+        log_voice.info("Whisper çağrısı tamamlandı", segments=len(segments), duration_ms=round((time.perf_counter() - started) * 1000))
+        transcribed_text = audio.stitch_transcripts(list(texts), [s.overlaps_previous for s in segments])
+        if not transcribed_text:
+            raise ValueError("Ses metne çevrilemedi veya boş bir metin döndürüldü.")
+        return transcribed_text
+
+    except Exception as e:
+        log_voice.error("Whisper API hatası", error=str(e))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Ses metne çevrilirken hata oluştu: {e}")
+
+# --- Çeviri Önbelleği ---
+# Aynı kayıt (içerik özeti aynı) tekrar yüklendiğinde Whisper'a gidilmez; çeviri depolama
+# arka ucundaki transcription_cache tablosundan döner (bkz. sql/transcription_cache.sql).
+# Aynı anda gelen kopyalar süreç içinde tek bir çeviriyi bekler. En son kullanılan
+# TRANSCRIPTION_CACHE_MAX_ENTRIES kayıt tutulur; fazlası her 100 yazmada bir silinir.
+TRANSCRIPTION_CACHE_ENABLED = os.getenv("TRANSCRIPTION_CACHE_ENABLED", "1") != "0"
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", "50000"))
+TRANSCRIPTION_CACHE_EVICT_EVERY = 100
+
+_transcriptions_in_flight: Dict[str, asyncio.Task] = {}
+_transcription_cache_writes = 0
+
+async def _store_transcription(audio_hash: str, transcript: str):
+    global _transcription_cache_writes
+    try:
+        await storage.get_storage().put_transcription(audio_hash, transcript)
+        _transcription_cache_writes += 1
+        if _transcription_cache_writes % TRANSCRIPTION_CACHE_EVICT_EVERY == 0:
+            evicted = await storage.get_storage().evict_transcriptions(TRANSCRIPTION_CACHE_MAX_ENTRIES)
+            if evicted:
+                log_voice.info("Çeviri önbelleğinden eski kayıtlar silindi", evicted=evicted)
+    except Exception as e:
+        log_voice.warning("Çeviri önbelleğe yazılamadı", error=str(e))
+
+async def _transcribe_and_store(audio_hash: str, audio_file: IO[bytes], filename: Optional[str]) -> str:
+    """Paylaşılan çeviri görevi; audio_file görevin kendi kopyasıdır ve sonunda kapatılır."""
+    try:
+        transcript = await _transcribe_upload(audio_file, filename)
+    finally:
+        audio_file.close()
+    await _store_transcription(audio_hash, transcript)
+    return transcript
+
+async def transcribe_voice_upload(audio_file: IO[bytes], filename: Optional[str]) -> Tuple[str, bool]:
+    """Yüklenen sesi metne çevirir; (metin, önbellekten mi geldi) döndürür."""
+    if not TRANSCRIPTION_CACHE_ENABLED:
+        return await _transcribe_upload(audio_file, filename), False
+
+    audio_hash = f"whisper-1:{await run_in_threadpool(audio.content_hash, audio_file)}"
+    try:
+        cached = await storage.get_storage().get_transcription(audio_hash)
+    except Exception as e:
+        log_voice.warning("Çeviri önbelleği okunamadı", error=str(e))
+        cached = None
+    metrics.cache_result("transcription", cached is not None)
+    if cached is not None:
+        log_voice.info("Çeviri önbellekten döndü", audio_hash=audio_hash[:18])
+        return cached, True
+
+    task = _transcriptions_in_flight.get(audio_hash)
+    if task is None:
+        # Paylaşılan görev isteğin dosyasını değil kendi kopyasını okur: ilk istek iptal edilir
+        # veya önce biterse Starlette yüklemeyi kapatır, bekleyen kopyalar etkilenmemelidir
+        owned_file = await run_in_threadpool(audio.spooled_copy, audio_file)
+        task = _transcriptions_in_flight.get(audio_hash)  # kopyalama sırasında başlamış olabilir
+        if task is None:
+            task = asyncio.create_task(_transcribe_and_store(audio_hash, owned_file, filename))
+            _transcriptions_in_flight[audio_hash] = task
+            task.add_done_callback(lambda _: _transcriptions_in_flight.pop(audio_hash, None))
+            return await asyncio.shield(task), False
+        owned_file.close()
+
+    log_voice.info("Aynı ses kaydı zaten çevriliyor, sonucu bekleniyor", audio_hash=audio_hash[:18])
+    return await asyncio.shield(task), True
+
 async def add_voice_answer(
     exam_name: str,
     student_name: str,
     index: int,
-    audio_file: io.BytesIO # io.BytesIO tipinde bir dosya objesi bekliyoruz
+    audio_file: IO[bytes], # Dosya objesi (BytesIO veya diskteki geçici dosya); parça parça okunur
+    filename: Optional[str] = None
 ) -> str:
     """
     Verilen ses dosyasını OpenAI Whisper kullanarak metne çevirir ve
     belirli bir sınav kaydındaki cevabı günceller.
     question_type'ın 'Verbal Question' olması beklenir.
     """
-    # 1. Ses dosyasını metne çevirmek için Whisper API'ını kullan
-    # In examai.py, inside the add_voice_answer function:
+    # 1. Sesi metne çevir (aynı kayıt daha önce çevrildiyse önbellekten)
+    async with ledger.attributed(exam_name, student_name, "answers/voice"):
+        transcribed_text, from_cache = await transcribe_voice_upload(audio_file, filename)
 
-    # In examai.py, inside the add_voice_answer function:
-
-    try:
-        transcription = await client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="text"
-        )
-        transcribed_text = transcription.strip() # CORRECTED LINE: Directly use 'transcription' as it's already the string
-        if not transcribed_text:
-            raise ValueError("Ses metne çevrilemedi veya boş bir metin döndürüldü.")
-
-    except Exception as e:
-        print(f"Whisper API hatası: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Ses metne çevrilirken hata oluştu: {e}")
-    
     # 2. Metne çevrilen cevabı veri tabanına kaydet
     try:
+        # Aynı kaydın tekrar yüklenmesi: cevap zaten kayıtlıysa yazma atlanır
+        if from_cache and await get_answer(exam_name, student_name, "Verbal Question", index) == transcribed_text:
+            return transcribed_text
+
         # update_answer fonksiyonunu kullanarak cevabı güncelliyoruz
         # question_type'ı "Verbal Question" olarak sabitliyoruz.
         updated_record = await update_answer(
@@ -1310,8 +1786,57 @@ async def add_voice_answer(
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Veri tabanına sesli cevap kaydedilirken hata: {e}")
+        log_voice.error("Sesli cevap kaydedilirken hata", exam_name=exam_name, index=index, error=str(e))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sesli cevap veri tabanına kaydedilirken hata oluştu: {e}")
+
+async def add_voice_answers_batch(
+    exam_name: str,
+    student_name: str,
+    uploads: List[Tuple[int, IO[bytes], Optional[str]]] # (indeks, dosya objesi, dosya adı)
+) -> List[str]:
+    """
+    Birden fazla sesli cevabı eşzamanlı olarak metne çevirir ve hepsini 'Verbal Question'
+    kaydına tek bir yazma ile kaydeder. Çevirilerden biri başarısız olursa hiçbir cevap
+    yazılmaz. Metinler uploads sırasıyla döndürülür.
+    """
+    # 1. Tüm sesleri eşzamanlı çevir (Whisper çağrıları WHISPER_MAX_CONCURRENCY ile sınırlı)
+    async with ledger.attributed(exam_name, student_name, "answers/voice/batch"):
+        results = await asyncio.gather(*(
+            transcribe_voice_upload(audio_file, filename) for _, audio_file, filename in uploads
+        ))
+    texts = [text for text, _ in results]
+    edits = {index: text for (index, _, _), text in zip(uploads, texts)}
+
+    # 2. Tek bir okuma-değiştirme-yazma ile kaydet
+    key = (exam_name, student_name, "Verbal Question")
+    try:
+        if all(from_cache for _, from_cache in results):
+            # Tamamı daha önce yüklenmiş kayıtlar: cevaplar zaten kayıtlıysa yazma atlanır
+            record = await get_student_exam_record(*key, "answers")
+            answers = record.get('answers') if record else None
+            if isinstance(answers, list) and all(
+                index < len(answers) and answers[index] == text for index, text in edits.items()
+            ):
+                return texts
+
+        # Tampondaki eski düzenlemeler bu yazmanın üzerine binmesin diye önce yazılır
+        await answer_buffer.flush([key])
+        rows = await storage.get_storage().apply_answer_edits([{
+            "exam_name": exam_name,
+            "student_name": student_name,
+            "question_type": "Verbal Question",
+            "answers": {str(index): text for index, text in edits.items()}
+        }])
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sınav kaydı bulunamadığı için sesli cevaplar kaydedilemedi.")
+        answer_buffer.remember(key, rows[0].get('answers'))
+        return texts
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        log_voice.error("Sesli cevaplar kaydedilirken hata", exam_name=exam_name, answers=len(uploads), error=str(e))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sesli cevaplar veri tabanına kaydedilirken hata oluştu: {e}")
     
 
 
@@ -1331,7 +1856,7 @@ async def check_answers_in_batch_with_rubrics(
     all_data = list(zip(questions_with_topics, evaluation_rubrics, answers))
     batches = [all_data[i:i + batch_size] for i in range(0, len(all_data), batch_size)]
     
-    print(f"\n--- Rubric ile Toplu Değerlendirme Başladı: {len(questions_with_topics)} soru, {len(batches)} parça... ---")
+    log_evaluation.info("Rubric ile toplu değerlendirme başladı", questions=len(questions_with_topics), batches=len(batches))
 
     tasks = []
     
@@ -1383,8 +1908,6 @@ ZORUNLU ÇIKTI FORMATI:
     # --- DEĞİŞİKLİK BURADA BİTİYOR ---
 
     for i, batch_data in enumerate(batches):
-        print(f"--- Parça {i+1}/{len(batches)} hazırlanıyor... ---")
-        
         batch_questions = [item[0] for item in batch_data]
         batch_rubrics = [item[1] for item in batch_data]
         batch_answers = [item[2] for item in batch_data]
@@ -1417,36 +1940,109 @@ ZORUNLU ÇIKTI FORMATI:
                     batch_reasonings = parsed_response["reasonings"]
                     
                     if len(batch_results) != len(batches[i]) or len(batch_reasonings) != len(batches[i]):
-                         print(f"UYARI: Parça {i+1} için Asistan'dan beklenmedik sayıda sonuç/gerekçe döndü.")
+                         log_evaluation.warning("Değerlendirme parçası beklenmedik sayıda sonuç/gerekçe döndürdü", batch=i + 1, expected=len(batches[i]), results=len(batch_results))
                          final_results.extend(["wrong"]* len(batches[i]))
                          final_reasonings.extend(["Hatalı batch boyutu nedeniyle geçersiz sayıldı."] * len(batches[i]))
                     else:
-                        print(f"--- Parça {i+1} Başarıyla Değerlendirildi. ---")
-                        for j, reasoning in enumerate(batch_reasonings):
-                            print(f"  -> Karar='{batch_results[j]}', Gerekçe='{reasoning}'")
+                        log_evaluation.debug(
+                            "Değerlendirme parçası tamamlandı",
+                            batch=i + 1,
+                            results=batch_results,
+                            reasonings=logs.Payload(batch_reasonings)
+                        )
                         
                         final_results.extend(batch_results)
                         final_reasonings.extend(batch_reasonings)
                 else:
-                    print(f"UYARI: Parça {i+1} için Asistan'dan beklenmedik formatta yanıt.")
+                    log_evaluation.warning("Değerlendirme parçası beklenmedik formatta yanıt döndürdü", batch=i + 1, response=logs.Payload(response_text))
                     final_results.extend(["wrong"]* len(batches[i]))
                     final_reasonings.extend([f"Beklenmedik format: {response_text}"] * len(batches[i]))
 
             except json.JSONDecodeError:
-                print(f"UYARI: Parça {i+1} için Asistan'dan JSON olmayan yanıt.")
+                log_evaluation.warning("Değerlendirme parçası JSON olmayan yanıt döndürdü", batch=i + 1, response=logs.Payload(response_text))
                 final_results.extend(["wrong"] * len(batches[i]))
                 final_reasonings.extend([f"JSON olmayan yanıt: {response_text}"] * len(batches[i]))
     
     except Exception as e:
-        print(f"Cevap kontrolü sırasında kritik bir asyncio hatası oluştu: {e}")
+        log_evaluation.error("Cevap kontrolü sırasında hata oluştu", error=str(e))
         raise HTTPException(status_code=500, detail=f"Asistan görevleri çalıştırılırken bir hata oluştu: {e}")
 
     if len(final_results) != len(questions_with_topics):
         raise HTTPException(status_code=500, detail="Değerlendirme sonrası toplam sonuç sayısı, soru sayısıyla eşleşmiyor.")
 
-    print("--- Toplu Değerlendirme Tamamlandı. ---")
+    log_evaluation.info("Rubric ile toplu değerlendirme tamamlandı", questions=len(final_results))
     
     return {
         "results": final_results,
         "reasonings": final_reasonings
     }
+
+
+async def evaluate_open_ended_record(exam_name: str, student_name: str, exam_record: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+    """
+    Bir öğrencinin açık uçlu cevaplarını, kayıttaki Rubric'lere göre değerlendirir ve
+    sonuçları gerekçeleriyle birlikte kaydeder. /evaluate ve toplu değerlendirme işleri
+    tarafından kullanılır.
+    """
+    question_type_to_use = "Open Ended"
+
+    # 1. Veritabanından sınav kaydını çek
+    if exam_record is None:
+        exam_record = await get_student_exam_record(
+            exam_name, student_name, question_type_to_use,
+            "questions,question_topics,evaluation_rubrics,answers"
+        )
+
+    if not exam_record:
+        raise HTTPException(status_code=404, detail="Değerlendirme için sınav kaydı bulunamadı.")
+
+    # 2. Gerekli verileri al ve doğrula
+    question_texts = exam_record.get('questions')
+    question_topics = exam_record.get('question_topics')
+    evaluation_rubrics = exam_record.get('evaluation_rubrics')
+    answers = exam_record.get('answers')
+    
+    if not all([question_texts, question_topics, evaluation_rubrics, answers]):
+        raise HTTPException(
+            status_code=400, 
+            detail="Değerlendirme başlatılamadı: Sınavda eksik sorular, konular, rubric'ler veya öğrenci cevapları var."
+        )
+    
+    if not (len(question_texts) == len(question_topics) == len(evaluation_rubrics) == len(answers)):
+        error_detail = (
+            f"Veri tutarsızlığı: Eleman sayıları eşleşmiyor. "
+            f"Questions: {len(question_texts) if question_texts else 0}, "
+            f"Topics: {len(question_topics) if question_topics else 0}, "
+            f"Rubrics: {len(evaluation_rubrics) if evaluation_rubrics else 0}, "
+            f"Answers: {len(answers) if answers else 0}."
+        )
+        raise HTTPException(status_code=400, detail=error_detail)
+
+    # 3. `check_answers` fonksiyonunun beklediği formata getir
+    questions_for_eval = [
+        {"topic": topic, "question": text} 
+        for topic, text in zip(question_topics, question_texts)
+    ]
+
+    # 4. Rubric tabanlı cevap kontrol fonksiyonunu çağır
+    evaluation_data = await check_answers_in_batch_with_rubrics(
+        questions_with_topics=questions_for_eval,
+        evaluation_rubrics=evaluation_rubrics,
+        answers=answers
+    )
+    
+    final_results = evaluation_data.get("results")
+    final_reasonings = evaluation_data.get("reasonings")
+
+    if not final_results or not final_reasonings or len(final_results) != len(question_texts):
+         raise HTTPException(status_code=500, detail="AI'dan geçersiz veya eksik sayıda değerlendirme verisi alındı.")
+
+    # 5. Sınav kaydını yeni sonuçlar ve gerekçelerle güncelle
+    await upsert_exam_record_columns(
+        exam_name,
+        student_name,
+        question_type_to_use,
+        {"results": final_results, "reasonings": final_reasonings}
+    )
+
+    return {"results": final_results, "reasonings": final_reasonings}
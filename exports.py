@@ -0,0 +1,147 @@
+import io
+import json
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List
+
+import examai
+import scoring
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# --- Sonuç Dışa Aktarımı (CSV / Parquet) ---
+# Akreditasyon raporları için bir sınavın kayıtlarını öğrenci x soru başına bir satır
+# olarak dışa aktarır. Kayıtlar veritabanından sayfa sayfa okunur ve her sayfa hemen
+# yazılıp gönderilir; bellekte aynı anda en fazla bir sayfa tutulur.
+EXPORT_COLUMNS = ["student_name", "question_index", "question", "answer", "result", "reasoning", "score"]
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+_RECORD_COLUMNS = ["questions", "answers", "results", "reasonings"]
+
+
+def _cell(values: Any, index: int) -> str | None:
+    if not isinstance(values, list) or index >= len(values) or values[index] is None:
+        return None
+    value = values[index]
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _record_rows(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    questions = record.get('questions') if isinstance(record.get('questions'), list) else []
+    results = record.get('results')
+    return [
+        {
+            "student_name": record['student_name'],
+            "question_index": index,
+            "question": _cell(questions, index),
+            "answer": _cell(record.get('answers'), index),
+            "result": _cell(results, index),
+            "reasoning": _cell(record.get('reasonings'), index),
+            "score": scoring.result_points(results[index]) if isinstance(results, list) and index < len(results) else None
+        }
+        for index in range(len(questions))
+    ]
+
+
+async def iter_export_frames(exam_name: str, question_type: str, page_size: int = 100) -> AsyncIterator["pd.DataFrame"]:
+    """Her veritabanı sayfası için bir DataFrame üretir."""
+    # pandas'ın import süresi uygulama açılışına eklenmesin diye ilk dışa aktarımda yüklenir
+    import pandas as pd
+
+    after = None
+    while True:
+        page = await examai.list_exam_records(exam_name, question_type, _RECORD_COLUMNS, page_size, after)
+        rows = [row for record in page for row in _record_rows(record)]
+        if rows:
+            frame = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+            frame["question_index"] = frame["question_index"].astype("int32")
+            frame["score"] = frame["score"].astype("float64")
+            yield frame
+        if len(page) < page_size:
+            return
+        after = page[-1]['student_name']
+
+
+async def stream_csv(exam_name: str, question_type: str, page_size: int = 100) -> AsyncIterator[bytes]:
+    header_written = False
+    async for frame in iter_export_frames(exam_name, question_type, page_size):
+        yield frame.to_csv(index=False, header=not header_written).encode("utf-8")
+        header_written = True
+    if not header_written:
+        yield (",".join(EXPORT_COLUMNS) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter'ın yazdığı baytları biriktirir; her satır grubundan sonra boşaltılır."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("student_name", pa.string()),
+        ("question_index", pa.int32()),
+        ("question", pa.string()),
+        ("answer", pa.string()),
+        ("result", pa.string()),
+        ("reasoning", pa.string()),
+        ("score", pa.float64())
+    ])
+
+
+def check_format(export_format: str):
+    """Desteklenmeyen format veya eksik pyarrow için akış başlamadan ValueError fırlatır."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Geçersiz format: '{export_format}'. 'csv' veya 'parquet' olmalıdır.")
+    if export_format == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet dışa aktarımı için 'pyarrow' paketi kurulu olmalıdır.")
+
+
+async def stream_parquet(exam_name: str, question_type: str, page_size: int = 100) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for frame in iter_export_frames(exam_name, question_type, page_size):
+            # Her sayfa ayrı bir satır grubu olarak yazılır
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(exam_name: str, question_type: str, export_format: str, page_size: int = 100) -> AsyncIterator[bytes]:
+    if export_format == "parquet":
+        return stream_parquet(exam_name, question_type, page_size)
+    return stream_csv(exam_name, question_type, page_size)
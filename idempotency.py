@@ -0,0 +1,195 @@
+import os
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+import logs
+import metrics
+import storage
+
+# --- Idempotency-Key ---
+# JSON gövdeli POST isteklerinde 'Idempotency-Key' başlığı gönderilirse yanıt
+# 'idempotency_keys' tablosuna yazılır (bkz. sql/idempotency_keys.sql). Aynı anahtarla
+# tekrar gelen istek işlem çalıştırılmadan kayıtlı yanıtı alır; ilk istek hâlâ sürüyorsa
+# onun sonucunu bekler. Anahtar farklı bir istekle (yol, sorgu, API anahtarı veya gövde)
+# tekrar kullanılırsa 422 döner. Kayıtlar IDEMPOTENCY_TTL_SECONDS sonra geçersizleşir.
+# 5xx ile durum değişince sonucu da değişebilecek 401, 402 (bütçe), 403, 409 ve 429 yanıtları
+# kaydedilmez; bu durumda istemci aynı anahtarla yeniden deneyebilir.
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "1") != "0"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_EVICT_EVERY = 100
+
+log = logs.get_logger("examai.idempotency")
+
+UNCACHED_STATUSES = {
+    status.HTTP_401_UNAUTHORIZED, status.HTTP_402_PAYMENT_REQUIRED, status.HTTP_403_FORBIDDEN,
+    status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS
+}
+# Kayıtlı yanıtla birlikte saklanmayan başlıklar: bağlantıya özgü (hop-by-hop) olanlar ve
+# tekrar oynatmada yeniden hesaplanan content-length
+UNSTORED_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "trailers", "transfer-encoding", "upgrade", "content-length", "idempotent-replayed"
+}
+
+# anahtar -> (fingerprint, yanıtı bekleyen future)
+_in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+_writes = 0
+
+
+def _fingerprint(scope, headers: Headers, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), headers.get("castrumai-apikey", "")):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+def _stored_headers(raw_headers: List[Tuple[bytes, bytes]]) -> List[List[str]]:
+    return [
+        [name.decode("latin-1"), value.decode("latin-1")]
+        for name, value in raw_headers if name.decode("latin-1").lower() not in UNSTORED_HEADERS
+    ]
+
+
+async def _replay(entry: Dict, scope, receive, send):
+    raw_headers = [(b"idempotent-replayed", b"true")]
+    if entry.get("headers"):
+        raw_headers.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in entry["headers"])
+    elif entry.get("content_type"):
+        raw_headers.append((b"content-type", entry["content_type"].encode("latin-1")))
+    body = entry["body"].encode()
+    raw_headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": entry["status_code"], "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _store(entry: Dict):
+    global _writes
+    try:
+        await storage.get_storage().put_idempotent_response(entry)
+        _writes += 1
+        if _writes % IDEMPOTENCY_EVICT_EVERY == 0:
+            evicted = await storage.get_storage().evict_idempotent_responses()
+            if evicted:
+                log.info("Süresi dolmuş idempotency kayıtları silindi", evicted=evicted)
+    except Exception as e:
+        log.warning("Idempotency yanıtı kaydedilemedi", key=entry.get("key"), error=str(e))
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not IDEMPOTENCY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        # Ses yüklemeleri gibi multipart gövdeler belleğe alınmaz; yalnızca JSON istekler
+        if key is None or not headers.get("content-type", "").startswith("application/json"):
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await _error(status.HTTP_400_BAD_REQUEST, f"Idempotency-Key 1-{IDEMPOTENCY_KEY_MAX_LENGTH} karakter olmalıdır.")(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        fingerprint = _fingerprint(scope, headers, body)
+
+        # Aynı istek hâlâ çalışıyorsa onun yanıtı beklenir
+        in_flight = _in_flight.get(key)
+        if in_flight is not None:
+            metrics.cache_result("idempotency", True)
+            if in_flight[0] != fingerprint:
+                await _error(status.HTTP_422_UNPROCESSABLE_ENTITY, "Bu Idempotency-Key farklı bir istekle kullanılmış.")(scope, receive, send)
+                return
+            entry = await asyncio.shield(in_flight[1])
+            if entry is None:
+                await _error(status.HTTP_409_CONFLICT, "Aynı Idempotency-Key ile yapılan önceki istek başarısız oldu, lütfen tekrar deneyin.")(scope, receive, send)
+            elif entry["fingerprint"] != fingerprint:
+                await _error(status.HTTP_422_UNPROCESSABLE_ENTITY, "Bu Idempotency-Key farklı bir istekle kullanılmış.")(scope, receive, send)
+            else:
+                await _replay(entry, scope, receive, send)
+            return
+
+        # Anahtar, kayıtlı yanıt okunmadan önce (araya await girmeden) sahiplenilir; aksi halde
+        # aynı anda gelen kopyalar okumayı birlikte kaçırıp işlemi iki kez çalıştırır
+        future = asyncio.get_running_loop().create_future()
+        _in_flight[key] = (fingerprint, future)
+        entry = None
+        try:
+            try:
+                stored = await storage.get_storage().get_idempotent_response(key)
+            except Exception as e:
+                log.warning("Idempotency kaydı okunamadı", key=key, error=str(e))
+                stored = None
+            metrics.cache_result("idempotency", stored is not None)
+            if stored is not None:
+                entry = stored  # bekleyen kopyalar da bu kaydı alır
+                if stored["fingerprint"] != fingerprint:
+                    await _error(status.HTTP_422_UNPROCESSABLE_ENTITY, "Bu Idempotency-Key farklı bir istekle kullanılmış.")(scope, receive, send)
+                else:
+                    await _replay(stored, scope, receive, send)
+                return
+
+            body_sent = False
+
+            async def replay_receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await receive()
+
+            response = {"status": None, "headers": [], "chunks": []}
+
+            async def capture_send(message):
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["headers"] = list(message.get("headers", []))
+                elif message["type"] == "http.response.body":
+                    response["chunks"].append(message.get("body", b""))
+                await send(message)
+
+            await self.app(scope, replay_receive, capture_send)
+            status_code = response["status"]
+            if status_code is not None and status_code < 500 and status_code not in UNCACHED_STATUSES:
+                try:
+                    entry = {
+                        "key": key,
+                        "fingerprint": fingerprint,
+                        "status_code": status_code,
+                        "content_type": Headers(raw=response["headers"]).get("content-type"),
+                        "headers": _stored_headers(response["headers"]),
+                        "body": b"".join(response["chunks"]).decode(),
+                        "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)).isoformat()
+                    }
+                except UnicodeDecodeError:
+                    entry = None
+                if entry is not None:
+                    await _store(entry)
+        finally:
+            _in_flight.pop(key, None)
+            future.set_result(entry)
@@ -0,0 +1,230 @@
+import os
+import uuid
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
+
+import logs
+import storage
+
+# --- Uzun Süren AI İşlemleri İçin İş Kuyruğu ---
+# /generate/*, /evaluate ve /feedback/verbal ?background=true ile (veya POST /jobs ile)
+# çağrıldığında istek gövdesi 'job_queue' tablosuna yazılır (bkz. sql/job_queue.sql),
+# öncelik kuyruğuna eklenir ve hemen 202 döner. JOB_QUEUE_WORKERS adet worker işleri
+# küçük priority değerinden başlayarak çalıştırır; sonuç tabloya yazılır. Yeniden
+# başlatmada 'queued' ve 'running' işler tekrar kuyruğa alınır, yani yarıda kesilen bir
+# iş baştan çalışır (en fazla JOB_MAX_ATTEMPTS kez).
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "8"))
+JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_DEFAULT_PRIORITY = 5
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+log = logs.get_logger("examai.job_queue")
+
+Handler = Callable[[Any], Awaitable[Any]]
+_operations: Dict[str, Tuple[Type[BaseModel], Handler]] = {}
+
+_queue: asyncio.PriorityQueue | None = None
+_workers: List[asyncio.Task] = []
+_running: Dict[str, asyncio.Task] = {}
+_cancel_requested: set = set()
+_sequence = itertools.count()  # Aynı öncelikteki işler geliş sırasıyla çalışır
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def register(operation: str, request_model: Type[BaseModel], handler: Handler):
+    """Kuyruktan çalıştırılabilecek bir işlemi kaydeder; handler request_model örneği alır."""
+    _operations[operation] = (request_model, handler)
+
+
+def operations() -> List[str]:
+    return sorted(_operations)
+
+
+def in_flight() -> Dict[str, int]:
+    """Kuyrukta bekleyen ve çalışan iş sayıları (bkz. /metrics)."""
+    return {"queued": _queue.qsize() if _queue is not None else 0, "running": len(_running)}
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """İşin durum yanıtı; sonuç büyük olabileceği için ayrı endpoint'ten döner."""
+    return {
+        "job_id": job['id'],
+        "operation": job['operation'],
+        "status": job['status'],
+        "priority": job['priority'],
+        "attempts": job['attempts'],
+        "error": job.get('error'),
+        "created_at": job.get('created_at'),
+        "started_at": job.get('started_at'),
+        "finished_at": job.get('finished_at'),
+        "status_url": f"/jobs/{job['id']}",
+        "result_url": f"/jobs/{job['id']}/result"
+    }
+
+
+async def get_job(job_id: str) -> Dict[str, Any] | None:
+    return await storage.get_storage().get_queued_job(job_id)
+
+
+def _enqueue(job: Dict[str, Any]):
+    _queue.put_nowait((job['priority'], next(_sequence), job['id']))
+
+
+async def submit(operation: str, payload: Dict[str, Any], priority: int = JOB_DEFAULT_PRIORITY) -> Dict[str, Any]:
+    """
+    İşi doğrulayıp kaydeder ve kuyruğa ekler. Bilinmeyen işlem veya geçersiz gövde için
+    400, kuyruk doluysa 503 fırlatır.
+    """
+    if operation not in _operations:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bilinmeyen işlem: '{operation}'. Geçerli işlemler: {', '.join(operations())}.")
+    request_model, _ = _operations[operation]
+    try:
+        request = request_model(**payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{operation}' için geçersiz istek gövdesi: {e}")
+    if _queue is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="İş kuyruğu başlatılmamış.")
+    if _queue.full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="İş kuyruğu dolu, lütfen daha sonra tekrar deneyin.")
+
+    job = await storage.get_storage().insert_queued_job({
+        "id": str(uuid.uuid4()),
+        "operation": operation,
+        "status": "queued",
+        "priority": priority,
+        "payload": request.model_dump(),
+        "attempts": 0
+    })
+    _enqueue(job)
+    return job
+
+
+async def cancel(job_id: str) -> Dict[str, Any] | None:
+    """
+    Kuyruktaki işi iptal eder, çalışan işi durdurur. Bitmiş işler için 409 fırlatır.
+    Çalışan bir iş iptal edilse bile o ana kadar yaptığı veritabanı yazmaları geri alınmaz.
+    Durum geçişi koşulludur: iş bu arada biterse sonucu 'cancelled' ile ezilmez.
+    """
+    job = await get_job(job_id)
+    if job is None:
+        return None
+    if job['status'] in FINISHED_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"İş zaten bitmiş durumda: {job['status']}.")
+
+    columns = {"status": "cancelled", "finished_at": _now()}
+    # İptal isteği güncellemeden önce işaretlenir; worker işi bu arada sahiplenirse _run
+    # işareti görüp işi başlatmadan bırakır
+    _cancel_requested.add(job_id)
+    if not await storage.get_storage().update_queued_job(job_id, columns, statuses=["queued", "running"]):
+        _cancel_requested.discard(job_id)
+        current = await get_job(job_id)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"İş zaten bitmiş durumda: {current['status'] if current else 'silinmiş'}.")
+
+    task = _running.get(job_id)
+    if task is None or not task.cancel():
+        _cancel_requested.discard(job_id)
+    return {**job, **columns}
+
+
+async def _run(job: Dict[str, Any]):
+    job_id = job['id']
+    request_model, handler = _operations[job['operation']]
+    attempts = job['attempts'] + 1
+    # İş yalnızca hâlâ 'queued' ise sahiplenilir; arada iptal edildiyse çalıştırılmaz
+    claimed = await storage.get_storage().update_queued_job(job_id, {"status": "running", "attempts": attempts, "started_at": _now()}, statuses=["queued"])
+    if not claimed or job_id in _cancel_requested:
+        _cancel_requested.discard(job_id)
+        return
+
+    task = asyncio.create_task(handler(request_model(**job['payload'])))
+    _running[job_id] = task
+    try:
+        result = await task
+        columns = {"status": "completed", "result": jsonable_encoder(result), "error": None, "error_status": None}
+    except asyncio.CancelledError:
+        if job_id not in _cancel_requested:
+            # Kapanış: iş 'running' kalır ve bir sonraki açılışta tekrar kuyruğa alınır
+            raise
+        _cancel_requested.discard(job_id)
+        log.info("İş iptal edildi", job_id=job_id, operation=job['operation'])
+        return
+    except HTTPException as e:
+        columns = {"status": "failed", "error": str(e.detail), "error_status": e.status_code}
+    except Exception as e:
+        log.error("İş sırasında hata oluştu", job_id=job_id, operation=job['operation'], error=str(e))
+        columns = {"status": "failed", "error": str(e), "error_status": status.HTTP_500_INTERNAL_SERVER_ERROR}
+    finally:
+        _running.pop(job_id, None)
+
+    # Bu arada iptal edilmiş işin durumu sonuçla ezilmez
+    if not await storage.get_storage().update_queued_job(job_id, {**columns, "finished_at": _now()}, statuses=["running"]):
+        log.info("İş sonucu yazılmadı, durum bu arada değişti", job_id=job_id, operation=job['operation'])
+
+
+async def _worker():
+    while True:
+        _, _, job_id = await _queue.get()
+        try:
+            # Kuyruktayken iptal edilmiş olabilir; güncel durum her seferinde tablodan okunur
+            job = await get_job(job_id)
+            if job is not None and job['status'] == "queued":
+                await _run(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("İş işlenirken beklenmeyen hata", job_id=job_id, error=str(e))
+        finally:
+            _queue.task_done()
+
+
+def start():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.PriorityQueue(maxsize=JOB_QUEUE_MAX_PENDING)
+    while len(_workers) < JOB_QUEUE_WORKERS:
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def resume():
+    """Yarım kalmış işleri tekrar kuyruğa alır; start()'tan sonra çağrılır."""
+    try:
+        jobs = await storage.get_storage().list_queued_jobs(["queued", "running"])
+    except Exception as e:
+        log.error("Yarım kalan kuyruk işleri okunamadı", error=str(e))
+        return
+    for job in jobs:
+        if job['operation'] not in _operations:
+            await storage.get_storage().update_queued_job(job['id'], {"status": "failed", "error": f"Bilinmeyen işlem: {job['operation']}", "finished_at": _now()})
+        elif job['status'] == "running" and job['attempts'] >= JOB_MAX_ATTEMPTS:
+            await storage.get_storage().update_queued_job(job['id'], {"status": "failed", "error": "İş yeniden başlatmalarda tamamlanamadı.", "finished_at": _now()})
+        elif _queue.full():
+            # Kuyruğa sığmayan iş sessizce 'queued' bırakılmaz; istemci durumu görebilsin
+            log.warning("İş kuyruk dolu olduğu için tekrar kuyruğa alınamadı", job_id=job['id'], operation=job['operation'])
+            await storage.get_storage().update_queued_job(job['id'], {"status": "failed", "error": "Açılışta iş kuyruğu dolu olduğu için iş tekrar kuyruğa alınamadı.", "error_status": status.HTTP_503_SERVICE_UNAVAILABLE, "finished_at": _now()}, statuses=["queued", "running"])
+        else:
+            if job['status'] == "running":
+                await storage.get_storage().update_queued_job(job['id'], {"status": "queued"}, statuses=["running"])
+            log.info("İş tekrar kuyruğa alındı", job_id=job['id'], operation=job['operation'])
+            _enqueue(job)
+
+
+async def shutdown():
+    """Worker'ları ve çalışan işleri durdurur; işler kayıtlı olduğu için açılışta devam eder."""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _running.clear()
+    _queue = None
@@ -0,0 +1,267 @@
+import os
+import time
+import json
+import asyncio
+import functools
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+import logs
+import storage
+
+# --- Token ve Maliyet Defteri ---
+# OpenAI çağrılarının usage alanındaki prompt/completion/cached token sayıları ve Whisper'ın
+# döndürdüğü ses süresi, çağrının yapıldığı (exam_name, student_name, endpoint, model)
+# anahtarına yazılır. Anahtar, isteği başlatan işlemin attributed()/track() ile
+# ContextVar'a koyduğu bilgiden okunur; asyncio görevleri bu bilgiyi devralır. Sayaçlar
+# bellekte toplanır ve LEDGER_FLUSH_INTERVAL saniyede bir 'usage_ledger' tablosuna
+# eklenerek yazılır (bkz. sql/usage_ledger.sql).
+# Sınav başına bütçe (exam_budgets tablosu) tanımlıysa, harcanan tutar bütçeye ulaştığında
+# yeni AI işlemleri ya 402 ile reddedilir ('reject') ya da chat çağrıları daha ucuz modele
+# düşürülür ('downgrade'). Harcama ve bütçe LEDGER_BUDGET_CACHE_SECONDS boyunca
+# süreç içinde önbelleklenir.
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "30"))
+LEDGER_BUDGET_CACHE_SECONDS = float(os.getenv("LEDGER_BUDGET_CACHE_SECONDS", "30"))
+
+# USD: token fiyatları 1M token başına, Whisper dakika başına. LEDGER_MODEL_PRICES ile
+# (aynı yapıda JSON) model eklenebilir veya fiyat değiştirilebilir.
+MODEL_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4.1-mini": {"prompt": 0.40, "cached": 0.10, "completion": 1.60},
+    "gpt-4.1-nano": {"prompt": 0.10, "cached": 0.025, "completion": 0.40},
+    "text-embedding-3-small": {"prompt": 0.02},
+    "whisper-1": {"audio_minute": 0.006},
+    **json.loads(os.getenv("LEDGER_MODEL_PRICES", "{}"))
+}
+# 'downgrade' bütçelerinde chat modelinin yerine kullanılan model
+DOWNGRADE_MODELS = {"gpt-4.1-mini": "gpt-4.1-nano"}
+BUDGET_ACTIONS = ("reject", "downgrade")
+
+COUNTER_COLUMNS = ["requests", "prompt_tokens", "completion_tokens", "cached_tokens", "audio_seconds", "cost_usd"]
+UNATTRIBUTED_ENDPOINT = "system"  # açılıştaki embedding ısınması gibi isteğe bağlı olmayan çağrılar
+
+log = logs.get_logger("examai.ledger")
+
+LedgerKey = Tuple[str, str, str, str]  # (exam_name, student_name, endpoint, model)
+
+_attribution: contextvars.ContextVar[Dict[str, Any] | None] = contextvars.ContextVar("ledger_attribution", default=None)
+_pending: Dict[LedgerKey, Dict[str, float]] = {}
+_flush_lock = asyncio.Lock()
+_task: asyncio.Task | None = None
+# exam_name -> (okunma zamanı, harcanan USD); okunduktan sonra kaydedilen maliyetler eklenir
+_exam_costs: Dict[str, Tuple[float, float]] = {}
+# exam_name -> (okunma zamanı, bütçe satırı veya None)
+_budgets: Dict[str, Tuple[float, Dict[str, Any] | None]] = {}
+
+
+def cost_usd(model: str, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0, audio_seconds: float = 0.0) -> float:
+    prices = MODEL_PRICES.get(model, {})
+    # prompt_tokens önbellekten okunan token'ları da içerir; onlar indirimli fiyattan sayılır
+    uncached = prompt_tokens - cached_tokens
+    return (
+        uncached * prices.get("prompt", 0.0)
+        + cached_tokens * prices.get("cached", prices.get("prompt", 0.0))
+        + completion_tokens * prices.get("completion", 0.0)
+    ) / 1_000_000 + audio_seconds / 60 * prices.get("audio_minute", 0.0)
+
+
+def record(model: str, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0, audio_seconds: float = 0.0):
+    """Bir OpenAI çağrısını o anki isteğin (sınav, öğrenci, endpoint) hesabına yazar."""
+    attribution = _attribution.get()
+    if attribution is None:
+        key = ("", "", UNATTRIBUTED_ENDPOINT, model)
+    else:
+        key = (attribution["exam_name"], attribution["student_name"], attribution["endpoint"], model)
+    cost = cost_usd(model, prompt_tokens, completion_tokens, cached_tokens, audio_seconds)
+
+    entry = _pending.get(key)
+    if entry is None:
+        entry = _pending[key] = dict.fromkeys(COUNTER_COLUMNS, 0)
+    entry["requests"] += 1
+    entry["prompt_tokens"] += prompt_tokens
+    entry["completion_tokens"] += completion_tokens
+    entry["cached_tokens"] += cached_tokens
+    entry["audio_seconds"] += audio_seconds
+    entry["cost_usd"] += cost
+
+    known = _exam_costs.get(key[0])
+    if known is not None:
+        _exam_costs[key[0]] = (known[0], known[1] + cost)
+
+
+def record_usage(model: str, response: Any):
+    """OpenAI yanıtının (chat, embedding, assistant run) usage alanını deftere yazar."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    record(
+        model,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0
+    )
+
+
+def chat_model(model: str) -> str:
+    """Bütçesi 'downgrade' ile dolmuş bir sınavın isteğindeysek daha ucuz modeli döndürür."""
+    attribution = _attribution.get()
+    if attribution is not None and attribution["downgrade"]:
+        return DOWNGRADE_MODELS.get(model, model)
+    return model
+
+
+# --- Bütçeler ---
+
+async def _get_budget(exam_name: str) -> Dict[str, Any] | None:
+    cached = _budgets.get(exam_name)
+    if cached is not None and time.monotonic() - cached[0] < LEDGER_BUDGET_CACHE_SECONDS:
+        return cached[1]
+    budget = await storage.get_storage().get_exam_budget(exam_name)
+    _budgets[exam_name] = (time.monotonic(), budget)
+    return budget
+
+
+async def exam_cost(exam_name: str) -> float:
+    """Sınav için kaydedilmiş ve henüz yazılmamış toplam maliyet (USD)."""
+    cached = _exam_costs.get(exam_name)
+    if cached is not None and time.monotonic() - cached[0] < LEDGER_BUDGET_CACHE_SECONDS:
+        return cached[1]
+    # Yazılmakta olan bir parti iki kez ya da hiç sayılmasın diye flush ile sıralanır
+    async with _flush_lock:
+        rows = await storage.get_storage().list_usage(exam_name)
+        spent = sum(row["cost_usd"] for row in rows)
+        spent += sum(entry["cost_usd"] for key, entry in _pending.items() if key[0] == exam_name)
+        _exam_costs[exam_name] = (time.monotonic(), spent)
+    return spent
+
+
+async def _check_budget(exam_name: str) -> bool:
+    """Bütçe dolmuşsa 'reject' için 402 fırlatır; 'downgrade' için True döndürür."""
+    budget = await _get_budget(exam_name)
+    if budget is None:
+        return False
+    spent = await exam_cost(exam_name)
+    if spent < budget["budget_usd"]:
+        return False
+    if budget["action"] == "downgrade":
+        log.info("Sınav bütçesi doldu, daha ucuz model kullanılacak", exam_name=exam_name, budget_usd=budget["budget_usd"], spent_usd=spent)
+        return True
+    raise HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail=f"'{exam_name}' sınavının AI bütçesi doldu ({spent:.4f} / {budget['budget_usd']:.4f} USD)."
+    )
+
+
+async def put_budget(exam_name: str, budget_usd: float, action: str) -> Dict[str, Any]:
+    budget = {"exam_name": exam_name, "budget_usd": budget_usd, "action": action}
+    await storage.get_storage().put_exam_budget(budget)
+    _budgets[exam_name] = (time.monotonic(), budget)
+    return budget
+
+
+async def delete_budget(exam_name: str) -> bool:
+    deleted = await storage.get_storage().delete_exam_budget(exam_name)
+    _budgets[exam_name] = (time.monotonic(), None)
+    return deleted
+
+
+# --- İsteklerin ilişkilendirilmesi ---
+
+@asynccontextmanager
+async def attributed(exam_name: str, student_name: str, endpoint: str):
+    """
+    Blok içindeki OpenAI çağrılarını (exam_name, student_name, endpoint) hesabına yazar.
+    Girişte sınavın bütçesi kontrol edilir.
+    """
+    downgrade = await _check_budget(exam_name)
+    token = _attribution.set({"exam_name": exam_name, "student_name": student_name, "endpoint": endpoint, "downgrade": downgrade})
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def track(endpoint: str, identity: Callable[..., Tuple[Hashable, Hashable]]):
+    """
+    Bir coroutine fonksiyonunu attributed() ile sarar; identity aynı argümanlarla çağrılıp
+    (exam_name, student_name) döndürür.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            exam_name, student_name = identity(*args, **kwargs)
+            async with attributed(exam_name, student_name, endpoint):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Yazma ve sorgulama ---
+
+def _rows(counters_by_key: Dict[LedgerKey, Dict[str, float]]) -> List[Dict[str, Any]]:
+    return [
+        {"exam_name": key[0], "student_name": key[1], "endpoint": key[2], "model": key[3], **counters}
+        for key, counters in counters_by_key.items()
+    ]
+
+
+async def flush():
+    global _pending
+    async with _flush_lock:
+        if not _pending:
+            return
+        batch, _pending = _pending, {}
+        rows = _rows(batch)
+        try:
+            await storage.get_storage().add_usage(rows)
+        except Exception as e:
+            log.warning("Maliyet defteri yazılamadı, sayaçlar tekrar denenecek", rows=len(rows), error=str(e))
+            for key, counters in batch.items():
+                entry = _pending.setdefault(key, dict.fromkeys(COUNTER_COLUMNS, 0))
+                for column in COUNTER_COLUMNS:
+                    entry[column] += counters[column]
+
+
+async def usage_report(
+    exam_name: str,
+    student_name: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """Bekleyen sayaçları yazar; sınavın satırlarını, toplamlarını ve bütçesini döndürür."""
+    await flush()
+    rows = await storage.get_storage().list_usage(exam_name, student_name, endpoint, model)
+    totals = {column: sum(row[column] for row in rows) for column in COUNTER_COLUMNS}
+    budget = await storage.get_storage().get_exam_budget(exam_name)
+    if budget is not None:
+        filtered = student_name is not None or endpoint is not None or model is not None
+        exam_rows = await storage.get_storage().list_usage(exam_name) if filtered else rows
+        spent = sum(row["cost_usd"] for row in exam_rows)
+        budget = {**budget, "spent_usd": spent, "remaining_usd": max(budget["budget_usd"] - spent, 0.0)}
+    return {"exam_name": exam_name, "rows": rows, "totals": totals, "budget": budget}
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(LEDGER_FLUSH_INTERVAL)
+        await flush()
+
+
+def start():
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    """Arka plan döngüsünü durdurur ve bekleyen sayaçları yazar."""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    await flush()
+
@@ -0,0 +1,128 @@
+import os
+import sys
+import random
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import orjson
+
+# --- Yapılandırılmış Loglama ---
+# Sıcak yoldaki print'lerin yerine geçer: her kayıt tek satır JSON'dur (LOG_FORMAT=text ile
+# okunabilir satırlar). LOG_LEVEL altındaki kayıtlar hiç biçimlendirilmez. LOG_SAMPLE_RATES
+# ile logger başına DEBUG/INFO kayıtlarının yalnızca bir oranı yazılır
+# ("examai.evaluation=0.1,examai.retrieval=0.01"; en uzun önek eşleşir); WARNING ve üstü
+# her zaman yazılır. Büyük içerikler (metin parçaları, model yanıtları) Payload ile
+# sarılır: varsayılan olarak SHA-256 özeti, uzunluğu ve LOG_PAYLOAD_PREVIEW_CHARS
+# karakterlik başı yazılır; LOG_LEVEL=DEBUG iken (veya LOG_FULL_PAYLOADS=1 ile) içeriğin
+# tamamı yazılır.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_PAYLOAD_PREVIEW_CHARS = int(os.getenv("LOG_PAYLOAD_PREVIEW_CHARS", "200"))
+LOG_FULL_PAYLOADS = os.getenv("LOG_FULL_PAYLOADS", "1" if LOG_LEVEL == "DEBUG" else "0") != "0"
+
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+
+class Payload:
+    """Kayıt gerçekten yazılırsa biçimlendirilen büyük içerik."""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def render(self) -> Any:
+        if LOG_FULL_PAYLOADS:
+            return self.value
+        text = self.value if isinstance(self.value, str) else orjson.dumps(self.value, default=str).decode()
+        return {
+            "sha256": hashlib.sha256(text.encode()).hexdigest()[:16],
+            "chars": len(text),
+            "preview": text[:LOG_PAYLOAD_PREVIEW_CHARS]
+        }
+
+
+def _render_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value.render() if isinstance(value, Payload) else value for key, value in fields.items()}
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_render_fields(getattr(record, "fields", {}))
+        }
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in _render_fields(getattr(record, "fields", {})).items())
+        line = f"{datetime.fromtimestamp(record.created, timezone.utc).isoformat()} {record.levelname} {record.name} {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+
+_root = logging.getLogger("examai")
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(_TextFormatter() if LOG_FORMAT == "text" else _JSONFormatter())
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def _sample_rate(name: str) -> float:
+    matches = [prefix for prefix in LOG_SAMPLE_RATES if name == prefix or name.startswith(f"{prefix}.")]
+    return LOG_SAMPLE_RATES[max(matches, key=len)] if matches else 1.0
+
+
+class Logger:
+    """
+    logging.Logger üzerinde ince bir katman: alanlar anahtar kelime argümanı olarak verilir
+    (log.info("Parça değerlendirildi", batch=2, results=3)) ve seviye/örnekleme kontrolü
+    mesaj biçimlendirilmeden önce yapılır.
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+        self.sample_rate = _sample_rate(name)
+
+    def enabled(self, level: int) -> bool:
+        if not self._logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _log(self, level: int, msg: str, fields: Dict[str, Any]):
+        if self.enabled(level):
+            self._logger.log(level, msg, extra={"fields": fields})
+
+    def debug(self, msg: str, **fields: Any):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg: str, **fields: Any):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg: str, **fields: Any):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg: str, **fields: Any):
+        self._log(logging.ERROR, msg, fields)
+
+
+def get_logger(name: str) -> Logger:
+    """name 'examai' ile başlamalıdır; aksi halde kayıtlar bu katmanın handler'ından geçmez."""
+    return Logger(name)
@@ -3,31 +3,100 @@ from fastapi import FastAPI, HTTPException, Header, status, Depends
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import examai
+import evaluation_jobs
+import exports
+import transcription_jobs
+import job_queue
+import singleflight
+import metrics
+import ledger
+import cassettes
+import storage
+import logs
+from uploads import UploadSizeLimitMiddleware, VOICE_UPLOAD_MAX_BYTES, VOICE_BATCH_MAX_FILES
+import responses
+from responses import FastJSONResponse, CompressionMiddleware
+from idempotency import IdempotencyMiddleware
 from dotenv import load_dotenv
 from fastapi.concurrency import run_in_threadpool
-from fastapi import FastAPI, HTTPException, Header, status, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Header, status, Depends, UploadFile, File, Query, Form
+from fastapi.responses import StreamingResponse
+from fastapi import Response
 from contextlib import asynccontextmanager
-import json
+import asyncio
+from urllib.parse import quote
 
 load_dotenv()
 
+log = logs.get_logger("examai.app")
+
+async def _background_startup():
+    """
+    Açılışı bekletmeyen adımlar: yarım kalan işlerin sürdürülmesi ve embedding önbelleğinin
+    ısınması. Bitene kadar /health/ready 503 döner.
+    """
+    for step in (evaluation_jobs.resume_evaluation_jobs, job_queue.resume):
+        try:
+            await step()
+        except Exception as e:
+            log.error("Açılış adımı başarısız", step=f"{step.__module__}.{step.__name__}", error=str(e))
+    await examai.warm_up()
+    log.info("Uygulama hazır")
+
 # --- BU YENİ FONKSİYONU main.py DOSYANIZA EKLEYİN ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Uygulama başlangıcında çalışacak kod
-    print("Uygulama başlıyor, embedding önbelleği oluşturulacak...")
-    await examai.initialize_file_name_embeddings()
+    # Uygulama başlangıcında çalışacak kod; ağ gerektiren adımlar arka planda yürür
+    log.info("Uygulama başlıyor, embedding önbelleği arka planda oluşturulacak")
+    if examai.ANSWER_BUFFER_ENABLED:
+        examai.answer_buffer.start()
+    transcription_jobs.start()
+    job_queue.start()
+    ledger.start()
+    app.state.startup_task = asyncio.create_task(_background_startup())
     yield
-    # Uygulama kapanırken çalışacak kod (şimdilik boş)
-    print("Uygulama kapanıyor...")
+    # Uygulama kapanırken çalışacak kod
+    log.info("Uygulama kapanıyor")
+    app.state.startup_task.cancel()
+    await asyncio.gather(app.state.startup_task, return_exceptions=True)
+    await evaluation_jobs.shutdown()
+    await transcription_jobs.shutdown()
+    await job_queue.shutdown()
+    await examai.answer_buffer.stop() # Bekleyen cevapları kaybetmemek için son kez yaz
+    await ledger.stop() # Bekleyen token/maliyet sayaçlarını yaz
+    await storage.close_storage()
+    cassettes.close() # Kayıt modunda kaset dosyalarını kapat
 
 app = FastAPI(
     lifespan=lifespan,
     title="ExamAI API",
     description="Yeni nesil OpenAI asistanları ile güncellenmiş, sınav ve değerlendirme işlemlerini yürüten API.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# Ses yüklemeleri gövde okunurken boyut sınırına tabidir (bkz. uploads.py)
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/answers/voice"])
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/answers/voice/batch"], max_bytes=VOICE_UPLOAD_MAX_BYTES * VOICE_BATCH_MAX_FILES)
+# Idempotency-Key başlıklı POST'lar tekrarlandığında kayıtlı yanıt döner (bkz. idempotency.py)
+app.add_middleware(IdempotencyMiddleware)
+# Büyük yanıtlar Accept-Encoding'e göre brotli/gzip ile sıkıştırılır (bkz. responses.py)
+app.add_middleware(CompressionMiddleware)
+# O an işlenen istek sayısı /metrics'te examai_in_flight{kind="http"} olarak görünür
+app.add_middleware(metrics.InFlightMiddleware)
+
+def _background_in_flight() -> Dict[tuple, int]:
+    """Arka plan işleri ve birleştirilen AI çağrıları; /metrics scrape edildiğinde okunur."""
+    values = {}
+    for name, counts in (("job_queue", job_queue.in_flight()), ("transcription_jobs", transcription_jobs.in_flight()), ("evaluation_jobs", evaluation_jobs.in_flight())):
+        for state, count in counts.items():
+            values[(f"{name}:{state}",)] = count
+    for operation, stats in singleflight.stats().items():
+        values[(f"singleflight:{operation}",)] = stats["in_flight"]
+    return values
+
+metrics.in_flight.set_function(_background_in_flight)
+
 # --- API Anahtar Doğrulaması ---
 CASTRUMAI_API_KEY_HEADER_NAME = "castrumai-apikey"
 VALID_CASTRUMAI_API_KEY = os.getenv("CASTRUMAI_API_KEY")
@@ -40,6 +109,36 @@ async def verify_castrumai_api_key(castrumai_apikey: Optional[str] = Header(None
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Geçersiz CastrumAI API Anahtarı")
     return True
 
+# --- Sağlık Kontrolleri (API anahtarı gerektirmez) ---
+@app.get("/health/live", summary="Süreç ayakta ve istek karşılıyor mu (liveness).")
+async def liveness_endpoint():
+    return {"status": "ok"}
+
+@app.get("/health/ready", summary="Açılış adımları bitti, embedding önbelleği hazır ve veri tabanına erişilebiliyor mu (readiness). Hazır değilse 503 döner.")
+async def readiness_endpoint():
+    startup_task = getattr(app.state, "startup_task", None)
+    checks = {
+        "startup": startup_task is not None and startup_task.done(),
+        "embeddings": examai.file_name_embeddings_ready()
+    }
+    try:
+        await storage.get_storage().ping()
+        checks["storage"] = True
+    except Exception as e:
+        log.warning("Hazır olma kontrolünde veri tabanına erişilemedi", error=str(e))
+        checks["storage"] = False
+    ready = all(checks.values())
+    return FastJSONResponse(
+        {"status": "ready" if ready else "starting", "checks": checks},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@app.get("/metrics", summary="Aşama süreleri, token kullanımı, önbellek isabetleri ve o an çalışan işler (Prometheus metin formatı).")
+async def prometheus_metrics_endpoint():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrikler kapalı (METRICS_ENABLED=0).")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # --- Pydantic Modelleri (exam_name EKLENDİ) ---
 class OpenEndedQuestionGenerationRequest(BaseModel):
     exam_name: str
@@ -59,6 +158,9 @@ class AnswerEvaluationRequest(BaseModel):
     student_name: str
     question_topic: str
 
+class CohortEvaluationRequest(BaseModel):
+    exam_name: str
+
 class AnswerUpdateRequest(BaseModel):
     exam_name: str
     student_name: str
@@ -194,14 +296,101 @@ class VerbalFeedbackResponse(BaseModel):
 # --- API Uç Noktaları ---
 # main.py dosyanızdaki endpoint'ler
 
+# --- İş Kuyruğu (bkz. job_queue.py) ---
+class JobSubmitRequest(BaseModel):
+    operation: str = Field(..., description="Örn. 'generate/open-ended', 'generate/mcq', 'generate/verbal', 'evaluate', 'feedback/verbal'")
+    payload: Dict[str, Any] = Field(..., description="İlgili endpoint'in istek gövdesi")
+    priority: int = Field(job_queue.JOB_DEFAULT_PRIORITY, description="Küçük değer önce çalışır")
+
+async def _submit_background_job(operation: str, request: BaseModel, priority: int) -> FastJSONResponse:
+    job = await job_queue.submit(operation, request.model_dump(), priority)
+    return FastJSONResponse(job_queue.job_view(job), status_code=status.HTTP_202_ACCEPTED)
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED, summary="Uzun süren bir AI işlemini kuyruğa ekler ve iş kimliğini döndürür.")
+async def submit_job_endpoint(request: JobSubmitRequest, _ = Depends(verify_castrumai_api_key)):
+    job = await job_queue.submit(request.operation, request.payload, request.priority)
+    return job_queue.job_view(job)
+
+@app.get("/jobs/{job_id}", summary="Kuyruktaki işin durumunu (queued, running, completed, failed, cancelled) döndürür.")
+async def get_job_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="İş bulunamadı.")
+    return job_queue.job_view(job)
+
+@app.get("/jobs/{job_id}/result", summary="Tamamlanan işin sonucunu, ilgili endpoint'in senkron yanıtıyla aynı biçimde döndürür.")
+async def get_job_result_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="İş bulunamadı.")
+    if job['status'] == "failed":
+        raise HTTPException(status_code=job.get('error_status') or status.HTTP_500_INTERNAL_SERVER_ERROR, detail=job.get('error'))
+    if job['status'] == "cancelled":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="İş iptal edildi.")
+    if job['status'] != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"İş henüz tamamlanmadı (durum: {job['status']}).")
+    return FastJSONResponse(job['result'])
+
+@app.get("/metrics/coalescing", summary="Aynı anda gelen aynı AI isteklerinin kaçının tek çağrıda birleştirildiğini işlem başına döndürür.")
+async def get_coalescing_metrics_endpoint(_ = Depends(verify_castrumai_api_key)):
+    return singleflight.stats()
+
+@app.post("/jobs/{job_id}/cancel", summary="Kuyruktaki veya çalışan bir işi iptal eder.")
+async def cancel_job_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="İş bulunamadı.")
+    return job_queue.job_view(job)
+
+# --- Token / Maliyet Defteri (bkz. ledger.py) ---
+class ExamBudgetRequest(BaseModel):
+    exam_name: str
+    budget_usd: float = Field(..., gt=0, description="Sınav için izin verilen toplam OpenAI harcaması (USD)")
+    action: str = Field("reject", description="Bütçe dolunca: 'reject' (402 döner) veya 'downgrade' (daha ucuz model kullanılır)")
+
+@app.get("/usage", summary="Bir sınavın (isteğe bağlı öğrenci, endpoint ve model filtreleriyle) token kullanımını, maliyetini ve bütçe durumunu döndürür.")
+async def get_usage_endpoint(
+    exam_name: str,
+    student_name: Optional[str] = Query(None),
+    endpoint: Optional[str] = Query(None, description="Örn. 'generate/open-ended', 'evaluate', 'answers/voice'"),
+    model: Optional[str] = Query(None),
+    _ = Depends(verify_castrumai_api_key)
+):
+    return await ledger.usage_report(exam_name, student_name, endpoint, model)
+
+@app.put("/usage/budget", summary="Bir sınavın AI bütçesini tanımlar veya günceller.")
+async def put_exam_budget_endpoint(request: ExamBudgetRequest, _ = Depends(verify_castrumai_api_key)):
+    if request.action not in ledger.BUDGET_ACTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Geçersiz action: '{request.action}'. Geçerli değerler: {', '.join(ledger.BUDGET_ACTIONS)}.")
+    return await ledger.put_budget(request.exam_name, request.budget_usd, request.action)
+
+@app.delete("/usage/budget", summary="Bir sınavın AI bütçesini kaldırır.")
+async def delete_exam_budget_endpoint(exam_name: str, _ = Depends(verify_castrumai_api_key)):
+    if not await ledger.delete_budget(exam_name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bu sınav için tanımlı bir bütçe bulunamadı.")
+    return {"message": f"'{exam_name}' sınavının bütçesi kaldırıldı."}
+
+
 @app.post("/generate/open-ended", summary="AI ile açık uçlu sorular ve Rubric'ler oluşturur, veri tabanına ekler.")
 async def generate_open_ended_with_rubrics(
     request: OpenEndedQuestionGenerationRequest,
+    background: bool = Query(False, description="true ise iş kuyruğa alınır ve hemen 202 ile iş kimliği döner (bkz. /jobs)"),
+    priority: int = Query(job_queue.JOB_DEFAULT_PRIORITY, description="background=true iken kuyruk önceliği; küçük değer önce çalışır"),
     _ = Depends(verify_castrumai_api_key)
 ):
+    if background:
+        return await _submit_background_job("generate/open-ended", request, priority)
+    return FastJSONResponse(await _generate_open_ended(request))
+
+@singleflight.coalesce("generate/open-ended", lambda r: (r.exam_name, r.student_name, "Open Ended", r.number_of_questions, r.question_topic))
+@ledger.track("generate/open-ended", lambda r: (r.exam_name, r.student_name))
+async def _generate_open_ended(request: OpenEndedQuestionGenerationRequest) -> dict:
     question_type_to_use = "Open Ended"
     try:
-        existing_record = await examai.get_student_exam_record(request.exam_name, request.student_name, question_type_to_use)
+        existing_record = await examai.get_student_exam_record(
+            request.exam_name, request.student_name, question_type_to_use,
+            "questions,question_topics,evaluation_rubrics"
+        )
         
         # Veritabanında 'questions' (metin listesi) ve 'question_topics' (konu listesi) ayrı sütunlarda
         existing_question_texts = []
@@ -260,6 +449,8 @@ async def generate_open_ended_with_rubrics(
         if isinstance(e, HTTPException): raise e
         raise HTTPException(status_code=500, detail=f"Açık uçlu sorular ve rubric'ler üretilirken bir hata oluştu: {str(e)}")
 
+job_queue.register("generate/open-ended", OpenEndedQuestionGenerationRequest, _generate_open_ended)
+
 
 
 
@@ -279,6 +470,10 @@ async def update_single_answer_endpoint(
         if updated_record:
             return {"message": "Cevap başarıyla güncellendi.", "answers": updated_record.get('answers', [])}
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cevap güncellenemedi veya kayıt bulunamadı.")
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Cevap güncellenirken hata oluştu: {e}")
 
@@ -306,88 +501,95 @@ async def update_bulk_answers_endpoint(
 @app.post("/evaluate", summary="Verilen açık uçlu cevapları Rubric sistemine göre değerlendirir.")
 async def evaluate_answers_with_rubrics(
     request: AnswerEvaluationRequest,
+    background: bool = Query(False, description="true ise iş kuyruğa alınır ve hemen 202 ile iş kimliği döner (bkz. /jobs)"),
+    priority: int = Query(job_queue.JOB_DEFAULT_PRIORITY, description="background=true iken kuyruk önceliği; küçük değer önce çalışır"),
     _ = Depends(verify_castrumai_api_key)
 ):
     """
     Öğrenci cevaplarını, veritabanından çekilen yapılandırılmış Değerlendirme Kriterleri'ne (Rubric)
     göre değerlendirir ve sonuçları gerekçeleriyle birlikte kaydeder.
     """
-    question_type_to_use = "Open Ended"
-    try:
-        # 1. Veritabanından sınav kaydını çek
-        exam_record = await examai.get_student_exam_record(request.exam_name, request.student_name, question_type_to_use)
-
-        if not exam_record:
-            raise HTTPException(status_code=404, detail="Değerlendirme için sınav kaydı bulunamadı.")
+    if background:
+        return await _submit_background_job("evaluate", request, priority)
+    return FastJSONResponse(await _evaluate_answers(request))
 
-        # 2. Gerekli verileri al ve doğrula
-        question_texts = exam_record.get('questions')
-        question_topics = exam_record.get('question_topics')
-        evaluation_rubrics = exam_record.get('evaluation_rubrics')
-        answers = exam_record.get('answers')
-        
-        if not all([question_texts, question_topics, evaluation_rubrics, answers]):
-            raise HTTPException(
-                status_code=400, 
-                detail="Değerlendirme başlatılamadı: Sınavda eksik sorular, konular, rubric'ler veya öğrenci cevapları var."
-            )
-        
-        if not (len(question_texts) == len(question_topics) == len(evaluation_rubrics) == len(answers)):
-            error_detail = (
-                f"Veri tutarsızlığı: Eleman sayıları eşleşmiyor. "
-                f"Questions: {len(question_texts) if question_texts else 0}, "
-                f"Topics: {len(question_topics) if question_topics else 0}, "
-                f"Rubrics: {len(evaluation_rubrics) if evaluation_rubrics else 0}, "
-                f"Answers: {len(answers) if answers else 0}."
-            )
-            raise HTTPException(status_code=400, detail=error_detail)
-
-        # 3. `check_answers` fonksiyonunun beklediği formata getir
-        questions_for_eval = [
-            {"topic": topic, "question": text} 
-            for topic, text in zip(question_topics, question_texts)
-        ]
-
-        # 4. Düzeltilmiş Rubric tabanlı cevap kontrol fonksiyonunu çağır
-        evaluation_data = await examai.check_answers_in_batch_with_rubrics(
-            questions_with_topics=questions_for_eval, # DÜZELTME: Doğru argüman adı kullanılıyor
-            evaluation_rubrics=evaluation_rubrics,
-            answers=answers
-        )
-        
-        final_results = evaluation_data.get("results")
-        final_reasonings = evaluation_data.get("reasonings")
-
-        if not final_results or not final_reasonings or len(final_results) != len(question_texts):
-             raise HTTPException(status_code=500, detail="AI'dan geçersiz veya eksik sayıda değerlendirme verisi alındı.")
-
-        # 5. Sınav kaydını yeni sonuçlar ve gerekçelerle güncelle
-        exam_record['results'] = final_results
-        exam_record['reasonings'] = final_reasonings
-
-        await examai.upsert_exam_record(exam_record)
+@singleflight.coalesce("evaluate", lambda r: (r.exam_name, r.student_name, "Open Ended"))
+@ledger.track("evaluate", lambda r: (r.exam_name, r.student_name))
+async def _evaluate_answers(request: AnswerEvaluationRequest) -> dict:
+    try:
+        evaluation_data = await examai.evaluate_open_ended_record(request.exam_name, request.student_name)
 
-        # 6. API yanıtını döndür
+        # API yanıtını döndür
         return {
             "message": "Değerlendirme başarıyla tamamlandı.",
-            "results": final_results,
-            "reasonings": final_reasonings
+            "results": evaluation_data["results"],
+            "reasonings": evaluation_data["reasonings"]
         }
         
     except Exception as e:
         if isinstance(e, HTTPException): raise e
         raise HTTPException(status_code=500, detail=f"Cevaplar değerlendirilirken bir hata oluştu: {str(e)}")
 
+job_queue.register("evaluate", AnswerEvaluationRequest, _evaluate_answers)
+
+
+@app.post("/evaluate/cohort", status_code=status.HTTP_202_ACCEPTED, summary="Bir sınavdaki tüm açık uçlu kayıtları arka planda değerlendiren bir iş başlatır. Aynı sınav için çalışan bir iş varsa o döndürülür.")
+async def start_cohort_evaluation_endpoint(
+    request: CohortEvaluationRequest,
+    _ = Depends(verify_castrumai_api_key)
+):
+    try:
+        job = await evaluation_jobs.start_cohort_evaluation(request.exam_name)
+        return evaluation_jobs.job_progress(job)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Toplu değerlendirme başlatılırken hata oluştu: {e}")
+
+@app.get("/evaluate/cohort/{job_id}", summary="Toplu değerlendirme işinin durumunu; tamamlanan, atlanan ve başarısız öğrencilerle birlikte döndürür.")
+async def get_cohort_evaluation_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    try:
+        job = await evaluation_jobs.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Değerlendirme işi bulunamadı.")
+        return {**evaluation_jobs.job_progress(job), "job": job}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Değerlendirme işi alınırken hata oluştu: {e}")
+
+@app.get("/evaluate/cohort/{job_id}/progress", summary="Toplu değerlendirme işinin sadece ilerleme sayılarını döndürür.")
+async def get_cohort_evaluation_progress_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    try:
+        job = await evaluation_jobs.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Değerlendirme işi bulunamadı.")
+        return evaluation_jobs.job_progress(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Değerlendirme işi alınırken hata oluştu: {e}")
+
 
 @app.post("/generate/mcq", summary='AI ile çoktan seçmeli soruları ve şıkları oluşturur, veri tabanına ekler. Çoktan seçmeli sorular otomatik kontrol edilir. Cevapları harf olarak eklenmelidir örn. "a", "A", "b" benzeri')
 async def generate_mcq(
     request: MultipleChoiceQuestionGenerationRequest,
+    background: bool = Query(False, description="true ise iş kuyruğa alınır ve hemen 202 ile iş kimliği döner (bkz. /jobs)"),
+    priority: int = Query(job_queue.JOB_DEFAULT_PRIORITY, description="background=true iken kuyruk önceliği; küçük değer önce çalışır"),
     _ = Depends(verify_castrumai_api_key)
 ):
+    if background:
+        return await _submit_background_job("generate/mcq", request, priority)
+    return FastJSONResponse(await _generate_mcq(request))
+
+@singleflight.coalesce("generate/mcq", lambda r: (r.exam_name, r.student_name, "Multiple Choice", r.number_of_questions, r.number_of_choices, r.question_topic))
+@ledger.track("generate/mcq", lambda r: (r.exam_name, r.student_name))
+async def _generate_mcq(request: MultipleChoiceQuestionGenerationRequest) -> dict:
     # ... (Kontroller kısmı aynı kalacak) ...
         
     try:
-        existing_record = await examai.get_student_exam_record(request.exam_name, request.student_name, "Multiple Choice")
+        existing_record = await examai.get_student_exam_record(
+            request.exam_name, request.student_name, "Multiple Choice",
+            "questions,choices,correct_answers"
+        )
         
         # Güvenli liste atamaları ve tip kontrolü
         existing_questions = []
@@ -456,16 +658,30 @@ async def generate_mcq(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Çoktan seçmeli sorular üretilirken beklenmeyen bir hata oluştu: {e}")
 
+job_queue.register("generate/mcq", MultipleChoiceQuestionGenerationRequest, _generate_mcq)
+
 
 
 # --- YENİ ENDPOINT: Sözel Soru Üretme ---
 @app.post("/generate/verbal", response_model=VerbalQuestionResponse)
-async def generate_verbal_exam_questions(request: VerbalQuestionRequest, _ = Depends(verify_castrumai_api_key)):
+async def generate_verbal_exam_questions(
+    request: VerbalQuestionRequest,
+    background: bool = Query(False, description="true ise iş kuyruğa alınır ve hemen 202 ile iş kimliği döner (bkz. /jobs)"),
+    priority: int = Query(job_queue.JOB_DEFAULT_PRIORITY, description="background=true iken kuyruk önceliği; küçük değer önce çalışır"),
+    _ = Depends(verify_castrumai_api_key)
+):
     """
     Belirtilen konu hakkında, 1-2 dakikalık sözel cevap gerektiren sorular üretir.
     Ayrıca, bu cevapları değerlendirmek için bir insan eğitmene yardımcı olacak
     kapsamlı "geri bildirim rehberleri" oluşturur.
     """
+    if background:
+        return await _submit_background_job("generate/verbal", request, priority)
+    return await _generate_verbal(request)
+
+@singleflight.coalesce("generate/verbal", lambda r: (r.exam_name, r.student_name, "Verbal Question", r.number_of_questions, r.question_topic))
+@ledger.track("generate/verbal", lambda r: (r.exam_name, r.student_name))
+async def _generate_verbal(request: VerbalQuestionRequest) -> VerbalQuestionResponse:
     try:
         # Önceki sınavda aynı türden soru olup olmadığını kontrol et
         existing_questions = await examai.get_questions_all(
@@ -501,43 +717,71 @@ async def generate_verbal_exam_questions(request: VerbalQuestionRequest, _ = Dep
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Sözel soru üretilirken hata oluştu: {e}")
+        log.error("Sözel soru üretilirken hata oluştu", error=str(e))
         raise HTTPException(status_code=500, detail=f"Sözel sorular üretilirken bir hata oluştu: {e}")
 
+job_queue.register("generate/verbal", VerbalQuestionRequest, _generate_verbal)
+
+
+VOICE_CONTENT_TYPES = ["audio/mpeg", "audio/wav", "audio/x-m4a", "audio/mp4", "audio/webm"]
+
+def _check_voice_content_type(file: UploadFile):
+    if file.content_type not in VOICE_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Desteklenmeyen dosya türü: {file.content_type}. Lütfen mp3, wav, m4a, mp4, webm gibi bir ses dosyası yükleyin."
+        )
+
 
 @app.post("/answers/voice", summary="Öğrenci sesli cevabını alır, metne çevirir ve veri tabanına kaydeder. question_type 'Verbal Question' olmalıdır.")
 async def add_voice_answer_endpoint(
     exam_name: str,
     student_name: str,
     index: int, # Cevabın kaydedileceği sorunun indeksi
+    response: Response,
     file: UploadFile = File(..., description="Ses dosyası (örn: .mp3, .wav, .m4a)"),
+    background: bool = Query(False, description="true ise yükleme kuyruğa alınır ve hemen 202 ile iş kimliği döner"),
+    callback_url: Optional[str] = Query(None, description="background=true iken iş bitince sonucun POST edileceği adres"),
     _ = Depends(verify_castrumai_api_key)
 ):
     """
     Belirtilen sınav, öğrenci ve indeks için sesli bir cevabı alır,
     OpenAI Whisper kullanarak metne çevirir ve ardından veri tabanındaki
     ilgili 'Verbal Question' tipindeki kayda ekler.
+    background=true ile çeviri arka planda yapılır; sonuç /answers/voice/jobs/{job_id}
+    adresinden sorgulanır veya callback_url'e gönderilir. İşin durumu storage'da tutulur;
+    ses dosyası ise yüklemeyi alan süreçtedir, süreç kapanırsa bitmemiş iş failed olur.
     """
-    if file.content_type not in ["audio/mpeg", "audio/wav", "audio/x-m4a", "audio/mp4", "audio/webm"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Desteklenmeyen dosya türü: {file.content_type}. Lütfen mp3, wav, m4a, mp4, webm gibi bir ses dosyası yükleyin."
-        )
+    _check_voice_content_type(file)
+    try:
+        examai.check_answer_index(index)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if background:
+        try:
+            transcription_jobs.validate_callback_url(callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        job = await transcription_jobs.submit(exam_name, student_name, index, file.file, file.filename, callback_url)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {
+            "message": "Sesli cevap kuyruğa alındı.",
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/answers/voice/jobs/{job['job_id']}"
+        }
 
     try:
-        # Ses dosyasını bellek içi bir File objesine dönüştürüyoruz
-        # OpenAI API, dosya objesi bekliyor.
-        import io
-        audio_bytes = await file.read()
-        audio_file_like_object = io.BytesIO(audio_bytes)
-        audio_file_like_object.name = file.filename # Dosya adını korumak önemli
-
-        # examai modülündeki yeni fonksiyonu çağırıyoruz
+        # Yükleme Starlette tarafından geçici dosyaya (büyükse diske) yazılmıştır;
+        # belleğe kopyalamadan doğrudan Whisper isteğine akıtılır.
+        file.file.seek(0)
         transcribed_text = await examai.add_voice_answer(
             exam_name=exam_name,
             student_name=student_name,
             index=index,
-            audio_file=audio_file_like_object # Bellek içi dosya objesini gönder
+            audio_file=file.file,
+            filename=file.filename # Whisper formatı dosya uzantısından anlar
         )
 
         return {
@@ -549,15 +793,85 @@ async def add_voice_answer_endpoint(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sesli cevap işlenirken hata oluştu: {e}")
 
+@app.post("/answers/voice/batch", summary="Birden fazla sesli cevabı tek istekte alır, eşzamanlı olarak metne çevirir ve 'Verbal Question' kaydına tek seferde yazar.")
+async def add_voice_answers_batch_endpoint(
+    exam_name: str = Form(...),
+    student_name: str = Form(...),
+    indices: List[int] = Form(..., description="Her dosyanın kaydedileceği sorunun indeksi, dosyalarla aynı sırada"),
+    files: List[UploadFile] = File(..., description="Ses dosyaları (örn: .mp3, .wav, .m4a)"),
+    _ = Depends(verify_castrumai_api_key)
+):
+    """
+    Sözel sınavın cevaplarını tek multipart istekte alır. Her dosya files alanında,
+    karşılık gelen soru indeksi aynı sırada indices alanında gönderilir. Çevirilerden
+    biri başarısız olursa hiçbir cevap kaydedilmez.
+    """
+    if len(files) != len(indices):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Dosya sayısı ({len(files)}) ile indeks sayısı ({len(indices)}) eşleşmiyor.")
+    if len(files) > VOICE_BATCH_MAX_FILES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tek istekte en fazla {VOICE_BATCH_MAX_FILES} ses dosyası yüklenebilir.")
+    if len(set(indices)) != len(indices):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Aynı indeks için birden fazla dosya gönderilemez.")
+    try:
+        for index in indices:
+            examai.check_answer_index(index)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    for file in files:
+        _check_voice_content_type(file)
+        if file.size is not None and file.size > VOICE_UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"{file.filename} çok büyük. Dosya başına en fazla {VOICE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB yüklenebilir."
+            )
+
+    try:
+        for file in files:
+            file.file.seek(0)
+        transcribed_texts = await examai.add_voice_answers_batch(
+            exam_name=exam_name,
+            student_name=student_name,
+            uploads=[(index, file.file, file.filename) for index, file in zip(indices, files)]
+        )
+
+        return {
+            "message": f"{len(files)} sesli cevap başarıyla kaydedildi.",
+            "answers": [
+                {"index": index, "transcribed_text": text} for index, text in zip(indices, transcribed_texts)
+            ]
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sesli cevaplar işlenirken hata oluştu: {e}")
+
+@app.get("/answers/voice/jobs/{job_id}", summary="Arka plan ses çevirisi işinin durumunu (queued, running, completed, failed) ve tamamlandıysa çevrilen metni döndürür.")
+async def get_voice_answer_job_endpoint(job_id: str, _ = Depends(verify_castrumai_api_key)):
+    job = await transcription_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Çeviri işi bulunamadı.")
+    return job
 
 
 # --- YENİ ENDPOINT: Sözel Cevaplar İçin Geri Bildirim Üretme ---
 @app.post("/feedback/verbal", response_model=VerbalFeedbackResponse)
-async def get_feedback_for_verbal_answers(request: VerbalFeedbackRequest, _ = Depends(verify_castrumai_api_key)):
+async def get_feedback_for_verbal_answers(
+    request: VerbalFeedbackRequest,
+    background: bool = Query(False, description="true ise iş kuyruğa alınır ve hemen 202 ile iş kimliği döner (bkz. /jobs)"),
+    priority: int = Query(job_queue.JOB_DEFAULT_PRIORITY, description="background=true iken kuyruk önceliği; küçük değer önce çalışır"),
+    _ = Depends(verify_castrumai_api_key)
+):
     """
     Veritabanında kayıtlı sözel sorular, geri bildirim rehberleri ve öğrenci cevaplarına
     dayanarak, bir insan eğitmene sunulmak üzere yapıcı geri bildirim metinleri üretir.
     """
+    if background:
+        return await _submit_background_job("feedback/verbal", request, priority)
+    return await _feedback_verbal(request)
+
+@singleflight.coalesce("feedback/verbal", lambda r: (r.exam_name, r.student_name, "Verbal Question"))
+@ledger.track("feedback/verbal", lambda r: (r.exam_name, r.student_name))
+async def _feedback_verbal(request: VerbalFeedbackRequest) -> VerbalFeedbackResponse:
     try:
         question_type = "Verbal Question" # question_type burada otomatik olarak ayarlandı.
 
@@ -587,9 +901,11 @@ async def get_feedback_for_verbal_answers(request: VerbalFeedbackRequest, _ = De
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Sözel geri bildirim üretilirken hata oluştu: {e}")
+        log.error("Sözel geri bildirim üretilirken hata oluştu", error=str(e))
         raise HTTPException(status_code=500, detail=f"Sözel geri bildirim üretilirken bir hata oluştu: {e}")
 
+job_queue.register("feedback/verbal", VerbalFeedbackRequest, _feedback_verbal)
+
 # main.py dosyanızdaki /evaluate endpoint'ini bununla değiştirin
 
 
@@ -604,7 +920,7 @@ async def create_or_update_exam_record_endpoint(
         upserted_record = await examai.upsert_exam_record(record_data)
         
         if upserted_record:
-            return {"message": "Sınav kaydı başarıyla oluşturuldu/güncellendi.", "record": upserted_record}
+            return FastJSONResponse({"message": "Sınav kaydı başarıyla oluşturuldu/güncellendi.", "record": upserted_record})
         else:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Sınav kaydı oluşturulurken/güncellenirken beklenmeyen bir hata oluştu.")
     except Exception as e:
@@ -616,13 +932,8 @@ async def delete_exam_record_endpoint(
     _ = Depends(verify_castrumai_api_key)
 ):
     try:
-        response = await run_in_threadpool(lambda: examai.supabase.table('exam_records')
-                                           .delete()
-                                           .eq('exam_name', request.exam_name)
-                                           .eq('student_name', request.student_name)
-                                           .eq('question_type', request.question_type)
-                                           .execute())
-        if response.data:
+        deleted = await examai.delete_exam_record(request.exam_name, request.student_name, request.question_type)
+        if deleted:
             return {"message": "Sınav kaydı başarıyla silindi."}
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Silinecek sınav kaydı bulunamadı.")
@@ -685,12 +996,74 @@ async def get_single_exam_record_endpoint(exam_name: str, student_name: str, que
         record = await examai.get_student_exam_record(exam_name, student_name, question_type)
         if record is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sınav kaydı bulunamadı.")
-        return {"exam_name": exam_name, "student_name": student_name, "question_type": question_type, "record": record}
+        return FastJSONResponse({"exam_name": exam_name, "student_name": student_name, "question_type": question_type, "record": record})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sınav kaydı alınırken hata oluştu: {e}")
 
+def _parse_columns(columns: Optional[str]) -> Optional[List[str]]:
+    return [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+
+@app.get("/records", summary="Bir sınavdaki tüm öğrencilerin kayıtlarını sayfalı olarak döndürür. Sonraki sayfa için next_cursor değeri 'after' olarak gönderilmelidir.")
+async def list_exam_records_endpoint(
+    exam_name: str,
+    question_type: str,
+    columns: Optional[str] = Query(None, description="Virgülle ayrılmış sütun listesi, örn. 'answers,results,total_score'"),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Önceki sayfanın next_cursor değeri"),
+    _ = Depends(verify_castrumai_api_key)
+):
+    try:
+        records = await examai.list_exam_records(exam_name, question_type, _parse_columns(columns), limit, after)
+        next_cursor = records[-1]['student_name'] if len(records) == limit else None
+        return FastJSONResponse({"exam_name": exam_name, "question_type": question_type, "records": records, "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sınav kayıtları listelenirken hata oluştu: {e}")
+
+@app.get("/records/stream", summary="Bir sınavdaki tüm öğrencilerin kayıtlarını NDJSON (her satırda bir kayıt) olarak akış halinde döndürür.")
+async def stream_exam_records_endpoint(
+    exam_name: str,
+    question_type: str,
+    columns: Optional[str] = Query(None, description="Virgülle ayrılmış sütun listesi, örn. 'answers,results,total_score'"),
+    page_size: int = Query(100, ge=1, le=1000),
+    _ = Depends(verify_castrumai_api_key)
+):
+    try:
+        selected_columns = _parse_columns(columns)
+        examai._cohort_select(selected_columns) # Akış başlamadan önce sütunları doğrula
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def ndjson_lines():
+        async for record in examai.iter_exam_records(exam_name, question_type, selected_columns, page_size):
+            yield responses.dumps(record) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.get("/export", summary="Bir sınavın sonuçlarını öğrenci ve soru başına bir satır (question, answer, result, reasoning, score) olacak şekilde CSV veya Parquet olarak akış halinde dışa aktarır.")
+async def export_exam_results_endpoint(
+    exam_name: str,
+    question_type: str,
+    format: str = Query("csv", description="'csv' veya 'parquet'"),
+    page_size: int = Query(100, ge=1, le=1000),
+    _ = Depends(verify_castrumai_api_key)
+):
+    export_format = format.lower()
+    try:
+        exports.check_format(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    filename = quote(f"{exam_name}-{question_type}.{export_format}")
+    return StreamingResponse(
+        exports.stream_export(exam_name, question_type, export_format, page_size),
+        media_type=exports.EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+    )
+
 @app.get("/question", summary="Belirli bir soruyu döndürür.")
 async def get_single_question_endpoint(exam_name: str, student_name: str, question_type: str, index: int, _ = Depends(verify_castrumai_api_key)):
     try:
@@ -718,8 +1091,8 @@ async def get_all_questions_endpoint(exam_name: str, student_name: str, question
 @app.get("/count", summary="Belirli bir öğrenci için belirtilen sınav adı ve soru tipine göre soru sayısını döndürür.")
 async def get_question_count_endpoint(exam_name: str, student_name: str, question_type: str, _ = Depends(verify_castrumai_api_key)):
     try:
-        record = await examai.get_student_exam_record(exam_name, student_name, question_type)
-        if not record or 'questions' not in record:
+        record = await examai.get_student_exam_record(exam_name, student_name, question_type, "questions")
+        if not record or not isinstance(record.get('questions'), list):
             return {"exam_name": exam_name, "student_name": student_name, "question_type": question_type, "question_count": 0, "message": f"{question_type} soru bulunamadı veya kayıt mevcut değil."}
         return {"question_count": len(record['questions'])}
     except HTTPException:
@@ -812,6 +1185,13 @@ async def get_total_score_endpoint(exam_name: str, student_name: str, question_t
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Toplam puan alınırken hata oluştu: {e}")
 
+@app.get("/stats", summary="Bir sınavın kayıt sayısı, ortalama puanı, puan histogramı ve soru bazlı geçme oranlarını döndürür. İstatistikler her sonuç yazımında artımlı güncellenir.")
+async def get_exam_stats_endpoint(exam_name: str, question_type: str, _ = Depends(verify_castrumai_api_key)):
+    try:
+        return await examai.get_exam_stats(exam_name, question_type)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sınav istatistikleri alınırken hata oluştu: {e}")
+
 @app.get("/plagiarism-violations", summary="Öğrencinin intihal ihlallerini döndürür.")
 async def get_plagiarism_violations_endpoint(exam_name: str, student_name: str, question_type: str, _ = Depends(verify_castrumai_api_key)):
     try:
@@ -980,7 +1360,7 @@ async def update_single_result_endpoint(
             request.result
         )
         if updated_record:
-            return {"message": "Sonuç başarıyla güncellendi.", "results": updated_record.get('results', [])}
+            return {"message": "Sonuç başarıyla güncellendi.", "results": updated_record.get('results', []), "total_score": updated_record.get('total_score')}
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sonuç güncellenemedi veya kayıt bulunamadı.")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sonuç güncellenirken hata oluştu: {e}")
@@ -998,7 +1378,7 @@ async def update_bulk_results_endpoint(
             request.results
         )
         if updated_record:
-            return {"message": "Sonuçlar toplu olarak başarıyla güncellendi.", "results": updated_record.get('results', [])}
+            return {"message": "Sonuçlar toplu olarak başarıyla güncellendi.", "results": updated_record.get('results', []), "total_score": updated_record.get('total_score')}
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sonuçlar toplu olarak güncellenemedi veya kayıt bulunamadı.")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sonuçlar toplu olarak güncellenirken hata oluştu: {e}")
@@ -1029,24 +1409,18 @@ async def get_all_generated_questions_for_exam(exam_name: str, question_type: st
     tüm soruları veritabanından çeker ve tek bir liste olarak döndürür.
     """
     try:
-        response = await run_in_threadpool(
-            lambda: supabase.from_('exam_records') # Doğru tablo adı 'exam_records'
-            .select('questions') # Sadece 'questions' sütununu çek
-            .eq('exam_name', exam_name)
-            .eq('question_type', question_type)
-            .execute()
-        )
+        rows = [record async for record in examai.iter_exam_records(exam_name, question_type, ["questions"])]
         
         all_questions_across_students = []
-        if response.data:
-            for record in response.data:
+        if rows:
+            for record in rows:
                 questions_list = record.get('questions')
                 if isinstance(questions_list, list):
                     all_questions_across_students.extend(questions_list)
         
         return all_questions_across_students
     except Exception as e:
-        print(f"Tüm sınav soruları çekilirken hata oluştu: {e}")
+        log.error("Tüm sınav soruları çekilirken hata oluştu", error=str(e))
         # Hata durumunda boş liste dön, böylece model yine de soru üretebilir
         return []
     
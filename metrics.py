@@ -0,0 +1,217 @@
+import os
+import time
+import bisect
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import logs
+
+# --- Prometheus Metrikleri ---
+# Sıcak yoldaki aşamaların (embedding, match_chunks, bağlam oluşturma, chat modeli,
+# kayıt yazma, Whisper) süreleri, OpenAI token kullanımı, önbellek isabetleri ve o an
+# çalışan iş sayıları süreç içinde tutulur; GET /metrics bunları Prometheus metin
+# formatında döndürür. Kayıt sırasında yalnızca bir sözlük güncellenir; metin yalnızca
+# scrape edildiğinde üretilir. METRICS_ENABLED=0 ile ölçüm tamamen kapatılır.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Saniye cinsinden; veritabanı çağrılarından uzun model çağrılarına kadar
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = logs.get_logger("examai.metrics")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        _registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """
+    Değer ya inc/dec ile güncellenir ya da set_function ile verilen fonksiyon scrape
+    anında çağrılarak okunur (fonksiyon {etiket değerleri: değer} döndürür).
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Callable[[], Dict[LabelValues, float]] | None = None
+
+    def inc(self, *label_values: str, amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        self._function = function
+
+    @contextmanager
+    def track(self, *label_values: str):
+        self.inc(*label_values)
+        try:
+            yield
+        finally:
+            self.dec(*label_values)
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        if self._function is not None:
+            try:
+                values.update(self._function())
+            except Exception as e:
+                log.warning("Metrik okunamadı", metric=self.name, error=str(e))
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (), buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # etiket değerleri -> [kova başına sayılar (+Inf dahil), toplam, adet]
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        if not METRICS_ENABLED:
+            return
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# --- Uygulama metrikleri ---
+stage_duration = Histogram(
+    "examai_stage_duration_seconds",
+    "Sıcak yoldaki aşamaların süresi (embedding, match_chunks, context, chat, upsert_record, whisper).",
+    ["stage", "model"]
+)
+openai_requests = Counter("examai_openai_requests_total", "Model başına OpenAI çağrıları ve sonuçları.", ["model", "outcome"])
+openai_tokens = Counter("examai_openai_tokens_total", "OpenAI yanıtlarındaki usage alanından okunan token sayıları.", ["model", "kind"])
+cache_requests = Counter("examai_cache_requests_total", "Önbellek isabetleri (hit) ve ıskaları (miss).", ["cache", "result"])
+in_flight = Gauge("examai_in_flight", "O an çalışan HTTP istekleri, OpenAI çağrıları ve arka plan işleri.", ["kind"])
+
+
+@contextmanager
+def stage(name: str, model: str = ""):
+    """Aşama süresini ölçer; model verilmişse çağrı sayısı ve eşzamanlılık da tutulur."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    outcome = "error"
+    if model:
+        in_flight.inc(f"openai:{model}")
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        stage_duration.observe(time.perf_counter() - started, name, model)
+        if model:
+            in_flight.dec(f"openai:{model}")
+            openai_requests.inc(model, outcome)
+
+
+def record_usage(model: str, response: Any):
+    """OpenAI yanıtının usage alanındaki prompt/completion token sayılarını ekler."""
+    usage = getattr(response, "usage", None)
+    if usage is None or not METRICS_ENABLED:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = getattr(usage, kind, None)
+        if tokens:
+            openai_tokens.inc(model, kind.removesuffix("_tokens"), amount=tokens)
+
+
+def cache_result(cache: str, hit: bool):
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+class InFlightMiddleware:
+    """O an işlenen HTTP isteklerini sayar (/metrics scrape'leri hariç)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        with in_flight.track("http"):
+            await self.app(scope, receive, send)
@@ -0,0 +1,161 @@
+import os
+import zlib
+from typing import Any, Dict
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # requirements.txt'te; kurulu değilse yalnızca gzip kullanılır
+except ImportError:
+    brotli = None
+
+# --- JSON Yanıtları ve Sıkıştırma ---
+# FastJSONResponse uygulamanın varsayılan yanıt sınıfıdır; gövdeyi orjson ile üretir.
+# FastAPI dönen dict'i yanıt sınıfına vermeden önce jsonable_encoder'dan geçirir ve büyük
+# kayıtlarda süreyi asıl bu adım belirler. Bu yüzden tam kayıt döndüren endpoint'ler
+# FastJSONResponse'u doğrudan döndürür; orjson'un tanımadığı tipler (Decimal, set...)
+# yine jsonable_encoder'a düşer.
+# CompressionMiddleware RESPONSE_COMPRESSION_MIN_BYTES'tan büyük yanıtları istemcinin
+# Accept-Encoding başlığına göre brotli (kuruluysa) veya gzip ile sıkıştırır. Akışlı yanıtlar
+# (/records/stream NDJSON gibi) her parçada flush edilir; istemci satırları beklemeden alır.
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+# Zaten sıkıştırılmış veya akış halinde anında iletilmesi gereken içerikler
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "application/vnd.apache.parquet", "audio/", "image/", "application/zip")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """'gzip, br;q=0.8, *;q=0' -> {'gzip': 1.0, 'br': 0.8, '*': 0.0}"""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    encodings = _accepted_encodings(accept_encoding)
+    wildcard = encodings.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = encodings.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        # Z_SYNC_FLUSH ile parça hemen açılabilir hale gelir (NDJSON/akış yanıtları bekletilmez)
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        compressed = self._compressor.process(body)
+        return compressed + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    Yanıtı ilk gövde parçasına bakarak sıkıştırır: tek parçalı yanıtlar minimum_size'dan
+    küçükse, içerik zaten kodlanmışsa veya türü EXCLUDED_CONTENT_TYPES'taysa olduğu gibi
+    gönderilir. Akışlı yanıtlarda her parça ayrı ayrı flush edilir.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level: int = RESPONSE_GZIP_LEVEL,
+        brotli_quality: int = RESPONSE_BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compressor(self, encoding: str):
+        if encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None  # ilk gövde parçasına kadar bekletilir
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                if compressor is not None and message["type"] == "http.response.body":
+                    message = {**message, "body": compressor.compress(message.get("body", b""), more_body=message.get("more_body", False))}
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                await send(message)
+                return
+
+            # İlk gövde parçası: sıkıştırılıp sıkıştırılmayacağına burada karar verilir
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(raw=start_message["headers"])
+            skip = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+                or (not more_body and len(body) < self.minimum_size)
+            )
+            if not skip:
+                compressor = self._compressor(encoding)
+                message = {**message, "body": compressor.compress(body, more_body=more_body)}
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(message["body"]))
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
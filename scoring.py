@@ -0,0 +1,109 @@
+import re
+import math
+from typing import List, Optional, Dict, Any
+
+# --- Puanlama ve Sınav İstatistikleri ---
+# total_score her zaman results dizisinden hesaplanır. Her sonuç için puan:
+#   "correct" / "true" / "doğru"  -> 1
+#   sayısal değer (örn. "2.5")     -> değerin kendisi
+#   diğerleri ("wrong", boş, null) -> 0
+# Puanı 0'dan büyük olan soru "geçti" sayılır. Bu kurallar sql/exam_stats.sql içindeki
+# exam_result_points / exam_result_attempted fonksiyonlarıyla birebir aynı olmalıdır.
+PASSING_RESULTS = {"correct", "true", "doğru"}
+_NUMERIC_RESULT = re.compile(r"^-?[0-9]+(\.[0-9]+)?$")
+
+
+def result_points(result: Any) -> float:
+    if isinstance(result, bool):
+        return 0.0
+    if isinstance(result, (int, float)):
+        return float(result)
+    if isinstance(result, str):
+        text = result.strip()
+        if text.lower() in PASSING_RESULTS:
+            return 1.0
+        if _NUMERIC_RESULT.match(text):
+            return float(text)
+    return 0.0
+
+
+def result_attempted(result: Any) -> bool:
+    """Boş veya null sonuçlar henüz değerlendirilmemiş sayılır ve geçme oranına katılmaz."""
+    if result is None:
+        return False
+    return not (isinstance(result, str) and not result.strip())
+
+
+def total_score(results: Any) -> float | None:
+    """results bir dizi değilse None döner (kaydın total_score değerine dokunulmaz)."""
+    if not isinstance(results, list):
+        return None
+    return sum(result_points(r) for r in results)
+
+
+def histogram_bucket(score: float) -> str:
+    return str(math.floor(score))
+
+
+def empty_stats(exam_name: str, question_type: str) -> Dict[str, Any]:
+    return {
+        "exam_name": exam_name,
+        "question_type": question_type,
+        "record_count": 0,
+        "score_sum": 0.0,
+        "histogram": {},
+        "question_attempts": [],
+        "question_passes": []
+    }
+
+
+def apply_results(stats: Dict[str, Any], results: Any, sign: int):
+    """
+    Bir kaydın katkısını istatistiklere ekler (sign=1) veya çıkarır (sign=-1).
+    Sonucu olmayan (boş results) kayıtlar istatistiklere katılmaz.
+    """
+    if not isinstance(results, list) or not results:
+        return
+    score = total_score(results)
+    bucket = histogram_bucket(score)
+    stats["record_count"] += sign
+    stats["score_sum"] += sign * score
+    count = stats["histogram"].get(bucket, 0) + sign
+    if count:
+        stats["histogram"][bucket] = count
+    else:
+        stats["histogram"].pop(bucket, None)
+
+    attempts, passes = stats["question_attempts"], stats["question_passes"]
+    while len(attempts) < len(results):
+        attempts.append(0)
+    while len(passes) < len(results):
+        passes.append(0)
+    for index, result in enumerate(results):
+        if result_attempted(result):
+            attempts[index] += sign
+            if result_points(result) > 0:
+                passes[index] += sign
+
+
+def format_stats(stats: Optional[Dict[str, Any]], exam_name: str, question_type: str) -> Dict[str, Any]:
+    """Saklanan toplamlardan ortalama ve soru bazlı geçme oranlarını üretir."""
+    stats = stats or empty_stats(exam_name, question_type)
+    record_count = stats.get("record_count") or 0
+    attempts = stats.get("question_attempts") or []
+    passes = stats.get("question_passes") or []
+    return {
+        "exam_name": exam_name,
+        "question_type": question_type,
+        "record_count": record_count,
+        "mean_score": round(stats.get("score_sum", 0.0) / record_count, 4) if record_count else None,
+        "histogram": {
+            bucket: count
+            for bucket, count in sorted((stats.get("histogram") or {}).items(), key=lambda item: int(item[0]))
+        },
+        "question_pass_rates": [
+            round(passes[i] / attempts[i], 4) if i < len(passes) and attempts[i] else None
+            for i in range(len(attempts))
+        ],
+        "question_attempts": attempts
+    }
@@ -0,0 +1,64 @@
+import asyncio
+import functools
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+import logs
+
+# --- Eşzamanlı Aynı İsteklerin Birleştirilmesi (single-flight) ---
+# Aynı işlem için aynı kimlikle (exam_name, student_name, question_type ...) gelen istekler
+# aynı anda çalışıyorsa OpenAI hattı bir kez çalıştırılır; sonradan gelenler ilk çağrının
+# sonucunu (veya hatasını) paylaşır. Sonuç saklanmaz: ilk çağrı bittikten sonra gelen
+# istek işlemi yeniden çalıştırır. Bekleyen çağrıların hepsi iptal edilirse iş de iptal edilir.
+
+log = logs.get_logger("examai.singleflight")
+
+_in_flight: Dict[Tuple[Hashable, ...], Dict[str, Any]] = {}
+_calls: Counter = Counter()
+_coalesced: Counter = Counter()
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """İşlem başına toplam çağrı, birleştirilen çağrı ve şu an çalışan iş sayıları."""
+    in_flight = Counter(key[0] for key in _in_flight)
+    return {
+        operation: {"calls": _calls[operation], "coalesced": _coalesced[operation], "in_flight": in_flight[operation]}
+        for operation in sorted(_calls)
+    }
+
+
+async def run(operation: str, identity: Tuple[Hashable, ...], factory: Callable[[], Awaitable[Any]]) -> Any:
+    key = (operation, *identity)
+    _calls[operation] += 1
+    flight = _in_flight.get(key)
+    if flight is None:
+        task = asyncio.create_task(factory())
+        flight = {"task": task, "waiters": 0}
+        _in_flight[key] = flight
+        task.add_done_callback(lambda _: _in_flight.pop(key, None) if _in_flight.get(key) is flight else None)
+    else:
+        _coalesced[operation] += 1
+        log.info("Aynı istek zaten çalışıyor, sonucu paylaşılacak", operation=operation, identity=identity)
+
+    flight["waiters"] += 1
+    try:
+        return await asyncio.shield(flight["task"])
+    except asyncio.CancelledError:
+        if flight["waiters"] == 1 and not flight["task"].done():
+            flight["task"].cancel()
+        raise
+    finally:
+        flight["waiters"] -= 1
+
+
+def coalesce(operation: str, identity: Callable[..., Tuple[Hashable, ...]]):
+    """
+    Bir coroutine fonksiyonunu single-flight ile sarar; identity aynı argümanlarla
+    çağrılıp birleştirme anahtarını üretir.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run(operation, identity(*args, **kwargs), lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
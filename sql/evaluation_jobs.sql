@@ -0,0 +1,27 @@
+-- Toplu (cohort) değerlendirme işlerinin durumunu ve öğrenci bazlı ilerlemesini tutar.
+-- Servis yeniden başlatıldığında 'running' durumundaki işler kaldığı yerden devam eder.
+create table if not exists evaluation_jobs (
+    id uuid primary key default gen_random_uuid(),
+    exam_name text not null,
+    status text not null default 'running',      -- running | completed | failed
+    total integer not null default 0,             -- değerlendirilecek (cevabı olan) öğrenci sayısı
+    completed_students jsonb not null default '[]'::jsonb,
+    skipped_students jsonb not null default '[]'::jsonb,
+    failed_students jsonb not null default '{}'::jsonb,  -- öğrenci adı -> hata mesajı
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists evaluation_jobs_exam_status_idx on evaluation_jobs (exam_name, status);
+
+-- Aynı sınav için aynı anda yalnızca bir iş çalışabilir (eşzamanlı POST /evaluate/cohort
+-- istekleri aynı öğrencileri iki kez değerlendirmesin). İndeks öncesinde varsa kopyalar kapatılır.
+update evaluation_jobs j
+set status = 'failed', error = 'Aynı sınav için çalışan başka bir iş var.', updated_at = now()
+where j.status = 'running' and exists (
+    select 1 from evaluation_jobs o
+    where o.exam_name = j.exam_name and o.status = 'running' and (o.created_at, o.id) < (j.created_at, j.id)
+);
+
+create unique index if not exists evaluation_jobs_one_running_idx on evaluation_jobs (exam_name) where status = 'running';
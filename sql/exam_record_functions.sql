@@ -0,0 +1,250 @@
+-- exam_records tablosu için sunucu tarafı yardımcı fonksiyonlar.
+-- Supabase SQL Editor üzerinden bir kez çalıştırılmalıdır.
+-- Dizi sütunlarının (questions, question_topics, choices, correct_answers,
+-- answers, results, reasonings, evaluation_rubrics) jsonb olduğu varsayılır.
+
+-- Bir dizi sütunundaki tek bir elemanı satır kilidi altında günceller.
+-- Tüm satırı istemciye taşımadan, sadece değişen elemanı gönderir ve
+-- güncellenmiş diziyi döndürür. Kayıt yoksa (ve p_create false ise) NULL döner.
+-- Negatif indeks Python'daki gibi sondan sayılır; dizinin dışındaysa NULL döner
+-- (jsonb_set bu durumda değeri dizinin başına eklerdi).
+create or replace function exam_record_set_element(
+    p_exam_name text,
+    p_student_name text,
+    p_question_type text,
+    p_column text,
+    p_index integer,
+    p_value jsonb,
+    p_sub_index integer default null,
+    p_pad_value jsonb default 'null'::jsonb,
+    p_require_array boolean default false,
+    p_create boolean default false
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_array jsonb;
+    v_inner jsonb;
+    v_rows integer;
+begin
+    if p_column not in ('questions', 'question_topics', 'choices', 'correct_answers',
+                        'answers', 'results', 'reasonings', 'evaluation_rubrics') then
+        raise exception 'exam_record_set_element: desteklenmeyen sütun %', p_column;
+    end if;
+
+    if p_create then
+        insert into exam_records (exam_name, student_name, question_type)
+        values (p_exam_name, p_student_name, p_question_type)
+        on conflict (exam_name, student_name, question_type) do nothing;
+    end if;
+
+    execute format(
+        'select %I from exam_records
+          where exam_name = $1 and student_name = $2 and question_type = $3
+          for update',
+        p_column
+    ) into v_array using p_exam_name, p_student_name, p_question_type;
+
+    get diagnostics v_rows = row_count;
+    if v_rows = 0 then
+        return null;
+    end if;
+
+    if v_array is null or jsonb_typeof(v_array) <> 'array' then
+        if p_require_array then
+            return null;
+        end if;
+        v_array := '[]'::jsonb;
+    end if;
+
+    if p_sub_index is not null then
+        -- İç içe dizi (örn. choices[soru][şık]): sadece mevcut elemanlar güncellenir.
+        if p_index < 0 or p_index >= jsonb_array_length(v_array) then
+            return null;
+        end if;
+        v_inner := v_array -> p_index;
+        if jsonb_typeof(v_inner) <> 'array'
+           or p_sub_index < 0 or p_sub_index >= jsonb_array_length(v_inner) then
+            return null;
+        end if;
+        v_array := jsonb_set(v_array, array[p_index::text, p_sub_index::text], coalesce(p_value, 'null'::jsonb));
+    else
+        if p_index < 0 and -p_index > jsonb_array_length(v_array) then
+            return null;
+        end if;
+        while jsonb_array_length(v_array) <= p_index loop
+            v_array := v_array || jsonb_build_array(p_pad_value);
+        end loop;
+        v_array := jsonb_set(v_array, array[p_index::text], coalesce(p_value, 'null'::jsonb));
+    end if;
+
+    execute format(
+        'update exam_records set %I = $1
+          where exam_name = $2 and student_name = $3 and question_type = $4',
+        p_column
+    ) using v_array, p_exam_name, p_student_name, p_question_type;
+
+    return v_array;
+end;
+$$;
+
+
+-- Aynı indeksteki elemanı birden fazla dizi sütununda tek işlemde günceller
+-- (örn. bir soru ve doğru cevabı birlikte). p_values: {"<sütun>": <değer>, ...}.
+-- Sütunlar birbirinden kopmaz; biri güncellenip diğeri güncellenmeden kalamaz.
+-- Güncellenmiş dizileri {"<sütun>": [...], ...} olarak, kayıt yoksa veya negatif indeks
+-- sütunlardan birinin dışındaysa (hiçbir sütun yazılmadan) NULL döndürür.
+create or replace function exam_record_set_elements(
+    p_exam_name text,
+    p_student_name text,
+    p_question_type text,
+    p_index integer,
+    p_values jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_column text;
+    v_value jsonb;
+    v_array jsonb;
+    v_out jsonb := '{}'::jsonb;
+begin
+    perform 1
+       from exam_records
+      where exam_name = p_exam_name and student_name = p_student_name and question_type = p_question_type
+        for update;
+
+    if not found then
+        return null;
+    end if;
+
+    if p_index < 0 then
+        for v_column in select key from jsonb_each(p_values) loop
+            execute format(
+                'select %I from exam_records
+                  where exam_name = $1 and student_name = $2 and question_type = $3',
+                v_column
+            ) into v_array using p_exam_name, p_student_name, p_question_type;
+            if v_array is null or jsonb_typeof(v_array) <> 'array' or -p_index > jsonb_array_length(v_array) then
+                return null;
+            end if;
+        end loop;
+    end if;
+
+    for v_column, v_value in select key, value from jsonb_each(p_values) loop
+        v_array := exam_record_set_element(
+            p_exam_name, p_student_name, p_question_type, v_column, p_index, v_value
+        );
+        v_out := v_out || jsonb_build_object(v_column, v_array);
+    end loop;
+
+    return v_out;
+end;
+$$;
+
+
+-- Belirtilen indeksteki soruyu ve ona bağlı tüm dizi elemanlarını tek bir
+-- UPDATE ile siler. Kayıt yoksa NULL, doğrulama hatasında {"error": ...} döner.
+create or replace function exam_record_delete_question(
+    p_exam_name text,
+    p_student_name text,
+    p_question_type text,
+    p_index integer
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_questions jsonb;
+    v_count integer;
+begin
+    select questions into v_questions
+      from exam_records
+     where exam_name = p_exam_name and student_name = p_student_name and question_type = p_question_type
+       for update;
+
+    if not found then
+        return null;
+    end if;
+
+    if v_questions is null or jsonb_typeof(v_questions) <> 'array' or jsonb_array_length(v_questions) = 0 then
+        return jsonb_build_object('error', 'empty');
+    end if;
+
+    v_count := jsonb_array_length(v_questions);
+    if p_index < 0 or p_index >= v_count then
+        return jsonb_build_object('error', 'index', 'count', v_count);
+    end if;
+
+    update exam_records set
+        questions       = questions - p_index,
+        correct_answers = case when jsonb_typeof(correct_answers) = 'array' then correct_answers - p_index else correct_answers end,
+        answers         = case when jsonb_typeof(answers) = 'array' then answers - p_index else answers end,
+        results         = case when jsonb_typeof(results) = 'array' then results - p_index else results end,
+        choices         = case when jsonb_typeof(choices) = 'array' then choices - p_index else choices end
+     where exam_name = p_exam_name and student_name = p_student_name and question_type = p_question_type
+    returning questions into v_questions;
+
+    return jsonb_build_object('questions', v_questions);
+end;
+$$;
+
+
+-- Yazma tamponundan (write-behind) gelen birikmiş cevap düzenlemelerini tek
+-- çağrıda uygular. p_edits: [{"exam_name", "student_name", "question_type",
+-- "answers": {"<indeks>": "<cevap>", ...}}, ...]. Kayıt yoksa oluşturulur.
+-- Her kaydın güncel answers dizisini içeren bir dizi döndürür.
+create or replace function exam_record_apply_answer_edits(p_edits jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_edit jsonb;
+    v_answers jsonb;
+    v_key text;
+    v_value jsonb;
+    v_index integer;
+    v_out jsonb := '[]'::jsonb;
+begin
+    for v_edit in select value from jsonb_array_elements(p_edits) loop
+        insert into exam_records (exam_name, student_name, question_type)
+        values (v_edit->>'exam_name', v_edit->>'student_name', v_edit->>'question_type')
+        on conflict (exam_name, student_name, question_type) do nothing;
+
+        select answers into v_answers
+          from exam_records
+         where exam_name = v_edit->>'exam_name'
+           and student_name = v_edit->>'student_name'
+           and question_type = v_edit->>'question_type'
+           for update;
+
+        if v_answers is null or jsonb_typeof(v_answers) <> 'array' then
+            v_answers := '[]'::jsonb;
+        end if;
+
+        for v_key, v_value in select key, value from jsonb_each(v_edit->'answers') loop
+            v_index := v_key::integer;
+            while jsonb_array_length(v_answers) <= v_index loop
+                v_answers := v_answers || jsonb_build_array(null);
+            end loop;
+            v_answers := jsonb_set(v_answers, array[v_index::text], v_value);
+        end loop;
+
+        update exam_records set answers = v_answers
+         where exam_name = v_edit->>'exam_name'
+           and student_name = v_edit->>'student_name'
+           and question_type = v_edit->>'question_type';
+
+        v_out := v_out || jsonb_build_array(jsonb_build_object(
+            'exam_name', v_edit->>'exam_name',
+            'student_name', v_edit->>'student_name',
+            'question_type', v_edit->>'question_type',
+            'answers', v_answers
+        ));
+    end loop;
+
+    return v_out;
+end;
+$$;
@@ -0,0 +1,189 @@
+-- total_score'un results dizisinden otomatik hesaplanması ve sınav bazlı
+-- artımlı istatistikler (kayıt sayısı, ortalama, histogram, soru bazlı geçme oranı).
+-- Supabase SQL Editor üzerinden bir kez çalıştırılmalıdır; puanlama kuralları
+-- scoring.py ile birebir aynıdır.
+
+create table if not exists exam_stats (
+    exam_name text not null,
+    question_type text not null,
+    record_count integer not null default 0,                 -- sonucu olan kayıt sayısı
+    score_sum double precision not null default 0,
+    histogram jsonb not null default '{}'::jsonb,            -- floor(total_score) -> kayıt sayısı
+    question_attempts jsonb not null default '[]'::jsonb,    -- soru indeksi -> sonucu olan kayıt sayısı
+    question_passes jsonb not null default '[]'::jsonb,      -- soru indeksi -> geçen kayıt sayısı
+    updated_at timestamptz not null default now(),
+    primary key (exam_name, question_type)
+);
+
+-- Tek bir sonucun puanı: correct/true/doğru -> 1, sayısal değer -> kendisi, diğerleri -> 0
+create or replace function exam_result_points(p_result jsonb)
+returns double precision
+language sql
+immutable
+as $$
+    select case
+        when jsonb_typeof(p_result) = 'number' then (p_result #>> '{}')::double precision
+        when jsonb_typeof(p_result) = 'string' then
+            case
+                when lower(btrim(p_result #>> '{}')) in ('correct', 'true', 'doğru') then 1
+                when btrim(p_result #>> '{}') ~ '^-?[0-9]+(\.[0-9]+)?$' then btrim(p_result #>> '{}')::double precision
+                else 0
+            end
+        else 0
+    end
+$$;
+
+-- Boş veya null sonuçlar henüz değerlendirilmemiş sayılır
+create or replace function exam_result_attempted(p_result jsonb)
+returns boolean
+language sql
+immutable
+as $$
+    select coalesce(jsonb_typeof(p_result), 'null') <> 'null'
+        and (jsonb_typeof(p_result) <> 'string' or btrim(p_result #>> '{}') <> '')
+$$;
+
+create or replace function exam_results_total(p_results jsonb)
+returns double precision
+language sql
+immutable
+as $$
+    select coalesce(sum(exam_result_points(r)), 0)
+    from jsonb_array_elements(case when jsonb_typeof(p_results) = 'array' then p_results else '[]'::jsonb end) as r
+$$;
+
+-- Bir kaydın katkısını sınav istatistiklerine ekler (p_sign = 1) veya çıkarır (p_sign = -1).
+-- İstatistik satırı kilitlenir; aynı sınavdaki eşzamanlı yazmalar burada sıraya girer.
+create or replace function exam_stats_apply(
+    p_exam_name text,
+    p_question_type text,
+    p_results jsonb,
+    p_sign integer
+)
+returns void
+language plpgsql
+as $$
+declare
+    v_score double precision;
+    v_bucket text;
+    v_count integer;
+    v_histogram jsonb;
+    v_attempts jsonb;
+    v_passes jsonb;
+    i integer;
+begin
+    if jsonb_typeof(p_results) is distinct from 'array' or jsonb_array_length(p_results) = 0 then
+        return;
+    end if;
+
+    v_score := exam_results_total(p_results);
+    v_bucket := floor(v_score)::bigint::text;
+
+    insert into exam_stats (exam_name, question_type)
+    values (p_exam_name, p_question_type)
+    on conflict (exam_name, question_type) do nothing;
+
+    select histogram, question_attempts, question_passes
+    into v_histogram, v_attempts, v_passes
+    from exam_stats
+    where exam_name = p_exam_name and question_type = p_question_type
+    for update;
+
+    v_count := coalesce((v_histogram ->> v_bucket)::integer, 0) + p_sign;
+    if v_count = 0 then
+        v_histogram := v_histogram - v_bucket;
+    else
+        v_histogram := jsonb_set(v_histogram, array[v_bucket], to_jsonb(v_count));
+    end if;
+
+    while jsonb_array_length(v_attempts) < jsonb_array_length(p_results) loop
+        v_attempts := v_attempts || jsonb_build_array(0);
+    end loop;
+    while jsonb_array_length(v_passes) < jsonb_array_length(p_results) loop
+        v_passes := v_passes || jsonb_build_array(0);
+    end loop;
+
+    for i in 0 .. jsonb_array_length(p_results) - 1 loop
+        if exam_result_attempted(p_results -> i) then
+            v_attempts := jsonb_set(v_attempts, array[i::text], to_jsonb((v_attempts ->> i)::integer + p_sign));
+            if exam_result_points(p_results -> i) > 0 then
+                v_passes := jsonb_set(v_passes, array[i::text], to_jsonb((v_passes ->> i)::integer + p_sign));
+            end if;
+        end if;
+    end loop;
+
+    update exam_stats
+    set record_count = record_count + p_sign,
+        score_sum = score_sum + p_sign * v_score,
+        histogram = v_histogram,
+        question_attempts = v_attempts,
+        question_passes = v_passes,
+        updated_at = now()
+    where exam_name = p_exam_name and question_type = p_question_type;
+end;
+$$;
+
+-- results her yazıldığında total_score yeniden hesaplanır
+create or replace function exam_records_total_score_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if jsonb_typeof(new.results) = 'array' then
+        new.total_score := exam_results_total(new.results);
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists exam_records_total_score on exam_records;
+create trigger exam_records_total_score
+    before insert or update of results on exam_records
+    for each row execute function exam_records_total_score_trigger();
+
+-- Eski katkı çıkarılır, yenisi eklenir; tüm yazma yolları (REST, RPC) kapsanır
+create or replace function exam_records_stats_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE'
+       and old.results is not distinct from new.results
+       and old.exam_name = new.exam_name
+       and old.question_type = new.question_type then
+        return null;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform exam_stats_apply(old.exam_name, old.question_type, old.results, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform exam_stats_apply(new.exam_name, new.question_type, new.results, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists exam_records_stats on exam_records;
+create trigger exam_records_stats
+    after insert or delete or update of results, exam_name, question_type on exam_records
+    for each row execute function exam_records_stats_trigger();
+
+-- Mevcut kayıtlar için total_score ve istatistikleri baştan hesaplar.
+-- Kurulumdan sonra bir kez çalıştırılmalıdır: select exam_stats_rebuild();
+create or replace function exam_stats_rebuild()
+returns void
+language plpgsql
+as $$
+declare
+    r record;
+begin
+    update exam_records
+    set total_score = exam_results_total(results)
+    where jsonb_typeof(results) = 'array';
+
+    delete from exam_stats;
+    for r in select exam_name, question_type, results from exam_records loop
+        perform exam_stats_apply(r.exam_name, r.question_type, r.results, 1);
+    end loop;
+end;
+$$;
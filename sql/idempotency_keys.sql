@@ -0,0 +1,17 @@
+-- Idempotency-Key başlığıyla gelen POST isteklerinin kayıtlı yanıtları (bkz. idempotency.py).
+-- Aynı anahtarla tekrar gelen istekler işlem yeniden çalıştırılmadan bu yanıtı alır.
+create table if not exists idempotency_keys (
+    key text primary key,
+    fingerprint text not null,     -- yöntem, yol, sorgu, API anahtarı ve gövdenin SHA-256 özeti
+    status_code integer not null,
+    content_type text,
+    headers jsonb,                 -- hop-by-hop olmayan yanıt başlıkları, [[ad, değer], ...]
+    body text not null,
+    created_at timestamptz not null default now(),
+    expires_at timestamptz not null
+);
+
+-- Başlık sütunu olmadan oluşturulmuş tablolar için
+alter table idempotency_keys add column if not exists headers jsonb;
+
+create index if not exists idempotency_keys_expires_idx on idempotency_keys (expires_at);
@@ -0,0 +1,19 @@
+-- Uzun süren AI işlemleri (/generate/*, /evaluate, /feedback/verbal ?background=true ve POST /jobs)
+-- için iş kuyruğu kayıtları. Servis yeniden başlatıldığında 'queued' ve 'running' işler tekrar kuyruğa alınır.
+create table if not exists job_queue (
+    id uuid primary key,
+    operation text not null,                       -- örn. 'generate/open-ended'
+    status text not null default 'queued',         -- queued | running | completed | failed | cancelled
+    priority integer not null default 5,           -- küçük değer önce çalışır
+    payload jsonb not null default '{}'::jsonb,    -- işlemin istek gövdesi
+    result jsonb,
+    error text,
+    error_status integer,                          -- başarısız işlerde HTTP durum kodu
+    attempts integer not null default 0,
+    created_at timestamptz not null default now(),
+    started_at timestamptz,
+    finished_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists job_queue_status_idx on job_queue (status, priority, created_at);
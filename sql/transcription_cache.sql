@@ -0,0 +1,40 @@
+-- Ses içeriğinin özetine (model:sha256) göre Whisper çevirilerini saklar.
+-- Aynı kaydın tekrar yüklenmesinde Whisper'a yeniden gidilmez.
+create table if not exists transcription_cache (
+    audio_hash text primary key,
+    transcript text not null,
+    created_at timestamptz not null default now(),
+    last_used_at timestamptz not null default now()
+);
+
+create index if not exists transcription_cache_last_used_idx on transcription_cache (last_used_at);
+
+-- Çeviriyi döndürür ve son kullanım zamanını günceller (tek istek)
+create or replace function transcription_cache_get(p_audio_hash text)
+returns text
+language sql
+as $$
+    update transcription_cache
+    set last_used_at = now()
+    where audio_hash = p_audio_hash
+    returning transcript
+$$;
+
+-- En son kullanılan p_max_entries kayıt dışındakileri siler
+create or replace function transcription_cache_evict(p_max_entries integer)
+returns integer
+language plpgsql
+as $$
+declare
+    v_deleted integer;
+begin
+    delete from transcription_cache
+    where audio_hash in (
+        select audio_hash from transcription_cache
+        order by last_used_at desc
+        offset p_max_entries
+    );
+    get diagnostics v_deleted = row_count;
+    return v_deleted;
+end;
+$$;
@@ -0,0 +1,17 @@
+-- /answers/voice?background=true ile kuyruğa alınan ses çevirisi işlerinin durumu
+-- (bkz. transcription_jobs.py). Ses dosyası işi alan sürecin diskinde durur; bu tablo
+-- durumun her API sürecinden sorgulanabilmesini ve yeniden başlatmada kaybolmamasını sağlar.
+create table if not exists transcription_jobs (
+    job_id uuid primary key,
+    exam_name text not null,
+    student_name text not null,
+    answer_index integer not null,
+    status text not null default 'queued',   -- queued | running | completed | failed
+    transcribed_text text,
+    error text,
+    callback_url text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists transcription_jobs_updated_idx on transcription_jobs (updated_at);
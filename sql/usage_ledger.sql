@@ -0,0 +1,52 @@
+-- OpenAI token ve maliyet defteri (bkz. ledger.py). Sayaçlar süreç içinde toplanıp
+-- periyodik olarak usage_ledger_add ile mevcut satırın üzerine eklenir.
+create table if not exists usage_ledger (
+    exam_name text not null,
+    student_name text not null,
+    endpoint text not null,
+    model text not null,
+    requests bigint not null default 0,
+    prompt_tokens bigint not null default 0,         -- önbellekten okunanlar dahil
+    completion_tokens bigint not null default 0,
+    cached_tokens bigint not null default 0,
+    audio_seconds double precision not null default 0,
+    cost_usd double precision not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (exam_name, student_name, endpoint, model)
+);
+
+-- Sınav başına AI bütçesi; dolunca yeni işlemler reddedilir ('reject') veya chat
+-- çağrıları daha ucuz modele düşürülür ('downgrade').
+create table if not exists exam_budgets (
+    exam_name text primary key,
+    budget_usd double precision not null,
+    action text not null default 'reject' check (action in ('reject', 'downgrade')),
+    updated_at timestamptz not null default now()
+);
+
+-- p_rows: [{exam_name, student_name, endpoint, model, requests, prompt_tokens, ...}, ...]
+-- Her satırın sayaçları mevcut değerlere eklenir (tek istek, tek işlem).
+create or replace function usage_ledger_add(p_rows jsonb)
+returns void
+language sql
+as $$
+    insert into usage_ledger as u (
+        exam_name, student_name, endpoint, model, requests, prompt_tokens,
+        completion_tokens, cached_tokens, audio_seconds, cost_usd, updated_at
+    )
+    select
+        r.exam_name, r.student_name, r.endpoint, r.model, r.requests, r.prompt_tokens,
+        r.completion_tokens, r.cached_tokens, r.audio_seconds, r.cost_usd, now()
+    from jsonb_to_recordset(p_rows) as r(
+        exam_name text, student_name text, endpoint text, model text, requests bigint, prompt_tokens bigint,
+        completion_tokens bigint, cached_tokens bigint, audio_seconds double precision, cost_usd double precision
+    )
+    on conflict (exam_name, student_name, endpoint, model) do update set
+        requests = u.requests + excluded.requests,
+        prompt_tokens = u.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = u.completion_tokens + excluded.completion_tokens,
+        cached_tokens = u.cached_tokens + excluded.cached_tokens,
+        audio_seconds = u.audio_seconds + excluded.audio_seconds,
+        cost_usd = u.cost_usd + excluded.cost_usd,
+        updated_at = now()
+$$;
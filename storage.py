@@ -0,0 +1,1291 @@
+import os
+import abc
+import json
+import copy
+import uuid
+import sqlite3
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Protocol
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+
+import scoring
+import cassettes
+
+load_dotenv()
+
+# --- Depolama Katmanı ---
+# Kayıt CRUD işlemleri, dizi elemanı güncellemeleri, chunk eşleştirme ve değerlendirme
+# işleri bu arayüz üzerinden yapılır. STORAGE_BACKEND ile seçilir:
+#   supabase (varsayılan): PostgREST üzerinden Supabase
+#   sqlite: tek makinede çalışan gömülü SQLite (SQLITE_PATH), vektör eşleştirme NumPy ile
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./examai.db")
+
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") != "0"
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+
+EXAM_RECORD_KEY_COLUMNS = ["exam_name", "student_name", "question_type"]
+EXAM_RECORD_DATA_COLUMNS = [
+    "questions", "question_topics", "choices", "correct_answers", "answers", "results",
+    "reasonings", "evaluation_rubrics", "plagiarism_violations", "total_score"
+]
+EXAM_RECORD_COLUMNS = EXAM_RECORD_KEY_COLUMNS + EXAM_RECORD_DATA_COLUMNS
+# exam_record_set_element ile tek elemanı güncellenebilen dizi sütunları
+EXAM_RECORD_ARRAY_COLUMNS = [
+    "questions", "question_topics", "choices", "correct_answers", "answers", "results",
+    "reasonings", "evaluation_rubrics"
+]
+JOB_JSON_COLUMNS = ["completed_students", "skipped_students", "failed_students"]
+QUEUED_JOB_JSON_COLUMNS = ["payload", "result"]
+STATS_JSON_COLUMNS = ["histogram", "question_attempts", "question_passes"]
+USAGE_KEY_COLUMNS = ["exam_name", "student_name", "endpoint", "model"]
+USAGE_COUNTER_COLUMNS = ["requests", "prompt_tokens", "completion_tokens", "cached_tokens", "audio_seconds", "cost_usd"]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RecordStore(Protocol):
+    """Sınav kayıtları (exam_records), dizi elemanı güncellemeleri ve sınav istatistikleri."""
+
+    @abc.abstractmethod
+    async def get_record(self, exam_name: str, student_name: str, question_type: str, columns: Optional[List[str]] = None) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_array_element(self, exam_name: str, student_name: str, question_type: str, column: str, indices: List[int]) -> Any | None:
+        """Bir dizi sütunundan (iç içe indekslerle) tek bir eleman okur; yoksa None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def list_records(self, exam_name: str, question_type: str, columns: Optional[List[str]], limit: int, after: Optional[str]) -> List[Dict[str, Any]]:
+        """Kayıtları student_name sırasıyla, `after` öğrencisinden sonrasını döndürür."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def upsert_record(self, record_data: Dict[str, Any], return_record: bool = True) -> Dict[str, Any] | None:
+        """Sadece verilen sütunları yazar; return_record ise kaydın tamamını döndürür."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_record(self, exam_name: str, student_name: str, question_type: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_array_element(
+        self, exam_name: str, student_name: str, question_type: str, column: str, index: int, value: Any,
+        sub_index: Optional[int] = None, pad_value: Any = None, require_array: bool = False, create_if_missing: bool = False
+    ) -> List[Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_array_elements(
+        self, exam_name: str, student_name: str, question_type: str, index: int, values: Dict[str, Any]
+    ) -> Dict[str, List[Any]] | None:
+        """
+        values'taki her sütunun index'teki elemanını tek işlemde günceller; güncellenmiş
+        dizileri sütun adıyla döndürür. Kayıt yoksa None.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_question(self, exam_name: str, student_name: str, question_type: str, index: int) -> Dict[str, Any] | None:
+        """Soruyu ve bağlı dizi elemanlarını siler. Kayıt yoksa None, doğrulama hatasında {"error": ...}."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def apply_answer_edits(self, edits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_exam_stats(self, exam_name: str, question_type: str) -> Dict[str, Any] | None:
+        """Sınavın artımlı olarak tutulan istatistik satırı (bkz. scoring.py); hiç sonuç yoksa None."""
+        raise NotImplementedError
+
+
+class ChunkStore(Protocol):
+    """Bilgi kaynağı parçalarının vektör benzerliğiyle eşleştirilmesi."""
+
+    @abc.abstractmethod
+    async def match_chunks(
+        self, query_embedding: List[float], match_threshold: float, match_count: int,
+        match_module_ids: Optional[List[str]] = None, match_file_names: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class TranscriptionCache(Protocol):
+    """Ses özetine göre çeviri önbelleği (bkz. sql/transcription_cache.sql)."""
+
+    @abc.abstractmethod
+    async def get_transcription(self, audio_hash: str) -> str | None:
+        """Önbellekteki çeviriyi döndürür ve son kullanım zamanını günceller."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def put_transcription(self, audio_hash: str, transcript: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def evict_transcriptions(self, max_entries: int) -> int:
+        """En son kullanılan max_entries kayıt dışındakileri siler; silinen sayıyı döndürür."""
+        raise NotImplementedError
+
+
+class TranscriptionJobStore(Protocol):
+    """Arka plan ses çevirisi işlerinin durumu (bkz. transcription_jobs.py)."""
+
+    @abc.abstractmethod
+    async def insert_transcription_job(self, job: Dict[str, Any]):
+        """job_id, exam_name, student_name, answer_index, status ve callback_url alanlarını yazar."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_transcription_job(self, job_id: str, columns: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_transcription_job(self, job_id: str) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def evict_transcription_jobs(self, updated_before: str) -> int:
+        """updated_at değeri verilen zamandan eski, bitmiş (completed/failed) işleri siler; silinen sayıyı döndürür."""
+        raise NotImplementedError
+
+
+class IdempotencyStore(Protocol):
+    """Idempotency-Key ile kaydedilen yanıtlar (bkz. idempotency.py)."""
+
+    @abc.abstractmethod
+    async def get_idempotent_response(self, key: str) -> Dict[str, Any] | None:
+        """Süresi dolmamış kayıtlı yanıtı döndürür."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def put_idempotent_response(self, entry: Dict[str, Any]):
+        """key, fingerprint, status_code, content_type, headers ([[ad, değer], ...]), body, expires_at alanlarını yazar."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def evict_idempotent_responses(self) -> int:
+        """Süresi dolmuş kayıtları siler; silinen sayıyı döndürür."""
+        raise NotImplementedError
+
+
+class EvaluationJobStore(Protocol):
+    """Toplu değerlendirme işleri (bkz. evaluation_jobs.py)."""
+
+    @abc.abstractmethod
+    async def insert_job(self, exam_name: str) -> Dict[str, Any] | None:
+        """Sınav için 'running' durumunda yeni bir iş ekler; çalışan bir iş zaten varsa None döndürür."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_job(self, job_id: str, columns: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_job(self, job_id: str) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def list_jobs(self, status: Optional[str] = None, exam_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class JobQueueStore(Protocol):
+    """AI işlemleri için kalıcı iş kuyruğu (bkz. job_queue.py)."""
+
+    @abc.abstractmethod
+    async def insert_queued_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """İş kuyruğuna (bkz. job_queue.py) yeni bir kayıt ekler; job id'yi içerir."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_queued_job(self, job_id: str, columns: Dict[str, Any], statuses: Optional[List[str]] = None) -> bool:
+        """
+        statuses verilirse iş yalnızca bu durumlardan birindeyse güncellenir (koşullu durum
+        geçişi). Bir satır güncellendiyse True döner.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_queued_job(self, job_id: str) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def list_queued_jobs(self, statuses: List[str]) -> List[Dict[str, Any]]:
+        """Verilen durumlardaki işleri öncelik ve oluşturulma sırasına göre döndürür."""
+        raise NotImplementedError
+
+
+class UsageStore(Protocol):
+    """Maliyet defteri ve sınav bütçeleri (bkz. ledger.py)."""
+
+    @abc.abstractmethod
+    async def add_usage(self, rows: List[Dict[str, Any]]):
+        """Maliyet defteri sayaçlarını (bkz. ledger.py) mevcut satırlara ekler; satır yoksa oluşturur."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def list_usage(
+        self,
+        exam_name: str,
+        student_name: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_exam_budget(self, exam_name: str) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def put_exam_budget(self, budget: Dict[str, Any]):
+        """exam_name, budget_usd ve action alanlarını yazar."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_exam_budget(self, exam_name: str) -> bool:
+        raise NotImplementedError
+
+
+class ExamStorage(RecordStore, ChunkStore, TranscriptionCache, TranscriptionJobStore, IdempotencyStore, EvaluationJobStore, JobQueueStore, UsageStore):
+    """
+    Depolama arka uçlarının uygulaması gereken işlemler. Her konu ayrı bir protokoldür; yalnızca
+    birine ihtiyaç duyan kod (veya test sahtesi) o protokolü kullanabilir.
+    """
+
+    @abc.abstractmethod
+    async def ping(self):
+        """Arka uca erişilebildiğini doğrular; erişilemiyorsa hata fırlatır (hazır olma kontrolü)."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+# --- Supabase (PostgREST) ---
+
+class SupabaseStorage(ExamStorage):
+    """
+    Supabase'e, keep-alive ve HTTP/2 destekli tek bir paylaşımlı httpx.AsyncClient
+    üzerinden doğrudan PostgREST çağrılarıyla erişir.
+    """
+
+    def __init__(self, url: str, key: str, transport: httpx.AsyncBaseTransport | None = None):
+        self.url = url
+        self.key = key
+        # Verilirse istekler ağ yerine bu transport'a gider (örn. benchmarks/fakes.py)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE
+            )
+            if self._transport is None:
+                # CASSETTE_MODE açıksa trafik kaydedilir veya kasetten oynatılır (bkz. cassettes.py)
+                self._transport = cassettes.transport("supabase", http2=SUPABASE_HTTP2, limits=limits)
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url.rstrip('/')}/rest/v1",
+                headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+                http2=SUPABASE_HTTP2,
+                limits=limits,
+                timeout=SUPABASE_HTTP_TIMEOUT,
+                transport=self._transport
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, str]] = None,
+        json_body: Any = None,
+        prefer: Optional[str] = None
+    ) -> Any:
+        """PostgREST'e tek bir istek gönderir ve ayrıştırılmış JSON gövdesini (veya None) döndürür."""
+        headers = {"Prefer": prefer} if prefer else None
+        response = await self._get_client().request(method, path, params=params, json=json_body, headers=headers)
+        if response.status_code >= 400:
+            raise httpx.HTTPStatusError(
+                f"PostgREST {method} {path} {response.status_code}: {response.text}",
+                request=response.request,
+                response=response
+            )
+        if not response.content:
+            return None
+        return response.json()
+
+    async def rpc(self, function_name: str, args: Dict[str, Any]) -> Any:
+        return await self.request("POST", f"/rpc/{function_name}", json_body=args)
+
+    async def ping(self):
+        await self.request("GET", "/exam_records", params={"select": "exam_name", "limit": "1"})
+
+    @staticmethod
+    def _key_params(exam_name: str, student_name: str, question_type: str) -> Dict[str, str]:
+        return {
+            "exam_name": f"eq.{exam_name}",
+            "student_name": f"eq.{student_name}",
+            "question_type": f"eq.{question_type}"
+        }
+
+    async def get_record(self, exam_name, student_name, question_type, columns=None):
+        params = {
+            "select": ",".join(columns) if columns else "*",
+            "limit": "1",
+            **self._key_params(exam_name, student_name, question_type)
+        }
+        rows = await self.request("GET", "/exam_records", params=params)
+        return rows[0] if rows else None
+
+    async def get_array_element(self, exam_name, student_name, question_type, column, indices):
+        # PostgREST JSON yolu (örn. questions->3) ile dizinin tamamı taşınmaz
+        path = "->".join([column, *[str(i) for i in indices]])
+        params = {"select": f"value:{path}", "limit": "1", **self._key_params(exam_name, student_name, question_type)}
+        rows = await self.request("GET", "/exam_records", params=params)
+        return rows[0].get('value') if rows else None
+
+    async def list_records(self, exam_name, question_type, columns, limit, after):
+        params = {
+            "select": ",".join(columns) if columns else "*",
+            "exam_name": f"eq.{exam_name}",
+            "question_type": f"eq.{question_type}",
+            "order": "student_name.asc",
+            "limit": str(limit)
+        }
+        if after is not None:
+            params["student_name"] = f"gt.{after}"
+        return await self.request("GET", "/exam_records", params=params) or []
+
+    async def upsert_record(self, record_data, return_record=True):
+        rows = await self.request(
+            "POST", "/exam_records",
+            params={"on_conflict": ",".join(EXAM_RECORD_KEY_COLUMNS)},
+            json_body=record_data,
+            prefer=f"resolution=merge-duplicates,return={'representation' if return_record else 'minimal'}"
+        )
+        return rows[0] if return_record and rows else None
+
+    async def delete_record(self, exam_name, student_name, question_type):
+        rows = await self.request(
+            "DELETE", "/exam_records",
+            params=self._key_params(exam_name, student_name, question_type),
+            prefer="return=representation"
+        )
+        return bool(rows)
+
+    async def set_array_element(self, exam_name, student_name, question_type, column, index, value,
+                                sub_index=None, pad_value=None, require_array=False, create_if_missing=False):
+        array_value = await self.rpc('exam_record_set_element', {
+            'p_exam_name': exam_name,
+            'p_student_name': student_name,
+            'p_question_type': question_type,
+            'p_column': column,
+            'p_index': index,
+            'p_value': value,
+            'p_sub_index': sub_index,
+            'p_pad_value': pad_value,
+            'p_require_array': require_array,
+            'p_create': create_if_missing
+        })
+        return array_value if isinstance(array_value, list) else None
+
+    async def set_array_elements(self, exam_name, student_name, question_type, index, values):
+        return await self.rpc('exam_record_set_elements', {
+            'p_exam_name': exam_name,
+            'p_student_name': student_name,
+            'p_question_type': question_type,
+            'p_index': index,
+            'p_values': values
+        })
+
+    async def delete_question(self, exam_name, student_name, question_type, index):
+        return await self.rpc('exam_record_delete_question', {
+            'p_exam_name': exam_name,
+            'p_student_name': student_name,
+            'p_question_type': question_type,
+            'p_index': index
+        })
+
+    async def apply_answer_edits(self, edits):
+        return await self.rpc('exam_record_apply_answer_edits', {'p_edits': edits}) or []
+
+    async def match_chunks(self, query_embedding, match_threshold, match_count, match_module_ids=None, match_file_names=None):
+        return await self.rpc('match_chunks', {
+            'query_embedding': query_embedding,
+            'match_threshold': match_threshold,
+            'match_count': match_count,
+            'match_module_ids': match_module_ids,
+            'match_file_names': match_file_names
+        }) or []
+
+    async def get_exam_stats(self, exam_name, question_type):
+        # exam_stats tablosu sql/exam_stats.sql içindeki tetikleyicilerle güncel tutulur
+        rows = await self.request(
+            "GET", "/exam_stats",
+            params={"select": "*", "exam_name": f"eq.{exam_name}", "question_type": f"eq.{question_type}"}
+        )
+        return rows[0] if rows else None
+
+    async def get_transcription(self, audio_hash):
+        # bkz. sql/transcription_cache.sql
+        return await self.rpc('transcription_cache_get', {'p_audio_hash': audio_hash})
+
+    async def put_transcription(self, audio_hash, transcript):
+        await self.request(
+            "POST", "/transcription_cache",
+            params={"on_conflict": "audio_hash"},
+            json_body={"audio_hash": audio_hash, "transcript": transcript, "last_used_at": _now()},
+            prefer="resolution=merge-duplicates,return=minimal"
+        )
+
+    async def evict_transcriptions(self, max_entries):
+        return await self.rpc('transcription_cache_evict', {'p_max_entries': max_entries}) or 0
+
+    async def insert_transcription_job(self, job):
+        # bkz. sql/transcription_jobs.sql
+        now = _now()
+        await self.request(
+            "POST", "/transcription_jobs",
+            json_body={**job, "created_at": now, "updated_at": now},
+            prefer="return=minimal"
+        )
+
+    async def update_transcription_job(self, job_id, columns):
+        await self.request(
+            "PATCH", "/transcription_jobs",
+            params={"job_id": f"eq.{job_id}"},
+            json_body={**columns, "updated_at": _now()},
+            prefer="return=minimal"
+        )
+
+    async def get_transcription_job(self, job_id):
+        rows = await self.request("GET", "/transcription_jobs", params={"select": "*", "job_id": f"eq.{job_id}"})
+        return rows[0] if rows else None
+
+    async def evict_transcription_jobs(self, updated_before):
+        rows = await self.request(
+            "DELETE", "/transcription_jobs",
+            params={"updated_at": f"lt.{updated_before}", "status": "in.(completed,failed)", "select": "job_id"},
+            prefer="return=representation"
+        )
+        return len(rows or [])
+
+    async def get_idempotent_response(self, key):
+        # bkz. sql/idempotency_keys.sql
+        rows = await self.request(
+            "GET", "/idempotency_keys",
+            params={"select": "*", "key": f"eq.{key}", "expires_at": f"gt.{_now()}"}
+        )
+        return rows[0] if rows else None
+
+    async def put_idempotent_response(self, entry):
+        await self.request(
+            "POST", "/idempotency_keys",
+            params={"on_conflict": "key"},
+            json_body={**entry, "created_at": _now()},
+            prefer="resolution=merge-duplicates,return=minimal"
+        )
+
+    async def evict_idempotent_responses(self):
+        rows = await self.request(
+            "DELETE", "/idempotency_keys",
+            params={"expires_at": f"lt.{_now()}", "select": "key"},
+            prefer="return=representation"
+        )
+        return len(rows or [])
+
+    async def insert_job(self, exam_name):
+        try:
+            rows = await self.request(
+                "POST", "/evaluation_jobs",
+                json_body={"exam_name": exam_name, "status": "running"},
+                prefer="return=representation"
+            )
+        except httpx.HTTPStatusError as e:
+            # evaluation_jobs_one_running_idx: sınav için çalışan bir iş zaten var
+            if e.response.status_code == 409:
+                return None
+            raise
+        return rows[0]
+
+    async def update_job(self, job_id, columns):
+        await self.request(
+            "PATCH", "/evaluation_jobs",
+            params={"id": f"eq.{job_id}"},
+            json_body={**columns, "updated_at": _now()},
+            prefer="return=minimal"
+        )
+
+    async def get_job(self, job_id):
+        rows = await self.request("GET", "/evaluation_jobs", params={"select": "*", "id": f"eq.{job_id}"})
+        return rows[0] if rows else None
+
+    async def list_jobs(self, status=None, exam_name=None):
+        params = {"select": "*", "order": "created_at.asc"}
+        if status is not None:
+            params["status"] = f"eq.{status}"
+        if exam_name is not None:
+            params["exam_name"] = f"eq.{exam_name}"
+        return await self.request("GET", "/evaluation_jobs", params=params) or []
+
+    async def insert_queued_job(self, job):
+        # bkz. sql/job_queue.sql
+        now = _now()
+        rows = await self.request(
+            "POST", "/job_queue",
+            json_body={**job, "created_at": now, "updated_at": now},
+            prefer="return=representation"
+        )
+        return rows[0]
+
+    async def update_queued_job(self, job_id, columns, statuses=None):
+        params = {"id": f"eq.{job_id}"}
+        if statuses is None:
+            await self.request("PATCH", "/job_queue", params=params, json_body={**columns, "updated_at": _now()}, prefer="return=minimal")
+            return True
+        rows = await self.request(
+            "PATCH", "/job_queue",
+            params={**params, "status": f"in.({','.join(statuses)})", "select": "id"},
+            json_body={**columns, "updated_at": _now()},
+            prefer="return=representation"
+        )
+        return bool(rows)
+
+    async def get_queued_job(self, job_id):
+        rows = await self.request("GET", "/job_queue", params={"select": "*", "id": f"eq.{job_id}"})
+        return rows[0] if rows else None
+
+    async def list_queued_jobs(self, statuses):
+        params = {
+            "select": "*",
+            "status": f"in.({','.join(statuses)})",
+            "order": "priority.asc,created_at.asc"
+        }
+        return await self.request("GET", "/job_queue", params=params) or []
+
+    async def add_usage(self, rows):
+        # bkz. sql/usage_ledger.sql
+        await self.rpc('usage_ledger_add', {'p_rows': rows})
+
+    async def list_usage(self, exam_name, student_name=None, endpoint=None, model=None):
+        params = {"select": "*", "exam_name": f"eq.{exam_name}", "order": "student_name.asc,endpoint.asc,model.asc"}
+        for column, value in (("student_name", student_name), ("endpoint", endpoint), ("model", model)):
+            if value is not None:
+                params[column] = f"eq.{value}"
+        return await self.request("GET", "/usage_ledger", params=params) or []
+
+    async def get_exam_budget(self, exam_name):
+        rows = await self.request("GET", "/exam_budgets", params={"select": "exam_name,budget_usd,action", "exam_name": f"eq.{exam_name}"})
+        return rows[0] if rows else None
+
+    async def put_exam_budget(self, budget):
+        await self.request(
+            "POST", "/exam_budgets",
+            params={"on_conflict": "exam_name"},
+            json_body={**budget, "updated_at": _now()},
+            prefer="resolution=merge-duplicates,return=minimal"
+        )
+
+    async def delete_exam_budget(self, exam_name):
+        rows = await self.request(
+            "DELETE", "/exam_budgets",
+            params={"exam_name": f"eq.{exam_name}", "select": "exam_name"},
+            prefer="return=representation"
+        )
+        return bool(rows)
+
+
+# --- Gömülü SQLite ---
+
+class SQLiteStorage(ExamStorage):
+    """
+    Tek makinede çalışan gömülü depolama. Dizi/JSON sütunları JSON metni olarak saklanır,
+    chunk eşleştirme (match_chunks karşılığı) NumPy ile kosinüs benzerliği hesaplanarak yapılır.
+    İşlemler olay döngüsü içinde senkron çalışır; yerel diskte milisaniyenin altındadır.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+        self._chunk_index: Dict[str, Any] | None = None
+
+    def _create_schema(self):
+        data_columns = ",\n".join(f"    {c} TEXT" for c in EXAM_RECORD_DATA_COLUMNS)
+        self._conn.executescript(f"""
+CREATE TABLE IF NOT EXISTS exam_records (
+    exam_name TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+{data_columns},
+    PRIMARY KEY (exam_name, student_name, question_type)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT NOT NULL,
+    file_name TEXT,
+    module_id TEXT,
+    embedding BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exam_stats (
+    exam_name TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    histogram TEXT NOT NULL DEFAULT '{{}}',
+    question_attempts TEXT NOT NULL DEFAULT '[]',
+    question_passes TEXT NOT NULL DEFAULT '[]',
+    updated_at TEXT,
+    PRIMARY KEY (exam_name, question_type)
+);
+CREATE TABLE IF NOT EXISTS transcription_cache (
+    audio_hash TEXT PRIMARY KEY,
+    transcript TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcription_cache_last_used_idx ON transcription_cache (last_used_at);
+CREATE TABLE IF NOT EXISTS transcription_jobs (
+    job_id TEXT PRIMARY KEY,
+    exam_name TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    answer_index INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    transcribed_text TEXT,
+    error TEXT,
+    callback_url TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcription_jobs_updated_idx ON transcription_jobs (updated_at);
+CREATE TABLE IF NOT EXISTS evaluation_jobs (
+    id TEXT PRIMARY KEY,
+    exam_name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    total INTEGER NOT NULL DEFAULT 0,
+    completed_students TEXT NOT NULL DEFAULT '[]',
+    skipped_students TEXT NOT NULL DEFAULT '[]',
+    failed_students TEXT NOT NULL DEFAULT '{{}}',
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_queue (
+    id TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    priority INTEGER NOT NULL DEFAULT 5,
+    payload TEXT NOT NULL DEFAULT '{{}}',
+    result TEXT,
+    error TEXT,
+    error_status INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_queue_status_idx ON job_queue (status, priority, created_at);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    content_type TEXT,
+    headers TEXT,
+    body TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_idx ON idempotency_keys (expires_at);
+CREATE TABLE IF NOT EXISTS usage_ledger (
+    exam_name TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    audio_seconds REAL NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (exam_name, student_name, endpoint, model)
+);
+CREATE TABLE IF NOT EXISTS exam_budgets (
+    exam_name TEXT PRIMARY KEY,
+    budget_usd REAL NOT NULL,
+    action TEXT NOT NULL DEFAULT 'reject',
+    updated_at TEXT NOT NULL
+);
+""")
+        self._migrate()
+
+    # --- Şema geçişleri ---
+    # Mevcut veritabanlarını güncelleyen tek seferlik adımlar. Uygulanan son adımın numarası
+    # PRAGMA user_version'da tutulur; her adım kendi işleminde bir kez çalışır. Yeni adımlar
+    # listenin sonuna eklenir, mevcutlar değiştirilmez.
+
+    def _add_idempotency_headers(self):
+        # Başlık sütunu olmadan oluşturulmuş veritabanları için
+        idempotency_columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(idempotency_keys)")}
+        if 'headers' not in idempotency_columns:
+            self._conn.execute("ALTER TABLE idempotency_keys ADD COLUMN headers TEXT")
+
+    def _one_running_evaluation_job(self):
+        # Sınav başına tek çalışan iş; indeks öncesinde varsa kopyalar kapatılır (en eskisi kalır)
+        self._conn.execute("""
+UPDATE evaluation_jobs SET status = 'failed', error = 'Aynı sınav için çalışan başka bir iş var.'
+WHERE status = 'running' AND EXISTS (
+    SELECT 1 FROM evaluation_jobs o
+    WHERE o.exam_name = evaluation_jobs.exam_name AND o.status = 'running'
+      AND (o.created_at < evaluation_jobs.created_at OR (o.created_at = evaluation_jobs.created_at AND o.id < evaluation_jobs.id))
+)""")
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS evaluation_jobs_one_running_idx ON evaluation_jobs (exam_name) WHERE status = 'running'"
+        )
+
+    MIGRATIONS = (_add_idempotency_headers, _one_running_evaluation_job)
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(self.MIGRATIONS[version:], start=version + 1):
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                migration(self)
+                self._conn.execute(f"PRAGMA user_version = {number}")
+
+    @staticmethod
+    def _check_columns(columns: List[str]):
+        unknown = [c for c in columns if c not in EXAM_RECORD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Geçersiz sütun(lar): {', '.join(unknown)}.")
+
+    @staticmethod
+    def _decode_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = {}
+        for column in row.keys():
+            value = row[column]
+            record[column] = json.loads(value) if column in EXAM_RECORD_DATA_COLUMNS and value is not None else value
+        return record
+
+    def _select_record(self, exam_name, student_name, question_type, columns: Optional[List[str]] = None) -> Dict[str, Any] | None:
+        if columns:
+            self._check_columns(columns)
+        select = ", ".join(columns) if columns else "*"
+        row = self._conn.execute(
+            f"SELECT {select} FROM exam_records WHERE exam_name = ? AND student_name = ? AND question_type = ?",
+            (exam_name, student_name, question_type)
+        ).fetchone()
+        return self._decode_record(row) if row else None
+
+    def _write_column(self, exam_name, student_name, question_type, column, value):
+        self._conn.execute(
+            f"UPDATE exam_records SET {column} = ? WHERE exam_name = ? AND student_name = ? AND question_type = ?",
+            (json.dumps(value, ensure_ascii=False), exam_name, student_name, question_type)
+        )
+
+    def _ensure_record(self, exam_name, student_name, question_type):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO exam_records (exam_name, student_name, question_type) VALUES (?, ?, ?)",
+            (exam_name, student_name, question_type)
+        )
+
+    def _select_stats(self, exam_name, question_type) -> Dict[str, Any] | None:
+        row = self._conn.execute(
+            "SELECT * FROM exam_stats WHERE exam_name = ? AND question_type = ?", (exam_name, question_type)
+        ).fetchone()
+        if row is None:
+            return None
+        stats = dict(row)
+        for column in STATS_JSON_COLUMNS:
+            stats[column] = json.loads(stats[column])
+        return stats
+
+    def _results_changed(self, exam_name, student_name, question_type, old_results, new_results):
+        """
+        sql/exam_stats.sql tetikleyicilerinin karşılığı; results yazan işlemin içinde çağrılır.
+        total_score results'tan yeniden hesaplanır, eski katkı çıkarılıp yenisi eklenir.
+        """
+        score = scoring.total_score(new_results)
+        if score is not None:
+            self._write_column(exam_name, student_name, question_type, 'total_score', score)
+        if old_results == new_results:
+            return
+        stats = self._select_stats(exam_name, question_type) or scoring.empty_stats(exam_name, question_type)
+        scoring.apply_results(stats, old_results, -1)
+        scoring.apply_results(stats, new_results, 1)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO exam_stats (exam_name, question_type, record_count, score_sum, histogram, "
+            "question_attempts, question_passes, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                exam_name, question_type, stats['record_count'], stats['score_sum'],
+                *[json.dumps(stats[c], ensure_ascii=False) for c in STATS_JSON_COLUMNS], _now()
+            )
+        )
+
+    async def get_record(self, exam_name, student_name, question_type, columns=None):
+        return self._select_record(exam_name, student_name, question_type, columns)
+
+    async def get_array_element(self, exam_name, student_name, question_type, column, indices):
+        record = self._select_record(exam_name, student_name, question_type, [column])
+        value = record.get(column) if record else None
+        for i in indices:
+            if not isinstance(value, list) or not (0 <= i < len(value)):
+                return None
+            value = value[i]
+        return value
+
+    async def list_records(self, exam_name, question_type, columns, limit, after):
+        if columns:
+            self._check_columns(columns)
+        select = ", ".join(columns) if columns else "*"
+        sql = f"SELECT {select} FROM exam_records WHERE exam_name = ? AND question_type = ?"
+        params: List[Any] = [exam_name, question_type]
+        if after is not None:
+            sql += " AND student_name > ?"
+            params.append(after)
+        sql += " ORDER BY student_name ASC LIMIT ?"
+        params.append(limit)
+        return [self._decode_record(row) for row in self._conn.execute(sql, params)]
+
+    async def upsert_record(self, record_data, return_record=True):
+        columns = list(record_data.keys())
+        self._check_columns(columns)
+        values = [
+            json.dumps(record_data[c], ensure_ascii=False) if c in EXAM_RECORD_DATA_COLUMNS else record_data[c]
+            for c in columns
+        ]
+        data_columns = [c for c in columns if c in EXAM_RECORD_DATA_COLUMNS]
+        conflict = (
+            "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in data_columns)
+            if data_columns else "DO NOTHING"
+        )
+        key = (record_data['exam_name'], record_data['student_name'], record_data['question_type'])
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if 'results' in record_data:
+                old_record = self._select_record(*key, ['results'])
+                old_results = old_record['results'] if old_record else None
+            self._conn.execute(
+                f"INSERT INTO exam_records ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT (exam_name, student_name, question_type) {conflict}",
+                values
+            )
+            if 'results' in record_data:
+                self._results_changed(*key, old_results, record_data['results'])
+        if not return_record:
+            return None
+        return self._select_record(record_data['exam_name'], record_data['student_name'], record_data['question_type'])
+
+    async def delete_record(self, exam_name, student_name, question_type):
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            record = self._select_record(exam_name, student_name, question_type, ['results'])
+            if record is None:
+                return False
+            self._conn.execute(
+                "DELETE FROM exam_records WHERE exam_name = ? AND student_name = ? AND question_type = ?",
+                (exam_name, student_name, question_type)
+            )
+            self._results_changed(exam_name, student_name, question_type, record['results'], None)
+            return True
+
+    async def set_array_element(self, exam_name, student_name, question_type, column, index, value,
+                                sub_index=None, pad_value=None, require_array=False, create_if_missing=False):
+        # sql/exam_record_functions.sql içindeki exam_record_set_element ile aynı davranış
+        if column not in EXAM_RECORD_ARRAY_COLUMNS:
+            raise ValueError(f"exam_record_set_element: desteklenmeyen sütun {column}")
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if create_if_missing:
+                self._ensure_record(exam_name, student_name, question_type)
+            record = self._select_record(exam_name, student_name, question_type, [column])
+            if record is None:
+                return None
+            array = record[column]
+            previous = copy.deepcopy(array)
+            if not isinstance(array, list):
+                if require_array:
+                    return None
+                array = []
+
+            if sub_index is not None:
+                if not (0 <= index < len(array)) or not isinstance(array[index], list) or not (0 <= sub_index < len(array[index])):
+                    return None
+                array[index][sub_index] = value
+            else:
+                if index < 0 and -index > len(array):
+                    return None
+                while len(array) <= index:
+                    array.append(pad_value)
+                array[index] = value
+
+            self._write_column(exam_name, student_name, question_type, column, array)
+            if column == 'results':
+                self._results_changed(exam_name, student_name, question_type, previous, array)
+            return array
+
+    async def set_array_elements(self, exam_name, student_name, question_type, index, values):
+        # sql/exam_record_functions.sql içindeki exam_record_set_elements ile aynı davranış
+        unknown = [c for c in values if c not in EXAM_RECORD_ARRAY_COLUMNS]
+        if unknown:
+            raise ValueError(f"exam_record_set_elements: desteklenmeyen sütun(lar) {', '.join(unknown)}")
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            record = self._select_record(exam_name, student_name, question_type, list(values))
+            if record is None:
+                return None
+            arrays = {}
+            for column in values:
+                array = record[column] if isinstance(record[column], list) else []
+                if index < 0 and -index > len(array):
+                    return None  # henüz hiçbir sütun yazılmadı
+                arrays[column] = array
+
+            for column, value in values.items():
+                array = arrays[column]
+                previous = copy.deepcopy(record[column])
+                while len(array) <= index:
+                    array.append(None)
+                array[index] = value
+                self._write_column(exam_name, student_name, question_type, column, array)
+                if column == 'results':
+                    self._results_changed(exam_name, student_name, question_type, previous, array)
+            return arrays
+
+    async def delete_question(self, exam_name, student_name, question_type, index):
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            columns = ['questions', 'correct_answers', 'answers', 'results', 'choices']
+            record = self._select_record(exam_name, student_name, question_type, columns)
+            if record is None:
+                return None
+            questions = record['questions']
+            if not isinstance(questions, list) or not questions:
+                return {"error": "empty"}
+            if not (0 <= index < len(questions)):
+                return {"error": "index", "count": len(questions)}
+            previous_results = copy.deepcopy(record['results'])
+            for column in columns:
+                if isinstance(record[column], list) and index < len(record[column]):
+                    record[column].pop(index)
+                    self._write_column(exam_name, student_name, question_type, column, record[column])
+            if record['results'] != previous_results:
+                self._results_changed(exam_name, student_name, question_type, previous_results, record['results'])
+            return {"questions": record['questions']}
+
+    async def apply_answer_edits(self, edits):
+        out = []
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for edit in edits:
+                key = (edit['exam_name'], edit['student_name'], edit['question_type'])
+                self._ensure_record(*key)
+                answers = self._select_record(*key, ['answers'])['answers']
+                if not isinstance(answers, list):
+                    answers = []
+                for index_text, value in edit['answers'].items():
+                    index = int(index_text)
+                    while len(answers) <= index:
+                        answers.append(None)
+                    answers[index] = value
+                self._write_column(*key, 'answers', answers)
+                out.append({"exam_name": key[0], "student_name": key[1], "question_type": key[2], "answers": answers})
+        return out
+
+    def insert_chunks(self, chunks: List[Dict[str, Any]]):
+        """Yerel bilgi kaynağına metin parçaları ekler: content, file_name, module_id, embedding."""
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO chunks (content, file_name, module_id, embedding) VALUES (?, ?, ?, ?)",
+                [
+                    (c['content'], c.get('file_name'), c.get('module_id'), np.asarray(c['embedding'], dtype=np.float32).tobytes())
+                    for c in chunks
+                ]
+            )
+        self._chunk_index = None
+
+    def _load_chunk_index(self) -> Dict[str, Any]:
+        if self._chunk_index is None:
+            rows = self._conn.execute("SELECT id, content, file_name, module_id, embedding FROM chunks ORDER BY id").fetchall()
+            if rows:
+                matrix = np.vstack([np.frombuffer(r['embedding'], dtype=np.float32) for r in rows])
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix = matrix / np.where(norms == 0, 1, norms)
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            self._chunk_index = {
+                "matrix": matrix,
+                "rows": [{"id": r['id'], "content": r['content'], "file_name": r['file_name'], "module_id": r['module_id']} for r in rows],
+                "file_names": np.array([(r['file_name'] or "").upper() for r in rows]),
+                "module_ids": np.array([(r['module_id'] or "").upper() for r in rows])
+            }
+        return self._chunk_index
+
+    async def match_chunks(self, query_embedding, match_threshold, match_count, match_module_ids=None, match_file_names=None):
+        index = self._load_chunk_index()
+        if not index["rows"]:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm:
+            query = query / query_norm
+        similarities = index["matrix"] @ query
+
+        mask = similarities > match_threshold
+        if match_module_ids:
+            mask &= np.isin(index["module_ids"], [m.upper() for m in match_module_ids])
+        if match_file_names:
+            mask &= np.isin(index["file_names"], [f.upper() for f in match_file_names])
+
+        # Supabase tarafındaki match_chunks gibi: eşiği geçen tüm parçalar, benzerliğe göre sıralı
+        matched = np.nonzero(mask)[0]
+        ordered = matched[np.argsort(-similarities[matched], kind="stable")]
+        return [{**index["rows"][i], "similarity": float(similarities[i])} for i in ordered]
+
+    async def get_exam_stats(self, exam_name, question_type):
+        return self._select_stats(exam_name, question_type)
+
+    async def get_transcription(self, audio_hash):
+        row = self._conn.execute(
+            "UPDATE transcription_cache SET last_used_at = ? WHERE audio_hash = ? RETURNING transcript",
+            (_now(), audio_hash)
+        ).fetchone()
+        return row["transcript"] if row else None
+
+    async def put_transcription(self, audio_hash, transcript):
+        now = _now()
+        self._conn.execute(
+            "INSERT INTO transcription_cache (audio_hash, transcript, created_at, last_used_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (audio_hash) DO UPDATE SET transcript = excluded.transcript, last_used_at = excluded.last_used_at",
+            (audio_hash, transcript, now, now)
+        )
+
+    async def evict_transcriptions(self, max_entries):
+        cursor = self._conn.execute(
+            "DELETE FROM transcription_cache WHERE audio_hash IN "
+            "(SELECT audio_hash FROM transcription_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+        return cursor.rowcount
+
+    async def insert_transcription_job(self, job):
+        now = _now()
+        columns = {**job, "created_at": now, "updated_at": now}
+        self._conn.execute(
+            f"INSERT INTO transcription_jobs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            list(columns.values())
+        )
+
+    async def update_transcription_job(self, job_id, columns):
+        columns = {**columns, "updated_at": _now()}
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        self._conn.execute(f"UPDATE transcription_jobs SET {assignments} WHERE job_id = ?", (*columns.values(), job_id))
+
+    async def get_transcription_job(self, job_id):
+        row = self._conn.execute("SELECT * FROM transcription_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    async def evict_transcription_jobs(self, updated_before):
+        return self._conn.execute("DELETE FROM transcription_jobs WHERE updated_at < ? AND status IN ('completed', 'failed')", (updated_before,)).rowcount
+
+    async def get_idempotent_response(self, key):
+        row = self._conn.execute(
+            "SELECT * FROM idempotency_keys WHERE key = ? AND expires_at > ?", (key, _now())
+        ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['headers'] = json.loads(entry['headers']) if entry['headers'] is not None else None
+        return entry
+
+    async def put_idempotent_response(self, entry):
+        columns = {**entry, "created_at": _now()}
+        if columns.get('headers') is not None:
+            columns['headers'] = json.dumps(columns['headers'], ensure_ascii=False)
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO idempotency_keys ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            list(columns.values())
+        )
+
+    async def evict_idempotent_responses(self):
+        return self._conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (_now(),)).rowcount
+
+    @staticmethod
+    def _decode_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for column in JOB_JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] is not None else None
+        return job
+
+    async def insert_job(self, exam_name):
+        job_id = str(uuid.uuid4())
+        now = _now()
+        try:
+            self._conn.execute(
+                "INSERT INTO evaluation_jobs (id, exam_name, status, created_at, updated_at) VALUES (?, ?, 'running', ?, ?)",
+                (job_id, exam_name, now, now)
+            )
+        except sqlite3.IntegrityError:
+            return None
+        return await self.get_job(job_id)
+
+    async def update_job(self, job_id, columns):
+        columns = {**columns, "updated_at": _now()}
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        values = [json.dumps(v, ensure_ascii=False) if c in JOB_JSON_COLUMNS else v for c, v in columns.items()]
+        self._conn.execute(f"UPDATE evaluation_jobs SET {assignments} WHERE id = ?", (*values, job_id))
+
+    async def get_job(self, job_id):
+        row = self._conn.execute("SELECT * FROM evaluation_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode_job(row) if row else None
+
+    async def list_jobs(self, status=None, exam_name=None):
+        sql = "SELECT * FROM evaluation_jobs WHERE 1 = 1"
+        params = []
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        if exam_name is not None:
+            sql += " AND exam_name = ?"
+            params.append(exam_name)
+        sql += " ORDER BY created_at ASC"
+        return [self._decode_job(row) for row in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def _decode_queued_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for column in QUEUED_JOB_JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] is not None else None
+        return job
+
+    async def insert_queued_job(self, job):
+        now = _now()
+        columns = {**job, "created_at": now, "updated_at": now}
+        values = [json.dumps(v, ensure_ascii=False) if c in QUEUED_JOB_JSON_COLUMNS else v for c, v in columns.items()]
+        self._conn.execute(
+            f"INSERT INTO job_queue ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            values
+        )
+        return await self.get_queued_job(job['id'])
+
+    async def update_queued_job(self, job_id, columns, statuses=None):
+        columns = {**columns, "updated_at": _now()}
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        values = [json.dumps(v, ensure_ascii=False) if c in QUEUED_JOB_JSON_COLUMNS and v is not None else v for c, v in columns.items()]
+        sql = f"UPDATE job_queue SET {assignments} WHERE id = ?"
+        params = [*values, job_id]
+        if statuses is not None:
+            sql += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        return self._conn.execute(sql, params).rowcount > 0
+
+    async def get_queued_job(self, job_id):
+        row = self._conn.execute("SELECT * FROM job_queue WHERE id = ?", (job_id,)).fetchone()
+        return self._decode_queued_job(row) if row else None
+
+    async def list_queued_jobs(self, statuses):
+        rows = self._conn.execute(
+            f"SELECT * FROM job_queue WHERE status IN ({', '.join('?' for _ in statuses)}) ORDER BY priority ASC, created_at ASC",
+            statuses
+        )
+        return [self._decode_queued_job(row) for row in rows]
+
+    async def add_usage(self, rows):
+        columns = USAGE_KEY_COLUMNS + USAGE_COUNTER_COLUMNS
+        increments = ", ".join(f"{c} = {c} + excluded.{c}" for c in USAGE_COUNTER_COLUMNS)
+        now = _now()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                f"INSERT INTO usage_ledger ({', '.join(columns)}, updated_at) VALUES ({', '.join('?' for _ in columns)}, ?) "
+                f"ON CONFLICT ({', '.join(USAGE_KEY_COLUMNS)}) DO UPDATE SET {increments}, updated_at = excluded.updated_at",
+                [[row[c] for c in columns] + [now] for row in rows]
+            )
+
+    async def list_usage(self, exam_name, student_name=None, endpoint=None, model=None):
+        sql = "SELECT * FROM usage_ledger WHERE exam_name = ?"
+        params = [exam_name]
+        for column, value in (("student_name", student_name), ("endpoint", endpoint), ("model", model)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        sql += " ORDER BY student_name, endpoint, model"
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    async def get_exam_budget(self, exam_name):
+        row = self._conn.execute("SELECT exam_name, budget_usd, action FROM exam_budgets WHERE exam_name = ?", (exam_name,)).fetchone()
+        return dict(row) if row else None
+
+    async def put_exam_budget(self, budget):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO exam_budgets (exam_name, budget_usd, action, updated_at) VALUES (?, ?, ?, ?)",
+            (budget['exam_name'], budget['budget_usd'], budget['action'], _now())
+        )
+
+    async def delete_exam_budget(self, exam_name):
+        return self._conn.execute("DELETE FROM exam_budgets WHERE exam_name = ?", (exam_name,)).rowcount > 0
+
+    async def ping(self):
+        self._conn.execute("SELECT 1").fetchone()
+
+    async def close(self):
+        self._conn.close()
+
+
+# --- Arka Uç Seçimi ---
+
+_storage: ExamStorage | None = None
+
+
+def get_storage() -> ExamStorage:
+    """STORAGE_BACKEND'e göre depolama arka ucunu ilk kullanımda oluşturur."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            _storage = SQLiteStorage(SQLITE_PATH)
+        elif STORAGE_BACKEND == "supabase":
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_ANON_KEY")
+            if not supabase_url: raise ValueError("SUPABASE_URL ortam değişkeni ayarlanmamış.")
+            if not supabase_key: raise ValueError("SUPABASE_KEY (SUPABASE_ANON_KEY) ortam değişkeni ayarlanmamış.")
+            _storage = SupabaseStorage(supabase_url, supabase_key)
+        else:
+            raise ValueError(f"Geçersiz STORAGE_BACKEND: '{STORAGE_BACKEND}'. 'supabase' veya 'sqlite' olmalıdır.")
+    return _storage
+
+
+def set_storage(storage: ExamStorage | None):
+    """Depolama arka ucunu elle ayarlar (yerel çalıştırma ve benchmark'lar için)."""
+    global _storage
+    _storage = storage
+
+
+async def close_storage():
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Modüller yapılandırmayı içe aktarılırken okur; testler ağsız, gömülü SQLite ile çalışır
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CASTRUMAI_API_KEY", "test")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
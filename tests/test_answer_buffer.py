@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import examai
+import storage
+
+KEY = ("exam", "student", "Open Ended")
+
+
+@pytest.fixture
+def store():
+    store = storage.SQLiteStorage(":memory:")
+    storage.set_storage(store)
+    yield store
+    storage.set_storage(None)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def answers(store, key=KEY):
+    record = run(store.get_record(*key, ["answers"]))
+    return record["answers"] if record else None
+
+
+def test_flush_writes_pending_edits(store):
+    buffer = examai.AnswerWriteBuffer(60, 200, 100, 3)
+    buffer.record(KEY, 0, "a")
+    buffer.record(KEY, 2, "c")
+    run(buffer.flush())
+    assert answers(store) == ["a", None, "c"]
+    assert not buffer.has_pending(KEY)
+    assert buffer.known(KEY) == ["a", None, "c"]
+
+
+def test_stop_waits_for_in_flight_write(store):
+    async def scenario():
+        gate = asyncio.Event()
+        apply = store.apply_answer_edits
+
+        async def slow_apply(edits):
+            await gate.wait()
+            return await apply(edits)
+
+        store.apply_answer_edits = slow_apply
+        buffer = examai.AnswerWriteBuffer(0.01, 200, 100, 3)
+        buffer.start()
+        buffer.record(KEY, 0, "a")
+        while not buffer._inflight:
+            await asyncio.sleep(0.005)
+        stopping = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0.02)
+        gate.set()
+        await stopping
+
+    run(scenario())
+    assert answers(store) == ["a"]
+
+
+def test_cancelled_write_is_requeued(store):
+    async def scenario():
+        async def hanging_apply(edits):
+            await asyncio.Event().wait()
+
+        store.apply_answer_edits = hanging_apply
+        buffer = examai.AnswerWriteBuffer(60, 200, 100, 3)
+        buffer.record(KEY, 1, "b")
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.01)
+        flushing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flushing
+        return buffer
+
+    buffer = run(scenario())
+    assert buffer.pending_answer(KEY, 1) == (True, "b")
+
+
+def test_failing_record_is_isolated_and_dropped(store):
+    bad = ("exam", "bad", "Open Ended")
+    apply = store.apply_answer_edits
+
+    async def poisoned_apply(edits):
+        if any(edit["student_name"] == "bad" for edit in edits):
+            raise RuntimeError("boom")
+        return await apply(edits)
+
+    store.apply_answer_edits = poisoned_apply
+    buffer = examai.AnswerWriteBuffer(60, 200, 100, 2)
+    buffer.record(bad, 0, "x")
+    buffer.record(KEY, 0, "ok")
+    run(buffer.flush())
+    assert answers(store) == ["ok"]
+    assert buffer.pending_answer(bad, 0) == (True, "x")
+
+    run(buffer.flush())
+    assert not buffer.has_pending(bad)  # max_attempts'a ulaşıldı, bırakıldı
+
+
+def test_outage_does_not_count_attempts(store):
+    async def failing(*args, **kwargs):
+        raise RuntimeError("down")
+
+    store.apply_answer_edits = failing
+    store.ping = failing
+    buffer = examai.AnswerWriteBuffer(60, 200, 100, 2)
+    buffer.record(KEY, 0, "a")
+    for _ in range(5):
+        run(buffer.flush())
+    assert buffer.pending_answer(KEY, 0) == (True, "a")
+
+
+def test_flush_and_discard_writes_then_forgets(store):
+    buffer = examai.AnswerWriteBuffer(60, 200, 100, 3)
+    buffer.record(KEY, 0, "a")
+    run(buffer.flush_and_discard(KEY))
+    assert answers(store) == ["a"]
+    assert not buffer.has_pending(KEY)
+    assert buffer.known(KEY) is None
+
+
+@pytest.mark.parametrize("index", [-1, examai.ANSWER_MAX_INDEX + 1])
+def test_update_answer_rejects_invalid_index(store, index):
+    with pytest.raises(ValueError):
+        run(examai.update_answer(*KEY, index, "a"))
+    assert not examai.answer_buffer.has_pending(KEY)
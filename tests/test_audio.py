@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import audio
+
+
+@pytest.mark.parametrize("sample_rate", [48000, 44100, 44056, 22051])
+def test_resample_keeps_tone_and_length(sample_rate):
+    # 44056 = 8 * 5507 ve 22051 asaldır: hız oranı 2, 3, 5, 7 dışında asal çarpan içerir
+    seconds = 1.5
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = np.sin(2 * np.pi * 1000 * t).astype(np.float32)
+
+    resampled, rate = audio.resample(samples, sample_rate, 16000)
+
+    assert rate == 16000
+    assert len(resampled) == round(len(samples) * 16000 / sample_rate)
+    spectrum = np.abs(np.fft.rfft(resampled))
+    peak_hz = np.argmax(spectrum) * rate / len(resampled)
+    assert abs(peak_hz - 1000) < 2
+
+
+def test_resample_prime_rate_returns_quickly():
+    resampled, rate = audio.resample(np.zeros(44056, dtype=np.float32), 44056, 16000)
+    assert rate == 16000 and len(resampled) == 16000
+
+
+def test_next_fast_length_is_smooth():
+    for n in (1, 97, 5507, 44057, 1_000_003):
+        length = audio._next_fast_length(n)
+        assert length >= n
+        for factor in (2, 3, 5, 7):
+            while length % factor == 0:
+                length //= factor
+        assert length == 1
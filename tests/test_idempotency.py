@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+import idempotency
+import storage
+
+
+@pytest.fixture
+def store():
+    store = storage.SQLiteStorage(":memory:")
+    storage.set_storage(store)
+    yield store
+    storage.set_storage(None)
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.gate = None
+    app.state.fail_with = None
+
+    @app.post("/items")
+    async def create_item(item: dict):
+        app.state.calls += 1
+        if app.state.gate is not None:
+            await app.state.gate.wait()
+        if app.state.fail_with is not None:
+            raise HTTPException(status_code=app.state.fail_with, detail="geçici")
+        return {"call": app.state.calls, **item}
+
+    return idempotency.IdempotencyMiddleware(app), app.state
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _post(asgi, body, key="k1", path="/items"):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url="http://test") as client:
+        return await client.post(path, json=body, headers={"Idempotency-Key": key})
+
+
+def test_retry_replays_stored_response(store, app):
+    asgi, state = app
+
+    async def scenario():
+        return await _post(asgi, {"name": "a"}), await _post(asgi, {"name": "a"})
+
+    first, second = run(scenario())
+    assert state.calls == 1
+    assert second.status_code == first.status_code == 200
+    assert second.json() == first.json() == {"call": 1, "name": "a"}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.headers["content-type"] == "application/json"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_key_reused_with_different_body_is_rejected(store, app):
+    asgi, state = app
+
+    async def scenario():
+        await _post(asgi, {"name": "a"})
+        return await _post(asgi, {"name": "b"})
+
+    response = run(scenario())
+    assert response.status_code == 422
+    assert state.calls == 1
+
+
+def test_concurrent_duplicates_run_once(store, app):
+    asgi, state = app
+
+    async def scenario():
+        state.gate = asyncio.Event()
+        first = asyncio.create_task(_post(asgi, {"name": "a"}))
+        while state.calls == 0:
+            await asyncio.sleep(0.005)
+        duplicate = asyncio.create_task(_post(asgi, {"name": "a"}))
+        mismatch = asyncio.create_task(_post(asgi, {"name": "b"}))
+        await asyncio.sleep(0.02)
+        state.gate.set()
+        return await first, await duplicate, await mismatch
+
+    first, duplicate, mismatch = run(scenario())
+    assert state.calls == 1
+    assert duplicate.json() == first.json()
+    assert mismatch.status_code == 422
+
+
+@pytest.mark.parametrize("status_code", [402, 409, 429, 503])
+def test_transient_errors_are_not_stored(store, app, status_code):
+    asgi, state = app
+
+    async def scenario():
+        state.fail_with = status_code
+        failed = await _post(asgi, {"name": "a"})
+        state.fail_with = None
+        return failed, await _post(asgi, {"name": "a"})
+
+    failed, retried = run(scenario())
+    assert failed.status_code == status_code
+    assert retried.status_code == 200
+    assert state.calls == 2
+
+
+def test_deterministic_client_errors_are_stored(store, app):
+    asgi, state = app
+
+    async def scenario():
+        state.fail_with = 404
+        failed = await _post(asgi, {"name": "a"})
+        state.fail_with = None
+        return failed, await _post(asgi, {"name": "a"})
+
+    failed, retried = run(scenario())
+    assert retried.status_code == failed.status_code == 404
+    assert retried.headers["idempotent-replayed"] == "true"
+    assert state.calls == 1
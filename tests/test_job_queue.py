@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+import job_queue
+import storage
+
+
+class EchoRequest(BaseModel):
+    value: str
+
+
+@pytest.fixture
+def store():
+    store = storage.SQLiteStorage(":memory:")
+    storage.set_storage(store)
+    yield store
+    storage.set_storage(None)
+
+
+@pytest.fixture
+def gate():
+    """test/echo işlemi gate açılana kadar bekler."""
+    gate = {"event": None, "calls": 0}
+
+    async def echo(request: EchoRequest):
+        gate["calls"] += 1
+        await gate["event"].wait()
+        return {"value": request.value}
+
+    job_queue.register("test/echo", EchoRequest, echo)
+    yield gate
+    job_queue._operations.pop("test/echo", None)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _started(job_id: str):
+    while job_id not in job_queue._running:
+        await asyncio.sleep(0.005)
+
+
+async def _finished(job_id: str):
+    while (await job_queue.get_job(job_id))["status"] not in job_queue.FINISHED_STATUSES:
+        await asyncio.sleep(0.005)
+
+
+def test_conditional_update_only_matches_given_statuses(store):
+    async def scenario():
+        await store.insert_queued_job({"id": "j", "operation": "test/echo", "status": "queued", "priority": 5, "payload": {}, "attempts": 0})
+        assert not await store.update_queued_job("j", {"status": "completed"}, statuses=["running"])
+        assert await store.update_queued_job("j", {"status": "running"}, statuses=["queued"])
+        return await store.get_queued_job("j")
+
+    assert run(scenario())["status"] == "running"
+
+
+def test_cancel_running_job_is_not_overwritten_by_result(store, gate):
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        job_queue.start()
+        try:
+            job = await job_queue.submit("test/echo", {"value": "x"})
+            await _started(job['id'])
+            cancelled = await job_queue.cancel(job['id'])
+            gate["event"].set()
+            await asyncio.sleep(0.02)
+            return cancelled, await job_queue.get_job(job['id'])
+        finally:
+            await job_queue.shutdown()
+
+    cancelled, job = run(scenario())
+    assert cancelled['status'] == "cancelled"
+    assert job['status'] == "cancelled"
+    assert job['result'] is None
+    assert not job_queue._cancel_requested
+
+
+def test_result_written_before_cancel_wins(store, gate):
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        gate["event"].set()
+        job_queue.start()
+        try:
+            job = await job_queue.submit("test/echo", {"value": "x"})
+            await _finished(job['id'])
+            with pytest.raises(HTTPException) as error:
+                await job_queue.cancel(job['id'])
+            return error.value, await job_queue.get_job(job['id'])
+        finally:
+            await job_queue.shutdown()
+
+    error, job = run(scenario())
+    assert error.status_code == 409
+    assert job['status'] == "completed"
+    assert job['result'] == {"value": "x"}
+
+
+def test_cancelled_job_is_not_claimed_by_stale_worker(store, gate):
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        gate["event"].set()
+        job_queue.start()
+        try:
+            job = await job_queue.submit("test/echo", {"value": "x"})
+            # Worker işi 'queued' olarak okuduktan sonra iptal edilmiş gibi
+            await store.update_queued_job(job['id'], {"status": "cancelled"})
+            await job_queue._run(job)
+            return await job_queue.get_job(job['id'])
+        finally:
+            await job_queue.shutdown()
+
+    job = run(scenario())
+    assert job['status'] == "cancelled"
+    assert job['attempts'] == 0
+    assert gate["calls"] == 0
+
+
+def test_result_does_not_overwrite_concurrent_cancel(store, gate):
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        job_queue.start()
+        try:
+            job = await job_queue.submit("test/echo", {"value": "x"})
+            await _started(job['id'])
+            # İptal kaydı yazıldı ama görev iptal sinyalini almadan bitti
+            await store.update_queued_job(job['id'], {"status": "cancelled"}, statuses=["queued", "running"])
+            gate["event"].set()
+            while job['id'] in job_queue._running:
+                await asyncio.sleep(0.005)
+            await asyncio.sleep(0.01)
+            return await job_queue.get_job(job['id'])
+        finally:
+            await job_queue.shutdown()
+
+    job = run(scenario())
+    assert job['status'] == "cancelled"
+    assert job['result'] is None
+
+
+def test_resume_requeues_interrupted_jobs(store, gate):
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        gate["event"].set()
+        await store.insert_queued_job({"id": "r", "operation": "test/echo", "status": "running", "priority": 5, "payload": {"value": "x"}, "attempts": 1})
+        job_queue.start()
+        try:
+            await job_queue.resume()
+            await _finished("r")
+            return await job_queue.get_job("r")
+        finally:
+            await job_queue.shutdown()
+
+    job = run(scenario())
+    assert job['status'] == "completed"
+    assert job['attempts'] == 2
+
+
+def test_resume_fails_jobs_that_do_not_fit_the_queue(store, gate, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_QUEUE_MAX_PENDING", 1)
+    monkeypatch.setattr(job_queue, "JOB_QUEUE_WORKERS", 0)
+
+    async def scenario():
+        for job_id in ("a", "b"):
+            await store.insert_queued_job({"id": job_id, "operation": "test/echo", "status": "queued", "priority": 5, "payload": {"value": job_id}, "attempts": 0})
+        job_queue.start()
+        try:
+            await job_queue.resume()
+            return await job_queue.get_job("a"), await job_queue.get_job("b")
+        finally:
+            await job_queue.shutdown()
+
+    queued, overflow = run(scenario())
+    assert queued['status'] == "queued"
+    assert overflow['status'] == "failed"
+    assert overflow['error_status'] == 503
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import ledger
+import storage
+
+EXAM = "exam"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = storage.SQLiteStorage(":memory:")
+    storage.set_storage(store)
+    monkeypatch.setattr(ledger, "_pending", {})
+    monkeypatch.setattr(ledger, "_exam_costs", {})
+    monkeypatch.setattr(ledger, "_budgets", {})
+    yield store
+    storage.set_storage(None)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _spend(student_name: str, completion_tokens: int):
+    """gpt-4.1-mini ile completion_tokens kadar harcayan bir istek."""
+    async with ledger.attributed(EXAM, student_name, "evaluate"):
+        model = ledger.chat_model("gpt-4.1-mini")
+        ledger.record(model, completion_tokens=completion_tokens)
+        return model
+
+
+def test_usage_is_attributed_to_request(store):
+    async def scenario():
+        await _spend("ali", 1_000_000)
+        ledger.record("gpt-4.1-mini", prompt_tokens=10)
+        return await ledger.usage_report(EXAM)
+
+    report = run(scenario())
+    assert len(report["rows"]) == 1
+    assert report["rows"][0]["student_name"] == "ali"
+    assert report["totals"]["cost_usd"] == pytest.approx(1.60)
+    assert report["budget"] is None
+
+
+def test_reject_budget_refuses_new_work_once_spent(store):
+    async def scenario():
+        await ledger.put_budget(EXAM, 2.0, "reject")
+        await _spend("ali", 1_000_000)
+        await _spend("ali", 1_000_000)
+        with pytest.raises(HTTPException) as error:
+            await _spend("veli", 1)
+        return error.value, await ledger.usage_report(EXAM)
+
+    error, report = run(scenario())
+    assert error.status_code == 402
+    assert report["totals"]["requests"] == 2
+    assert report["budget"]["remaining_usd"] == 0.0
+
+
+def test_downgrade_budget_switches_to_cheaper_model(store):
+    async def scenario():
+        await ledger.put_budget(EXAM, 1.0, "downgrade")
+        before = await _spend("ali", 1_000_000)
+        after = await _spend("ali", 1_000_000)
+        return before, after, ledger.chat_model("gpt-4.1-mini")
+
+    before, after, outside = run(scenario())
+    assert before == "gpt-4.1-mini"
+    assert after == "gpt-4.1-nano"
+    assert outside == "gpt-4.1-mini"
+
+
+def test_spend_is_read_from_storage_after_flush(store):
+    async def scenario():
+        await _spend("ali", 1_000_000)
+        await ledger.flush()
+        ledger._exam_costs.clear()
+        await ledger.put_budget(EXAM, 1.0, "reject")
+        with pytest.raises(HTTPException) as error:
+            await _spend("ali", 1)
+        return error.value
+
+    assert run(scenario()).status_code == 402
+
+
+def test_deleting_budget_lifts_rejection(store):
+    async def scenario():
+        await ledger.put_budget(EXAM, 0.5, "reject")
+        await _spend("ali", 1_000_000)
+        await ledger.delete_budget(EXAM)
+        return await _spend("ali", 1)
+
+    assert run(scenario()) == "gpt-4.1-mini"
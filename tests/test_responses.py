@@ -0,0 +1,65 @@
+import zlib
+import asyncio
+
+import pytest
+
+import responses
+
+LINES = [b'{"student_name": "ali"}\n', b'{"student_name": "veli"}\n', b'{"student_name": "ayse"}\n']
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _app(chunks, content_type="application/x-ndjson"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type.encode())]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def _call(app, accept_encoding="gzip", **options):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    run(responses.CompressionMiddleware(app, **options)(scope, None, send))
+    headers = {k.decode(): v.decode() for k, v in messages[0]["headers"]}
+    return headers, [m["body"] for m in messages[1:]]
+
+
+def test_streamed_gzip_chunks_decompress_as_they_arrive():
+    headers, bodies = _call(_app(LINES))
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert [decompressor.decompress(body) for body in bodies] == LINES
+    assert decompressor.eof
+
+
+@pytest.mark.skipif(responses.brotli is None, reason="brotli kurulu değil")
+def test_streamed_brotli_chunks_decompress_as_they_arrive():
+    headers, bodies = _call(_app(LINES), accept_encoding="br")
+    assert headers["content-encoding"] == "br"
+    decompressor = responses.brotli.Decompressor()
+    assert [decompressor.process(body) for body in bodies] == LINES
+    assert decompressor.is_finished()
+
+
+def test_small_and_excluded_responses_are_sent_as_is():
+    small_headers, small = _call(_app([b"{}"]))
+    parquet_headers, parquet = _call(_app([b"x" * 4096], "application/vnd.apache.parquet"), minimum_size=10)
+    assert "content-encoding" not in small_headers and small == [b"{}"]
+    assert "content-encoding" not in parquet_headers and parquet == [b"x" * 4096]
+
+
+def test_large_response_sets_compressed_length():
+    body = b"a" * 4096
+    headers, bodies = _call(_app([body]), accept_encoding="gzip, br;q=0")
+    assert headers["content-length"] == str(len(bodies[0]))
+    assert headers["vary"] == "Accept-Encoding"
+    assert zlib.decompress(bodies[0], 16 + zlib.MAX_WBITS) == body
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import storage
+
+KEY = ("exam", "student", "Open Ended")
+
+# sql/exam_record_functions.sql ile SQLiteStorage'ın paylaştığı sözleşme: negatif indeks
+# sondan sayılır, dizinin dışındaysa hiçbir şey yazılmadan None döner.
+SET_ELEMENT_CASES = [
+    # (mevcut dizi, index, beklenen dizi veya None)
+    (["a", "b", "c"], 1, ["a", "x", "c"]),
+    (["a", "b", "c"], 4, ["a", "b", "c", None, "x"]),
+    (["a", "b", "c"], -1, ["a", "b", "x"]),
+    (["a", "b", "c"], -3, ["x", "b", "c"]),
+    (["a", "b", "c"], -4, None),
+    ([], -1, None),
+    (None, 0, ["x"]),
+    (None, -1, None),
+]
+
+
+@pytest.fixture
+def store():
+    return storage.SQLiteStorage(":memory:")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _questions(store):
+    record = await store.get_record(*KEY, ["questions", "correct_answers"])
+    return record["questions"], record["correct_answers"]
+
+
+@pytest.mark.parametrize("existing,index,expected", SET_ELEMENT_CASES)
+def test_set_array_element_index_contract(store, existing, index, expected):
+    async def scenario():
+        await store.upsert_record({"exam_name": KEY[0], "student_name": KEY[1], "question_type": KEY[2], "questions": existing})
+        result = await store.set_array_element(*KEY, "questions", index, "x")
+        return result, (await _questions(store))[0]
+
+    result, stored = run(scenario())
+    assert result == expected
+    assert stored == (existing if expected is None else expected)
+
+
+@pytest.mark.parametrize("existing,index,expected", SET_ELEMENT_CASES)
+def test_set_array_elements_index_contract(store, existing, index, expected):
+    async def scenario():
+        await store.upsert_record({
+            "exam_name": KEY[0], "student_name": KEY[1], "question_type": KEY[2],
+            "questions": existing, "correct_answers": existing
+        })
+        result = await store.set_array_elements(*KEY, index, {"questions": "x", "correct_answers": "x"})
+        return result, await _questions(store)
+
+    result, stored = run(scenario())
+    if expected is None:
+        assert result is None
+        assert stored == (existing, existing)
+    else:
+        assert result == {"questions": expected, "correct_answers": expected}
+        assert stored == (expected, expected)
+
+
+def test_set_array_elements_writes_nothing_when_one_column_is_too_short(store):
+    async def scenario():
+        await store.upsert_record({
+            "exam_name": KEY[0], "student_name": KEY[1], "question_type": KEY[2],
+            "questions": ["a", "b"], "correct_answers": ["a"]
+        })
+        result = await store.set_array_elements(*KEY, -2, {"questions": "x", "correct_answers": "x"})
+        return result, await _questions(store)
+
+    result, stored = run(scenario())
+    assert result is None
+    assert stored == (["a", "b"], ["a"])
+
+
+def test_set_array_elements_missing_record(store):
+    assert run(store.set_array_elements(*KEY, 0, {"questions": "x"})) is None
+
+
+def test_migrations_upgrade_an_existing_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    store = storage.SQLiteStorage(path)
+    store._conn.executescript("""
+DROP INDEX evaluation_jobs_one_running_idx;
+DROP TABLE idempotency_keys;
+CREATE TABLE idempotency_keys (
+    key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, status_code INTEGER NOT NULL, content_type TEXT,
+    body TEXT NOT NULL, created_at TEXT NOT NULL, expires_at TEXT NOT NULL
+);
+INSERT INTO evaluation_jobs (id, exam_name, status, created_at, updated_at) VALUES
+    ('a', 'exam', 'running', '2026-01-01', '2026-01-01'),
+    ('b', 'exam', 'running', '2026-01-02', '2026-01-02');
+PRAGMA user_version = 0;
+""")
+    store._conn.close()
+
+    store = storage.SQLiteStorage(path)
+    assert store._conn.execute("PRAGMA user_version").fetchone()[0] == len(storage.SQLiteStorage.MIGRATIONS)
+    assert [job["status"] for job in run(store.list_jobs(exam_name="exam"))] == ["running", "failed"]
+    assert "headers" in {row["name"] for row in store._conn.execute("PRAGMA table_info(idempotency_keys)")}
+    assert run(store.insert_job("exam")) is None
@@ -0,0 +1,87 @@
+import io
+import asyncio
+
+import pytest
+
+import examai
+import storage
+import transcription_jobs
+
+EXAM = "exam"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = storage.SQLiteStorage(":memory:")
+    storage.set_storage(store)
+    monkeypatch.setattr(transcription_jobs, "_jobs", {})
+    monkeypatch.setattr(transcription_jobs, "_queue", None)
+    monkeypatch.setattr(transcription_jobs, "_workers", [])
+    monkeypatch.setattr(transcription_jobs, "_submits", 0)
+    yield store
+    storage.set_storage(None)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _transcribe(exam_name, student_name, index, audio_file, filename):
+    return audio_file.read().decode()
+
+
+async def _submit(student_name: str = "ali"):
+    return await transcription_jobs.submit(EXAM, student_name, 2, io.BytesIO(b"merhaba"), "a.wav")
+
+
+def test_finished_job_is_read_from_storage(store, monkeypatch):
+    monkeypatch.setattr(examai, "add_voice_answer", _transcribe)
+
+    async def scenario():
+        transcription_jobs.start()
+        job = await _submit()
+        await transcription_jobs._queue.join()
+        local = dict(transcription_jobs._jobs)
+        result = await transcription_jobs.get_job(job["job_id"])
+        await transcription_jobs.shutdown()
+        return local, result
+
+    local, result = run(scenario())
+    assert local == {}
+    assert result["status"] == "completed"
+    assert result["transcribed_text"] == "merhaba"
+    assert result["index"] == 2
+
+
+def test_shutdown_marks_unfinished_jobs_failed(store, monkeypatch):
+    monkeypatch.setattr(transcription_jobs, "TRANSCRIPTION_JOB_WORKERS", 0)
+
+    async def scenario():
+        transcription_jobs.start()
+        job = await _submit()
+        queued = await transcription_jobs.get_job(job["job_id"])
+        await transcription_jobs.shutdown()
+        return queued, await transcription_jobs.get_job(job["job_id"])
+
+    queued, result = run(scenario())
+    assert queued["status"] == "queued"
+    assert result["status"] == "failed"
+    assert result["error"] == "Sunucu kapandı; ses tekrar yüklenmeli."
+
+
+def test_unknown_job_id(store):
+    assert run(transcription_jobs.get_job("yok")) is None
+
+
+def test_eviction_keeps_unfinished_jobs(store):
+    async def scenario():
+        for job_id, job_status in (("a", "completed"), ("b", "failed"), ("c", "running")):
+            await store.insert_transcription_job({
+                "job_id": job_id, "exam_name": EXAM, "student_name": "ali", "answer_index": 0, "status": job_status
+            })
+        evicted = await store.evict_transcription_jobs("9999-01-01T00:00:00+00:00")
+        return evicted, [await store.get_transcription_job(job_id) for job_id in ("a", "b", "c")]
+
+    evicted, rows = run(scenario())
+    assert evicted == 2
+    assert [row and row["status"] for row in rows] == [None, None, "running"]
@@ -0,0 +1,304 @@
+import os
+import uuid
+import shutil
+import socket
+import asyncio
+import tempfile
+import ipaddress
+from datetime import datetime, timedelta, timezone
+from typing import IO, List, Optional, Dict, Any
+from urllib.parse import urlparse
+
+import httpx
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+import examai
+import logs
+import storage
+
+# --- Arka Plan Ses Çevirisi İşleri ---
+# /answers/voice?background=true yüklemeyi diskteki geçici bir dosyaya kopyalar, işi kuyruğa
+# ekler ve hemen 202 döner. TRANSCRIPTION_JOB_WORKERS adet worker kuyruktaki işleri
+# add_voice_answer ile çevirip kaydeder. Sonuç durum endpoint'inden sorgulanır veya
+# verilmişse callback_url'e POST edilir. İşin durumu storage'daki transcription_jobs tablosuna
+# yazılır (bkz. sql/transcription_jobs.sql), böylece her worker'dan sorgulanabilir ve yeniden
+# başlatmada kaybolmaz. Ses dosyası ise işi alan sürecin diskindedir: süreç kapanırken bitmemiş
+# işler "failed" olarak işaretlenir ve ses tekrar yüklenmelidir. Bitmiş işler
+# TRANSCRIPTION_JOB_RETENTION_SECONDS sonra her TRANSCRIPTION_JOB_EVICT_EVERY yeni işte bir silinir.
+TRANSCRIPTION_JOB_WORKERS = int(os.getenv("TRANSCRIPTION_JOB_WORKERS", "4"))
+TRANSCRIPTION_JOB_QUEUE_SIZE = int(os.getenv("TRANSCRIPTION_JOB_QUEUE_SIZE", "200"))
+TRANSCRIPTION_JOB_RETENTION_SECONDS = int(os.getenv("TRANSCRIPTION_JOB_RETENTION_SECONDS", "3600"))
+TRANSCRIPTION_JOB_EVICT_EVERY = 100
+# Virgülle ayrılmış izinli callback host'ları; boş bırakılırsa callback_url kabul edilmez.
+# İzinli olsa bile yerel, özel (RFC 1918) ve link-local adreslere çözülen host'lara gönderilmez.
+TRANSCRIPTION_CALLBACK_ALLOWED_HOSTS = [
+    h.strip().lower() for h in os.getenv("TRANSCRIPTION_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()
+]
+TRANSCRIPTION_CALLBACK_ATTEMPTS = 3
+
+log = logs.get_logger("examai.transcription_jobs")
+
+# Bu süreçte kuyrukta bekleyen veya çalışan işler (geçici dosya yolu ile); bitince çıkarılır
+_jobs: Dict[str, Dict[str, Any]] = {}
+_submits = 0
+_queue: asyncio.Queue | None = None
+_workers: List[asyncio.Task] = []
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_callback_url(callback_url: Optional[str]):
+    if callback_url is None:
+        return
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url geçerli bir http(s) adresi olmalıdır.")
+    if not TRANSCRIPTION_CALLBACK_ALLOWED_HOSTS:
+        raise ValueError("callback_url kullanılamıyor: izinli host'lar TRANSCRIPTION_CALLBACK_ALLOWED_HOSTS ile tanımlanmamış.")
+    host = parsed.hostname.lower()
+    if host not in TRANSCRIPTION_CALLBACK_ALLOWED_HOSTS:
+        raise ValueError(f"callback_url host'una izin verilmiyor: {parsed.hostname}")
+    try:
+        public = _is_public_address(host)
+    except ValueError:
+        return  # host adı; adresleri gönderim sırasında çözülüp kontrol edilir
+    if not public:
+        raise ValueError(f"callback_url yerel veya özel bir adrese işaret edemez: {parsed.hostname}")
+
+
+async def _check_callback_addresses(callback_url: str):
+    """Host'u çözer; adreslerden biri bile yerel/özel ise ValueError fırlatır (DNS ile yönlendirmeye karşı)."""
+    parsed = urlparse(callback_url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    blocked = sorted({info[4][0] for info in infos if not _is_public_address(info[4][0])})
+    if not infos or blocked:
+        raise ValueError(f"callback host'u yerel veya özel adrese çözülüyor: {parsed.hostname} -> {', '.join(blocked)}")
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """İşin istemciye dönen hali (geçici dosya yolu gibi iç alanlar hariç)."""
+    return {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in job.items() if not k.startswith("_")}
+
+
+def _row_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    """transcription_jobs satırını job_view ile aynı biçime çevirir."""
+    return {
+        "job_id": str(row["job_id"]),
+        "status": row["status"],
+        "exam_name": row["exam_name"],
+        "student_name": row["student_name"],
+        "index": row["answer_index"],
+        "transcribed_text": row["transcribed_text"],
+        "error": row["error"],
+        "callback_url": row["callback_url"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"]
+    }
+
+
+def in_flight() -> Dict[str, int]:
+    """Kuyrukta bekleyen ve çalışan çeviri işi sayıları (bkz. /metrics)."""
+    counts = {"queued": 0, "running": 0}
+    for job in _jobs.values():
+        if job["status"] in counts:
+            counts[job["status"]] += 1
+    return counts
+
+
+async def get_job(job_id: str) -> Dict[str, Any] | None:
+    """Bu süreçteki işi, yoksa storage'daki kaydı döndürür (iş başka bir worker'da olabilir)."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job_view(job)
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return None
+    row = await storage.get_storage().get_transcription_job(job_id)
+    return _row_view(row) if row else None
+
+
+async def _evict_finished_jobs():
+    global _submits
+    _submits += 1
+    if _submits % TRANSCRIPTION_JOB_EVICT_EVERY:
+        return
+    cutoff = (_now() - timedelta(seconds=TRANSCRIPTION_JOB_RETENTION_SECONDS)).isoformat()
+    try:
+        evicted = await storage.get_storage().evict_transcription_jobs(cutoff)
+    except Exception as e:
+        log.warning("Eski çeviri işleri silinemedi", error=str(e))
+        return
+    if evicted:
+        log.info("Eski çeviri işleri silindi", evicted=evicted)
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _copy_to_disk(audio_file: IO[bytes]) -> str:
+    audio_file.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="examai-voice-", delete=False) as spool:
+        try:
+            shutil.copyfileobj(audio_file, spool, 1024 * 1024)
+        except BaseException:
+            spool.close()
+            _unlink(spool.name)
+            raise
+        return spool.name
+
+
+async def submit(
+    exam_name: str,
+    student_name: str,
+    index: int,
+    audio_file: IO[bytes],
+    filename: Optional[str],
+    callback_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Yüklemeyi diske kopyalayıp kuyruğa ekler. Kuyruk doluysa 503 fırlatır."""
+    queue = _queue
+    if queue is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Arka plan çeviri işleri başlatılmamış.")
+    if queue.full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Çeviri kuyruğu dolu, lütfen daha sonra tekrar deneyin.")
+    await _evict_finished_jobs()
+
+    path = await run_in_threadpool(_copy_to_disk, audio_file)
+    now = _now()
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "exam_name": exam_name,
+        "student_name": student_name,
+        "index": index,
+        "transcribed_text": None,
+        "error": None,
+        "callback_url": callback_url,
+        "created_at": now,
+        "updated_at": now,
+        "_path": path,
+        "_filename": filename
+    }
+    try:
+        await storage.get_storage().insert_transcription_job({
+            "job_id": job["job_id"],
+            "exam_name": exam_name,
+            "student_name": student_name,
+            "answer_index": index,
+            "status": "queued",
+            "callback_url": callback_url
+        })
+    except BaseException:
+        _unlink(path)
+        raise
+    try:
+        # Dosya kopyalanırken eşzamanlı yüklemeler kuyruğu doldurmuş olabilir
+        queue.put_nowait(job["job_id"])
+    except asyncio.QueueFull:
+        _unlink(path)
+        detail = "Çeviri kuyruğu dolu, lütfen daha sonra tekrar deneyin."
+        await _update(job, status="failed", error=detail)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+    _jobs[job["job_id"]] = job
+    return job_view(job)
+
+
+async def _update(job: Dict[str, Any], **columns: Any):
+    """Yerel kaydı günceller ve durumu storage'a yazar; storage hatası işi durdurmaz."""
+    job.update(columns, updated_at=_now())
+    try:
+        await storage.get_storage().update_transcription_job(job["job_id"], columns)
+    except Exception as e:
+        log.error("Çeviri işi durumu kaydedilemedi", job_id=job["job_id"], error=str(e), **columns)
+
+
+async def _send_callback(job: Dict[str, Any]):
+    payload = job_view(job)
+    async with httpx.AsyncClient(timeout=10) as client:
+        for attempt in range(TRANSCRIPTION_CALLBACK_ATTEMPTS):
+            try:
+                await _check_callback_addresses(job["callback_url"])
+                response = await client.post(job["callback_url"], json=payload)
+                if response.status_code < 500:
+                    return
+                log.warning("Çeviri işi callback'i hata döndü", job_id=job['job_id'], status=response.status_code)
+            except ValueError as e:
+                log.warning("Çeviri işi callback'i gönderilmedi", job_id=job['job_id'], error=str(e))
+                return
+            except (httpx.HTTPError, OSError) as e:
+                log.warning("Çeviri işi callback'i gönderilemedi", job_id=job['job_id'], attempt=attempt + 1, error=str(e))
+            await asyncio.sleep(2 ** attempt)
+
+
+async def _process(job: Dict[str, Any]):
+    await _update(job, status="running")
+    try:
+        with open(job["_path"], "rb") as audio_file:
+            text = await examai.add_voice_answer(
+                exam_name=job["exam_name"],
+                student_name=job["student_name"],
+                index=job["index"],
+                audio_file=audio_file,
+                filename=job["_filename"]
+            )
+        await _update(job, status="completed", transcribed_text=text)
+    except HTTPException as e:
+        await _update(job, status="failed", error=str(e.detail))
+    except Exception as e:
+        await _update(job, status="failed", error=str(e))
+    finally:
+        _unlink(job["_path"])
+
+    if job["callback_url"]:
+        await _send_callback(job)
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            job = _jobs.get(job_id)
+            if job is not None:
+                await _process(job)
+        except Exception as e:
+            log.error("Çeviri işi işlenirken beklenmeyen hata", job_id=job_id, error=str(e))
+        finally:
+            _jobs.pop(job_id, None)
+            _queue.task_done()
+
+
+def start():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=TRANSCRIPTION_JOB_QUEUE_SIZE)
+    while len(_workers) < TRANSCRIPTION_JOB_WORKERS:
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def shutdown():
+    """Worker'ları durdurur; bitmemiş işlerin geçici dosyaları silinir ve işler failed olarak kaydedilir."""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    for job in list(_jobs.values()):
+        if job["status"] in ("queued", "running"):
+            _unlink(job["_path"])
+            await _update(job, status="failed", error="Sunucu kapandı; ses tekrar yüklenmeli.")
+    _jobs.clear()
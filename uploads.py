@@ -0,0 +1,50 @@
+import os
+from typing import Iterable
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+# --- Ses Yüklemeleri İçin Boyut Sınırı ---
+# Starlette multipart dosyaları zaten SpooledTemporaryFile'a yazar (1 MB'a kadar bellekte,
+# sonrası diskte). Bu middleware gövdeyi okunurken sayar: Content-Length sınırı aşıyorsa
+# gövde hiç okunmadan, aşmıyorsa (veya chunked ise) sınır aşıldığı anda 413 döner.
+# Varsayılan sınır Whisper API'ının kabul ettiği en büyük dosya boyutudur.
+VOICE_UPLOAD_MAX_BYTES = int(os.getenv("VOICE_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+# /answers/voice/batch: tek istekte en fazla bu kadar dosya; gövde sınırı dosya başına sınırın bu katıdır
+VOICE_BATCH_MAX_FILES = int(os.getenv("VOICE_BATCH_MAX_FILES", "10"))
+
+
+def _too_large_detail(max_bytes: int) -> str:
+    return f"Yüklenen dosya çok büyük. En fazla {max_bytes // (1024 * 1024)} MB yüklenebilir."
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, paths: Iterable[str], max_bytes: int = VOICE_UPLOAD_MAX_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": _too_large_detail(self.max_bytes)}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI gövde ayrıştırırken HTTPException'ı olduğu gibi iletir
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=_too_large_detail(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)